@@ -0,0 +1,240 @@
+import numpy as np
+
+_EPS = 1e-12
+
+
+def _row_norms(vectors):
+    if len(vectors) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.maximum(np.linalg.norm(vectors, axis=1), _EPS).astype(np.float32)
+
+
+def _top_k(ids, scores, k):
+    """
+    k найбільших скорів (за спаданням). ids=None означає ids == позиції.
+    Рівні скори — за меншим id, як у BM25Index.top_k: тоді top-k партицій зливається в той самий
+    результат, що й пошук по всій матриці (partitions.merge_hits).
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    if k < len(scores):
+        kth = len(scores) - k
+        part = np.flatnonzero(scores >= np.partition(scores, kth)[kth])
+    else:
+        part = np.arange(len(scores))
+    top_ids = part if ids is None else ids[part]
+    order = np.lexsort((top_ids, -scores[part]))[:k]
+    return top_ids[order].astype(np.int64), scores[part][order]
+
+
+def _in_ranges(ids, ranges):
+    """Маска ids, що потрапляють у відсортовані діапазони [(lo, hi), ...], які не перетинаються."""
+    pos = np.searchsorted(ranges[:, 0], ids, side="right") - 1
+    return (pos >= 0) & (ids < ranges[np.maximum(pos, 0), 1])
+
+
+class ExactIndex:
+    """
+    Точний косинусний пошук перебором по всій матриці — еталон для ANN.
+    vectors може бути mmap-масивом з EmbeddingCache: матриця не копіюється.
+    """
+
+    kind = "exact"
+
+    def __init__(self, vectors, norms=None, alive=None):
+        self.vectors = vectors
+        self.norms = _row_norms(vectors) if norms is None else norms
+        self.alive = alive  # None — видалених рядків немає
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def live_count(self):
+        return len(self.vectors) if self.alive is None else int(self.alive.sum())
+
+    def _candidates(self, q_unit, nprobe):
+        return None  # усі рядки
+
+    def _range_scores(self, queries, q_norms, ranges):
+        """
+        (ids, scores [запит × id]) лише для рядків з ranges: множення на зрізи матриці
+        (суцільні діапазони — view, вектори не копіюються).
+        """
+        ids = np.concatenate([np.arange(lo, hi) for lo, hi in ranges.tolist()])
+        scores = np.concatenate(
+            [(queries @ self.vectors[lo:hi].T) / self.norms[lo:hi] for lo, hi in ranges.tolist()], axis=1
+        )
+        scores /= q_norms[:, None]
+        if self.alive is not None:
+            keep = self.alive[ids]
+            ids, scores = ids[keep], scores[:, keep]
+        return ids, scores
+
+    def search(self, query_vec, k=5, nprobe=None, ranges=None):
+        """(ids, cosine scores) для k найближчих рядків; ranges — лише серед id з цих діапазонів (partitions.py)."""
+        if not len(self.vectors) or (ranges is not None and not len(ranges)):
+            return _top_k(None, np.zeros(0, dtype=np.float32), k)
+        q = np.asarray(query_vec, dtype=np.float32)
+        q_norm = max(float(np.linalg.norm(q)), _EPS)
+        ids = self._candidates(q / q_norm, nprobe)
+        if ids is None and ranges is not None:
+            ids, scores = self._range_scores(q[None, :], np.array([q_norm], dtype=np.float32), ranges)
+            return _top_k(ids, scores[0], k)
+        if ids is None:
+            scores = (self.vectors @ q) / (self.norms * q_norm)
+            if self.alive is not None:
+                scores[~self.alive] = -np.inf
+                k = min(k, self.live_count)
+        else:
+            if ranges is not None:
+                ids = ids[_in_ranges(ids, ranges)]
+            if self.alive is not None:
+                ids = ids[self.alive[ids]]
+            scores = (self.vectors[ids] @ q) / (self.norms[ids] * q_norm)
+        return _top_k(ids, scores, k)
+
+    def search_batch(self, query_vecs, k=5, nprobe=None, ranges=None):
+        """search для пакету запитів одним матричним множенням (блоками, щоб обмежити пам'ять)."""
+        queries = np.asarray(query_vecs, dtype=np.float32)
+        if not len(self.vectors) or (ranges is not None and not len(ranges)):
+            return [self.search(q, k, ranges=ranges) for q in queries]
+        q_norms = np.maximum(np.linalg.norm(queries, axis=1), _EPS)
+        if ranges is not None:
+            block = max(1, (1 << 24) // max(1, int((ranges[:, 1] - ranges[:, 0]).sum())))
+            results = []
+            for start in range(0, len(queries), block):
+                ids, scores = self._range_scores(queries[start:start + block], q_norms[start:start + block], ranges)
+                results.extend(_top_k(ids, row, k) for row in scores)
+            return results
+        limit = k if self.alive is None else min(k, self.live_count)
+        block = max(1, (1 << 24) // len(self.vectors))
+        results = []
+        for start in range(0, len(queries), block):
+            scores = (queries[start:start + block] @ self.vectors.T)
+            scores /= q_norms[start:start + block, None] * self.norms[None, :]
+            if self.alive is not None:
+                scores[:, ~self.alive] = -np.inf
+            results.extend(_top_k(None, row, limit) for row in scores)
+        return results
+
+    def _patched_base(self, vectors=None, removed_ids=()):
+        matrix, norms, alive = self.vectors, self.norms, self.alive
+        if vectors is not None and len(vectors):
+            vectors = np.asarray(vectors, dtype=np.float32)
+            matrix = np.concatenate([matrix, vectors]) if len(matrix) else vectors
+            norms = np.concatenate([norms, _row_norms(vectors)])
+            if alive is not None:
+                alive = np.concatenate([alive, np.ones(len(vectors), dtype=bool)])
+        removed_ids = list(removed_ids)
+        if removed_ids:
+            alive = np.ones(len(matrix), dtype=bool) if alive is None else alive.copy()
+            alive[removed_ids] = False
+        return matrix, norms, alive
+
+    def patched(self, vectors=None, removed_ids=()):
+        """Новий знімок: vectors дописуються в кінець, removed_ids маскуються."""
+        return ExactIndex(*self._patched_base(vectors, removed_ids))
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted File index: k-means розбиває простір на n_lists комірок, запит сканує лише
+    nprobe найближчих. nprobe — ручка recall/latency: більше комірок — вищий recall, повільніше.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors, centroids, lists, nprobe=8, norms=None, alive=None):
+        super().__init__(vectors, norms=norms, alive=alive)
+        self.centroids = centroids
+        self.lists = lists
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, nprobe=8, iters=10, sample_per_list=64, seed=0):
+        norms = _row_norms(vectors)
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n)) or 1
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(n, size=min(n, n_lists * sample_per_list), replace=False))
+        sample = vectors[sample_ids] / norms[sample_ids, None]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        # сферичний k-means на вибірці
+        for _ in range(iters):
+            assign = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), _EPS)
+
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            block = vectors[start:start + 65536] / norms[start:start + 65536, None]
+            assign[start:start + 65536] = cls._assign(block, centroids)
+        return cls(vectors, centroids.astype(np.float32), cls._group(assign, n_lists), nprobe, norms=norms)
+
+    @staticmethod
+    def _assign(unit_vectors, centroids):
+        return np.argmax(unit_vectors @ centroids.T, axis=1)
+
+    @staticmethod
+    def _group(assign, n_lists, offset=0):
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        return [(order[bounds[i]:bounds[i + 1]] + offset).astype(np.int64) for i in range(n_lists)]
+
+    def _candidates(self, q_unit, nprobe):
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        sims = self.centroids @ q_unit
+        probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[c] for c in probe])
+
+    def search_batch(self, query_vecs, k=5, nprobe=None, ranges=None):
+        # у кожного запиту свій набір комірок — спільного матричного множення немає
+        return [self.search(q, k, nprobe=nprobe, ranges=ranges) for q in np.asarray(query_vecs, dtype=np.float32)]
+
+    def patched(self, vectors=None, removed_ids=()):
+        start = len(self.vectors)
+        matrix, norms, alive = self._patched_base(vectors, removed_ids)
+        lists = self.lists
+        if len(matrix) > start:
+            fresh = matrix[start:] / norms[start:, None]
+            extra = self._group(self._assign(fresh, self.centroids), len(self.centroids), offset=start)
+            lists = [np.concatenate([old, new]) if len(new) else old for old, new in zip(lists, extra)]
+        return IVFIndex(matrix, self.centroids, lists, self.nprobe, norms=norms, alive=alive)
+
+    def save(self, path, fingerprint=""):
+        """Зберігає центроїди й списки; самі вектори живуть у кеші ембедингів."""
+        offsets = np.cumsum([0] + [len(ids) for ids in self.lists])
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                ids=np.concatenate(self.lists) if self.lists else np.zeros(0, dtype=np.int64),
+                offsets=offsets,
+                count=np.array(len(self.vectors)),
+                fingerprint=np.array(fingerprint)
+            )
+
+    @classmethod
+    def load(cls, path, vectors, nprobe=8, fingerprint=""):
+        """None, якщо файл не підходить до vectors (інший корпус чи модель) — тоді треба build()."""
+        try:
+            with np.load(path) as data:
+                if int(data["count"]) != len(vectors) or str(data["fingerprint"]) != fingerprint:
+                    return None
+                centroids = data["centroids"]
+                ids, offsets = data["ids"], data["offsets"]
+        except (OSError, KeyError, ValueError):
+            return None
+        lists = [ids[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        return cls(vectors, centroids, lists, nprobe)
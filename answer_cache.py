@@ -0,0 +1,190 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from chunking import normalize_query
+
+
+class AnswerCache:
+    """
+    Кеш відповідей LLM перед call_llm.
+
+    Ключ — нормалізоване питання + множина id чанків контексту (+ модель і endpoint).
+    Якщо точного збігу немає, шукається запис з тим самим контекстом, у якого косинус
+    ембединга питання ≥ similarity. Записи живуть ttl секунд, зайві витісняються за LRU;
+    з path кеш зберігається на диск (JSON) і підхоплюється при наступному старті.
+
+    Запис на диск відкладений: зміни за save_interval секунд зливаються в один фоновий запис
+    (0 — писати одразу в put), на виході з процесу незаписане дописується (flush).
+    """
+
+    def __init__(self, max_entries=1024, ttl=24 * 3600, similarity=0.95, path=None, save_interval=1.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.path = path
+        self.save_interval = save_interval
+        self._entries = OrderedDict()  # (question, context, llm) -> entry
+        self._lock = threading.Lock()
+        # знімок і запис файлу — під одним локом: старіший знімок не перезапише новіший
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            self._load()
+        if path:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def _context_key(chunk_ids, llm):
+        return tuple(sorted(int(i) for i in chunk_ids)), tuple(llm)
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry["created"] > self.ttl
+
+    def get(self, question, chunk_ids, llm=(), query_embedding=None):
+        """(answer, sources) або None. llm — (base_url, model), щоб не змішувати відповіді різних моделей."""
+        context, llm = self._context_key(chunk_ids, llm)
+        key = (normalize_query(question), context, llm)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and query_embedding is not None:
+                entry_key = self._nearest(context, llm, query_embedding, now)
+                entry = self._entries.get(entry_key) if entry_key else None
+                key = entry_key
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["answer"], list(entry["sources"])
+
+    def _nearest(self, context, llm, query_embedding, now):
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        best_key, best = None, self.similarity
+        for key, entry in self._entries.items():
+            if key[1] != context or key[2] != llm or entry["embedding"] is None or self._expired(entry, now):
+                continue
+            sim = float(entry["embedding"] @ q)
+            if sim >= best:
+                best_key, best = key, sim
+        return best_key
+
+    def put(self, question, chunk_ids, answer, sources, llm=(), query_embedding=None):
+        context, llm = self._context_key(chunk_ids, llm)
+        embedding = None
+        if query_embedding is not None:
+            embedding = np.asarray(query_embedding, dtype=np.float32)
+            embedding = embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+        key = (normalize_query(question), context, llm)
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "sources": list(sources),
+                "embedding": embedding,
+                "created": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._changed()
+
+    def invalidate_chunks(self, chunk_ids):
+        """Прибирає відповіді, побудовані на будь-якому з chunk_ids (чанк змінено або видалено)."""
+        chunk_ids = set(int(i) for i in chunk_ids)
+        with self._lock:
+            stale = [key for key in self._entries if chunk_ids.intersection(key[1])]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            self._changed()
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._changed()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _changed(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._dirty = True
+            if self.save_interval > 0 and self._timer is None:
+                self._timer = threading.Timer(self.save_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.save_interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """Записує незбережені зміни на диск зараз: JSON у тимчасовий файл і атомарний os.replace."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                timer, self._timer = self._timer, None
+                if timer is not None and timer is not threading.current_thread():
+                    timer.cancel()
+                if not self._dirty:
+                    return
+                self._dirty = False
+                rows = [
+                    {
+                        "question": key[0],
+                        "chunk_ids": list(key[1]),
+                        "llm": list(key[2]),
+                        "answer": entry["answer"],
+                        "sources": entry["sources"],
+                        "embedding": entry["embedding"].tolist() if entry["embedding"] is not None else None,
+                        "created": entry["created"]
+                    }
+                    for key, entry in self._entries.items()
+                ]
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp{os.getpid()}"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(rows, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                with self._lock:
+                    self._dirty = True  # наступна зміна або flush спробують ще раз
+                raise
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for row in rows:
+            embedding = row.get("embedding")
+            entry = {
+                "answer": row["answer"],
+                "sources": row["sources"],
+                "embedding": np.asarray(embedding, dtype=np.float32) if embedding is not None else None,
+                "created": row["created"]
+            }
+            if self._expired(entry, now):
+                continue
+            key = (row["question"], tuple(row["chunk_ids"]), tuple(row["llm"]))
+            self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
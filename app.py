@@ -1,7 +1,26 @@
-import gradio as gr
-from rag_pipeline import RAGPipeline
+import os
+import time
+
+_IMPORT_STARTED = time.perf_counter()
 
-rag = RAGPipeline()
+import gradio as gr
+from partitions import CORPUS_TOPICS
+from rag_pipeline import AsyncRAGPipeline, RAGPipeline
+from shard import SHARD_PATH
+
+if os.environ.get("RAG_SERVICE"):
+    # serving-режим (retrieval_service.py): моделі й індекси — в окремому процесі сервісу, спільному
+    # для кількох процесів app.py; тут лише промпт, кеш відповідей і LLM
+    from retrieval_service import AsyncRemoteRAGPipeline, RemoteRAGPipeline
+
+    rag = RemoteRAGPipeline(SHARD_PATH, address=os.environ["RAG_SERVICE"])
+    arag = AsyncRemoteRAGPipeline(rag)
+else:
+    # BM25 будується одразу, dense і reranker вантажаться у фоні — порт піднімається без очікування моделей;
+    # якщо є shard (python chanks.py), корпус і статистики BM25 відкриваються з нього без читання файлів
+    rag = RAGPipeline(lazy=True, shard_path=SHARD_PATH if os.path.exists(SHARD_PATH) else None)
+    arag = AsyncRAGPipeline(rag)
+_first_request_after = None
 
 # --- Константи для провайдерів ---
 PROVIDERS = {
@@ -57,29 +76,91 @@ def on_provider_change(provider: str):
     )
 
 
-def ask(question, use_bm25, use_dense, api_key, provider, base_url, model):
+def status_text():
+    state = rag.status()
+    ready_after = state.pop("ready_after")
+    parts = []
+    for name, value in state.items():
+        if value == "ready":
+            parts.append(f"✅ {name} ({ready_after[name]:.1f}s)")
+        elif value == "loading":
+            parts.append(f"⏳ {name}")
+        else:
+            parts.append(f"❌ {name}: {value}")
+    text = "**Status:** " + " · ".join(parts)
+    if state["dense"] != "ready" or state["reranker"] != "ready":
+        text += "\n\nПоки моделі завантажуються, пошук працює в режимі BM25-only."
+    if _first_request_after is not None:
+        text += f"\n\nImport → first request: {_first_request_after:.2f}s"
+    return text
+
+
+def poll_status():
+    # для Timer: коли жоден компонент уже не "loading" (готовий або з помилкою), таймер вимикається
+    loading = "loading" in rag.status().values()
+    return status_text(), gr.Timer(active=loading)
+
+
+def timings_text(trace):
+    if trace is None:
+        return "Трасування вимкнено."
+    lines = [f"**{trace.duration_ms:.1f} ms** total · trace `{trace.trace_id}`", "",
+             "| stage | start, ms | ms | details |", "|---|---:|---:|---|"]
+    for s in trace.spans:
+        details = ", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}"
+                            for k, v in s.items() if k not in ("name", "start_ms", "ms"))
+        lines.append(f"| {s['name']} | {s['start_ms']:.1f} | {s['ms']:.1f} | {details} |")
+    extra = {k: v for k, v in trace.attrs.items() if k != "query_chars"}
+    if extra:
+        lines += ["", ", ".join(f"{k}={v}" for k, v in extra.items())]
+    return "\n".join(lines)
+
+
+ALL_TOPICS_CHOICE = "Усі теми"
+
+
+async def ask(question, use_bm25, use_dense, topic, api_key, provider, base_url, model):
+    # async-генератор: Gradio оновлює поля на кожен yield — джерела після retrieval, далі токени відповіді;
+    # поки один користувач чекає на LLM, event loop обслуговує інших
+    global _first_request_after
+    if _first_request_after is None:
+        _first_request_after = time.perf_counter() - _IMPORT_STARTED
+        print(f"[startup] import → first request: {_first_request_after:.2f}s, components: {rag.status()}")
+
+    answer, src_text = "", ""
+    # trace відкриває UI, щоб після відповіді показати саме його таймінги
+    trace = rag.tracer.start("ask", query_chars=len((question or "").strip()))
     try:
         # якщо не Custom — беремо base_url з provider конфігів
         if provider in PROVIDERS and provider != "Custom":
             base_url = PROVIDERS[provider]["base_url"]
 
-        answer, sources = rag.answer(
+        async for answer, sources in arag.answer_stream(
             question=question,
             use_bm25=use_bm25,
             use_dense=use_dense,
             api_key=api_key,
             base_url=base_url,
-            model=model
-        )
-
-        src_text = "\n".join([f"[{i+1}] {s}" for i, s in enumerate(sources)])
-        return answer, src_text
+            model=model,
+            trace=trace,
+            # пошук лише в партиції теми (partitions.py) замість усього корпусу
+            topic=None if topic == ALL_TOPICS_CHOICE else topic
+        ):
+            src_text = "\n".join([f"[{i+1}] {s}" for i, s in enumerate(sources)])
+            yield answer, src_text, gr.update()
     except Exception as e:
-        return f"❌ Помилка: {str(e)}", ""
+        if trace is not None:
+            trace.set(error=type(e).__name__)
+        answer = f"{answer}\n\n❌ Помилка: {str(e)}".strip()
+    finally:
+        # і при обриві з'єднання клієнтом trace має потрапити в буфер
+        rag.tracer.finish(trace)
+    yield answer, src_text, timings_text(trace)
 
 
 with gr.Blocks(title="RAG NLP QA") as demo:
     gr.Markdown(DOMAIN_TEXT)
+    status = gr.Markdown(status_text())
 
     question = gr.Textbox(
         label="Question",
@@ -89,6 +170,7 @@ with gr.Blocks(title="RAG NLP QA") as demo:
     with gr.Row():
         use_bm25 = gr.Checkbox(label="BM25", value=True)
         use_dense = gr.Checkbox(label="Semantic", value=True)
+        topic = gr.Dropdown(label="Topic", choices=[ALL_TOPICS_CHOICE] + list(CORPUS_TOPICS), value=ALL_TOPICS_CHOICE)
 
     gr.Markdown("### LLM settings")
     api_key = gr.Textbox(label="API key", type="password")
@@ -110,6 +192,8 @@ with gr.Blocks(title="RAG NLP QA") as demo:
 
     answer = gr.Textbox(label="Answer", lines=6)
     sources = gr.Textbox(label="Sources", lines=6)
+    with gr.Accordion("Timings", open=False):
+        timings = gr.Markdown()
 
     btn = gr.Button("Ask")
 
@@ -121,9 +205,35 @@ with gr.Blocks(title="RAG NLP QA") as demo:
 
     btn.click(
         ask,
-        inputs=[question, use_bm25, use_dense, api_key, provider, base_url, model],
-        outputs=[answer, sources]
+        inputs=[question, use_bm25, use_dense, topic, api_key, provider, base_url, model],
+        outputs=[answer, sources, timings],
+        # ask не блокує event loop, тож дефолтний ліміт 1 одночасного виклику не потрібен
+        concurrency_limit=None
     )
 
+    # статус компонентів оновлюється, доки фоновий warm-up не завершиться; далі — лише при завантаженні сторінки
+    demo.load(status_text, outputs=[status])
+    status_timer = gr.Timer(2.0)
+    status_timer.tick(poll_status, outputs=[status, status_timer])
+
+
+def add_metrics_routes(app):
+    """/metrics — Prometheus text format, /traces — останні trace-и як JSON lines."""
+    from fastapi.responses import PlainTextResponse
+
+    app.add_api_route(
+        "/metrics",
+        lambda: PlainTextResponse(rag.tracer.prometheus(), media_type="text/plain; version=0.0.4"),
+        methods=["GET"]
+    )
+    app.add_api_route(
+        "/traces",
+        lambda: PlainTextResponse(rag.tracer.to_jsonl(), media_type="application/x-ndjson"),
+        methods=["GET"]
+    )
+
+
 if __name__ == "__main__":
-    demo.launch()
+    server_app, _, _ = demo.launch(prevent_thread_lock=True)
+    add_metrics_routes(server_app)
+    demo.block_thread()
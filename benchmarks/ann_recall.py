@@ -0,0 +1,79 @@
+"""
+Recall@k і latency IVFIndex проти точного ExactIndex.
+
+  python -m benchmarks.ann_recall --source synthetic --size 100000
+  python -m benchmarks.ann_recall --source corpus        # ембединги data/docs (потрібна модель)
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import ExactIndex, IVFIndex
+
+
+def synthetic_vectors(n, dim=384, n_clusters=200, seed=0):
+    """Суміш гаусіан — грубе наближення до кластеризованих ембедингів речень."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def corpus_vectors():
+    from rag_pipeline import load_documents
+    from retrievers import DenseRetriever
+
+    chunks, _ = load_documents()
+    dense = DenseRetriever(chunks)
+    queries = dense.model.encode(chunks[::max(1, len(chunks) // 200)], convert_to_numpy=True)
+    return dense.index.vectors, queries
+
+
+def latency_ms(index, queries, k, nprobe=None):
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q, k, nprobe=nprobe)
+        latencies.append(time.perf_counter() - t0)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000
+
+
+def recall_report(vectors, queries, k=5, n_lists=None, nprobes=(1, 2, 4, 8, 16, 32)):
+    exact = ExactIndex(vectors)
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(vectors, n_lists=n_lists)
+    build = time.perf_counter() - t0
+    truth = [set(exact.search(q, k)[0].tolist()) for q in queries]
+
+    p50, p95 = latency_ms(exact, queries, k)
+    print(f"{len(vectors)} vectors, {len(ivf.lists)} lists, build {build:.2f}s")
+    print(f"{'exact':>10}  recall@{k} 1.000  p50 {p50:7.2f}ms  p95 {p95:7.2f}ms")
+    for nprobe in nprobes:
+        if nprobe > len(ivf.lists):
+            break
+        hits = sum(len(t & set(ivf.search(q, k, nprobe=nprobe)[0].tolist())) for q, t in zip(queries, truth))
+        recall = hits / (k * len(queries))
+        p50, p95 = latency_ms(ivf, queries, k, nprobe)
+        print(f"{'nprobe=' + str(nprobe):>10}  recall@{k} {recall:.3f}  p50 {p50:7.2f}ms  p95 {p95:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["synthetic", "corpus"], default="synthetic")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--n-lists", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.source == "corpus":
+        vectors, queries = corpus_vectors()
+    else:
+        vectors = synthetic_vectors(args.size + args.queries)
+        vectors, queries = vectors[:args.size], vectors[args.size:]
+    recall_report(vectors, queries, k=args.k, n_lists=args.n_lists)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Звірка бекендів інференсу (inference.py) з fp32 torch: дрейф ембедингів, згода реранкера, throughput.
+
+  python -m benchmarks.backend_parity                      # int8 проти torch
+  python -m benchmarks.backend_parity --backends int8 onnx onnx-int8 --limit 500
+"""
+import argparse
+import time
+
+import numpy as np
+
+from exam_core import TOPIC_QUESTION_BANK
+from inference import INFERENCE_BACKENDS, load_model
+from rag_pipeline import load_documents
+from reranker import RERANK_MODEL
+from retrievers import DENSE_MODEL, BM25Retriever
+
+
+def rows_cosine(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    return (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+
+
+def timed(fn, items):
+    """(результат, елементів/с). Один прогрів на кількох елементах, щоб не міряти ініціалізацію."""
+    fn(items[:8])
+    t0 = time.perf_counter()
+    out = fn(items)
+    return out, len(items) / (time.perf_counter() - t0)
+
+
+def rerank_agreement(reference, scores, groups, top_n=5):
+    """Частка запитів з тим самим top-1 і середній перетин top_n (після сортування за скором)."""
+    top1 = overlap = 0
+    for start, end in groups:
+        ref = np.argsort(-reference[start:end], kind="stable")
+        got = np.argsort(-scores[start:end], kind="stable")
+        top1 += int(ref[0] == got[0])
+        overlap += len(set(ref[:top_n].tolist()) & set(got[:top_n].tolist())) / min(top_n, end - start)
+    return top1 / len(groups), overlap / len(groups)
+
+
+def parity_report(backends, limit=300, candidates=10):
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    chunks, _ = load_documents()
+    chunks = chunks[:limit]
+    queries = [q for bank in TOPIC_QUESTION_BANK.values() for q in bank]
+
+    # пари для реранкера — як у пайплайні: BM25-кандидати на кожне питання
+    bm25 = BM25Retriever(chunks)
+    pairs, groups = [], []
+    for q in queries:
+        hits = bm25.search(q, k=candidates)
+        groups.append((len(pairs), len(pairs) + len(hits)))
+        pairs.extend((q, text) for text, _, _ in hits)
+    groups = [(s, e) for s, e in groups if e > s]
+
+    print(f"{len(chunks)} chunks, {len(queries)} queries, {len(pairs)} rerank pairs")
+    print(f"{'backend':>10}  {'cos mean':>8}  {'cos min':>8}  {'top1':>6}  {'top5':>6}  {'enc/s':>8}  {'pairs/s':>8}")
+
+    reference = None
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        encoder = load_model(SentenceTransformer, DENSE_MODEL, backend)
+        cross = load_model(CrossEncoder, RERANK_MODEL, backend)
+        emb, enc_rate = timed(lambda xs: encoder.encode(xs, convert_to_numpy=True), chunks)
+        scores, pair_rate = timed(lambda xs: np.asarray(cross.predict(xs), dtype=np.float32), pairs)
+        if reference is None:
+            reference = emb, scores
+        cos = rows_cosine(reference[0], emb)
+        top1, top5 = rerank_agreement(reference[1], scores, groups)
+        print(f"{backend:>10}  {cos.mean():8.5f}  {cos.min():8.5f}  {top1:6.3f}  {top5:6.3f}  "
+              f"{enc_rate:8.1f}  {pair_rate:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", choices=INFERENCE_BACKENDS, default=["int8"])
+    parser.add_argument("--limit", type=int, default=300, help="скільки чанків кодувати")
+    parser.add_argument("--candidates", type=int, default=10, help="кандидатів на питання для реранкера")
+    args = parser.parse_args()
+    parity_report(args.backends, limit=args.limit, candidates=args.candidates)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Порівняння BM25Index з rank_bm25.BM25Okapi.
+
+  python -m benchmarks.bm25_engine                       # parity на data/docs + latency 10k/100k/1M
+  python -m benchmarks.bm25_engine --sizes 10000 --reference-limit 0
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from bm25_index import BM25Index
+from rag_pipeline import load_documents
+
+QUERIES = [
+    "Що таке BLEU і ROUGE?",
+    "Поясни self-attention: що таке Q, K, V?",
+    "Що таке data leakage і як уникати?",
+    "Що таке cosine similarity і навіщо вона для embeddings?",
+    "Які типові провали RAG і як їх зменшувати?",
+    "tokenization bpe wordpiece",
+    "dropout l2 early stopping regularization",
+    "ner pos crf bilstm",
+]
+
+
+def reference_top_k(bm25, tokens, k):
+    scores = bm25.get_scores(tokens)
+    top = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+    return top, [float(scores[i]) for i in top]
+
+
+def check_parity(k=5):
+    chunks, _ = load_documents()
+    corpus = [c.lower().split() for c in chunks]
+    reference = BM25Okapi(corpus)
+    index = BM25Index(corpus)
+    mismatches = 0
+    for q in QUERIES:
+        tokens = q.lower().split()
+        ref_ids, ref_scores = reference_top_k(reference, tokens, k)
+        ids, scores = index.top_k(tokens, k)
+        if ref_ids != ids.tolist() or ref_scores != scores.tolist():
+            mismatches += 1
+            print(f"MISMATCH {q!r}: {ref_ids} vs {ids.tolist()}")
+    print(f"parity on {len(chunks)} chunks, {len(QUERIES)} queries: {len(QUERIES) - mismatches} identical rankings")
+    return mismatches == 0
+
+
+def synthetic_corpus(n_docs, doc_len=120, vocab_size=50000, seed=0):
+    """Zipf-подібний розподіл слів, щоб postings мали реалістичну довжину."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = np.arange(1, vocab_size + 1)
+    probs = 1.0 / ranks
+    probs /= probs.sum()
+    for _ in range(n_docs):
+        yield vocab[rng.choice(vocab_size, size=doc_len, p=probs)].tolist()
+
+
+def timed(fn, queries, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for q in queries:
+            t0 = time.perf_counter()
+            fn(q)
+            latencies.append(time.perf_counter() - t0)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000
+
+
+def bench_size(n_docs, reference_limit, k=5, n_queries=20, repeat=3):
+    corpus = list(synthetic_corpus(n_docs))
+    rnd = random.Random(n_docs)
+    queries = [[f"w{rnd.randint(0, 2000)}" for _ in range(rnd.randint(2, 6))] for _ in range(n_queries)]
+
+    t0 = time.perf_counter()
+    index = BM25Index(corpus)
+    build = time.perf_counter() - t0
+    p50, p95 = timed(lambda q: index.top_k(q, k), queries, repeat)
+    print(f"{n_docs:>9} docs  BM25Index   build {build:7.2f}s  p50 {p50:8.2f}ms  p95 {p95:8.2f}ms")
+
+    if n_docs <= reference_limit:
+        t0 = time.perf_counter()
+        reference = BM25Okapi(corpus)
+        build = time.perf_counter() - t0
+        p50_ref, p95_ref = timed(lambda q: reference_top_k(reference, q, k), queries[:5], 1)
+        print(f"{n_docs:>9} docs  BM25Okapi   build {build:7.2f}s  p50 {p50_ref:8.2f}ms  p95 {p95_ref:8.2f}ms"
+              f"  (speedup p50 x{p50_ref / p50:.0f})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--reference-limit", type=int, default=100_000,
+                        help="rank_bm25 вимірюється лише до цього розміру (на 1M він дуже повільний)")
+    parser.add_argument("--skip-parity", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_parity:
+        check_parity()
+    for n in args.sizes:
+        bench_size(n, args.reference_limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Сплеск запитів до LLM через llm_client проти голого requests.post (як було до спільного клієнта).
+Сервер — локальний stand-in (benchmarks.llm_stub), тож видно кількість upstream-запитів і нових з'єднань.
+
+  python -m benchmarks.llm_burst --requests 64 --threads 16 --unique 8 --latency 0.2 --error-rate 0.1
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.llm_stub import StubServer
+from llm_client import LLMClient
+
+
+def plain_post(api_key, base_url, model, messages):
+    r = requests.post(base_url + "/chat/completions", headers={"Authorization": f"Bearer {api_key}"},
+                      json={"model": model, "messages": messages, "temperature": 0.2}, timeout=60)
+    r.raise_for_status()
+    return r.json()["choices"][0]["message"]["content"]
+
+
+def burst(call, prompts, threads):
+    ok = failed = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(call, [{"role": "user", "content": p}]) for p in prompts]
+        for f in futures:
+            try:
+                f.result()
+                ok += 1
+            except Exception:
+                failed += 1
+    return ok, failed, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--unique", type=int, default=8, help="скільки різних питань серед запитів")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=8, help="max_concurrency клієнта")
+    args = parser.parse_args()
+
+    prompts = [f"Питання {i % args.unique}" for i in range(args.requests)]
+    for name in ("requests.post", "llm_client"):
+        server = StubServer(latency=args.latency, error_rate=args.error_rate).start()
+        client = LLMClient(max_concurrency=args.concurrency, backoff=0.05)
+        if name == "llm_client":
+            call = lambda m: client.chat("key", server.base_url, "stub", m)
+        else:
+            call = lambda m: plain_post("key", server.base_url, "stub", m)
+        ok, failed, seconds = burst(call, prompts, args.threads)
+        extra = f", retries {client.stats['retries']}, coalesced {client.stats['coalesced']}" if name == "llm_client" else ""
+        print(f"{name:>14}: {ok} ok / {failed} failed in {seconds:.2f}s ({ok / seconds:.1f} req/s); "
+              f"upstream {server.requests} requests over {server.connections} connections{extra}")
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
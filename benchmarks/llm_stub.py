@@ -0,0 +1,103 @@
+"""
+Локальний stand-in OpenAI-compatible сервера (POST /chat/completions, звичайний і stream: true)
+для перевірки llm_client без мережі й ключів: затримка відповіді, частка 429/503 і лічильник запитів.
+
+  python -m benchmarks.llm_stub --port 8001 --latency 0.3 --error-rate 0.1
+  # далі в UI: Custom, base_url http://127.0.0.1:8001/v1, будь-який ключ
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="llm-stub", daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: видно, чи клієнт перевикористовує з'єднання
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            fail = server.rng.random() < server.error_rate
+            if fail:
+                server.errors += 1
+        time.sleep(server.latency)
+        if fail:
+            self._send(429 if server.rng.random() < 0.5 else 503, b"{}", {"Retry-After": "0"})
+            return
+
+        answer = "Відповідь на: " + body["messages"][-1]["content"][:40]
+        if not body.get("stream"):
+            data = json.dumps({"choices": [{"message": {"content": answer}}]}, ensure_ascii=False).encode("utf-8")
+            self._send(200, data)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in answer.split(" "):
+            self._chunk("data: " + json.dumps({"choices": [{"delta": {"content": token + " "}}]}) + "\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send(self, code, data, headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.3, help="секунд на відповідь")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="частка відповідей 429/503")
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency, args.error_rate)
+    print(f"serving {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Бенчмарк retrieval-стеку на синтетичних корпусах зростаючого розміру (генератор з chanks.py).
+
+Для кожного розміру: час побудови й пам'ять компонентів, p50/p95/p99 і QPS для
+BM25Retriever.search, DenseRetriever.search, Reranker.rerank і RAGPipeline.answer (retrieval-only),
+recall@k за розміченою темою документа-джерела. Результат — JSON, щоб порівнювати коміти між собою.
+
+  python -m benchmarks.retrieval                          # копій кожної підтеми: 1, 4, 16
+  python -m benchmarks.retrieval --copies 1 2 --repeat 1 --output /tmp/retrieval.json
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from chanks import generate_corpus, topics
+from exam_core import TOPIC_QUESTION_BANK
+from fusion import fuse
+from inference import INFERENCE_BACKENDS
+from rag_pipeline import RAGPipeline, load_documents
+from reranker import Reranker
+from retrievers import BM25Retriever, DenseRetriever
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# приклади з DOMAIN_TEXT розмічаються за ключовими словами
+DOMAIN_EXAMPLE_TOPICS = [
+    ("self-attention", "Attention & Transformers"),
+    ("BLEU", "Evaluation Metrics"),
+    ("data leakage", "Data Leakage & Train/Test Split"),
+    ("cosine similarity", "Word Embeddings"),
+    ("RAG", "Prompting & RAG basics"),
+]
+
+
+def domain_examples(app_path=APP_PATH):
+    """Приклади запитів з app.DOMAIN_TEXT. app.py не імпортується: він створює пайплайн і тягне gradio."""
+    with open(app_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "DOMAIN_TEXT" for t in node.targets):
+            # DOMAIN_TEXT = """...""".strip()
+            text = node.value.func.value.value if isinstance(node.value, ast.Call) else node.value.value
+            return re.findall(r"^- “(.+?)”", text, flags=re.MULTILINE)
+    return []
+
+
+def topic_label(name):
+    """Тема з TOPIC_QUESTION_BANK → тема генератора ("Evaluation Metrics (BLEU, ROUGE, F1)" → "Evaluation Metrics")."""
+    return name if name in topics else name.split(" (")[0]
+
+
+def query_set():
+    """[(запит, тема або None)]: банк питань екзамену + приклади з UI."""
+    queries = [(q, topic_label(topic)) for topic, bank in TOPIC_QUESTION_BANK.items() for q in bank]
+    for example in domain_examples():
+        label = next((topic for word, topic in DOMAIN_EXAMPLE_TOPICS if word.lower() in example.lower()), None)
+        queries.append((example, label))
+    return queries
+
+
+def rss_mb():
+    """Поточний RSS процесу (Linux), інакше пікова пам'ять; None — без модуля resource (Windows)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def build(fn):
+    """(об'єкт, секунд, приріст RSS у МБ або None)."""
+    before = rss_mb()
+    t0 = time.perf_counter()
+    obj = fn()
+    seconds, after = time.perf_counter() - t0, rss_mb()
+    return obj, seconds, None if before is None or after is None else after - before
+
+
+def latency(fn, inputs, repeat):
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for x in inputs:
+            start = time.perf_counter()
+            fn(x)
+            latencies.append(time.perf_counter() - start)
+    total = time.perf_counter() - t0
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "qps": len(latencies) / total, "calls": len(latencies)}
+
+
+def recall(found_sources, labels, queries, k):
+    """Частка розмічених запитів, у яких серед перших k результатів є чанк з документа потрібної теми."""
+    hits = total = 0
+    for sources, (_, topic) in zip(found_sources, queries):
+        if topic is None:
+            continue
+        total += 1
+        hits += any(labels.get(fname) == topic for fname in sources[:k])
+    return hits / total if total else None
+
+
+def bench_components(chunks, source, labels, queries, repeat, k, backend):
+    """Стадії bm25 / dense / rerank окремо; компоненти звільняються разом з кадром функції."""
+    texts = [q for q, _ in queries]
+    stages = {}
+
+    bm25, seconds, memory = build(lambda: BM25Retriever(chunks))
+    stages["bm25"] = dict(build_s=seconds, rss_mb=memory, **latency(lambda q: bm25.search(q, k), texts, repeat))
+    bm25_hits = [bm25.search(q, k) for q in texts]
+    stages["bm25"]["recall"] = recall([[source[i] for _, _, i in h] for h in bm25_hits], labels, queries, k)
+
+    # cache_dir=None — кожного разу холодне кодування корпусу, без кешу з диска
+    dense, seconds, memory = build(lambda: DenseRetriever(chunks, cache_dir=None, backend=backend))
+    stages["dense"] = dict(build_s=seconds, rss_mb=memory, **latency(lambda q: dense.search(q, k), texts, repeat))
+    dense_hits = [dense.search(q, k) for q in texts]
+    stages["dense"]["recall"] = recall([[source[i] for _, _, i in h] for h in dense_hits], labels, queries, k)
+
+    # cache_size=0: повтори тих самих запитів не повинні вимірювати LRU-кеш замість моделі
+    reranker, seconds, memory = build(lambda: Reranker(cache_size=0, backend=backend))
+    candidates = [fuse([b, d]) for b, d in zip(bm25_hits, dense_hits)]
+    pairs = list(zip(texts, candidates))
+    stages["rerank"] = dict(
+        build_s=seconds, rss_mb=memory, **latency(lambda p: reranker.rerank(p[0], p[1], top_n=k), pairs, repeat)
+    )
+    reranked = [reranker.rerank(q, c, top_n=k) for q, c in pairs]
+    stages["rerank"]["recall"] = recall([[source[i] for _, _, i in r] for r in reranked], labels, queries, k)
+    return stages
+
+
+def bench_corpus(copies, queries, repeat=3, k=5, backend="torch"):
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        labels, _ = generate_corpus(docs_dir=docs_dir, chunk_dir=None, copies=copies, seed=copies)
+        chunks, meta = load_documents(docs_dir)
+        source = [m.split(" — ")[0] for m in meta]
+        texts = [q for q, _ in queries]
+        stages = bench_components(chunks, source, labels, queries, repeat, k, backend)
+
+        rag, seconds, memory = build(lambda: RAGPipeline(
+            docs_path=docs_dir, answer_cache=False, backend=backend, cache_dir=os.path.join(tmp, "cache")
+        ))
+        # без api_key answer() повертає лише retrieval-контекст і джерела
+        stages["answer"] = dict(build_s=seconds, rss_mb=memory, **latency(lambda q: rag.answer(q), texts, repeat))
+        sources = [[s.split(" — ")[0] for s in rag.answer(q)[1]] for q in texts]
+        stages["answer"]["recall"] = recall(sources, labels, queries, k)
+
+        return {"copies": copies, "documents": len(labels), "chunks": len(chunks), "stages": stages}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 4, 16],
+                        help="варіантів кожної підтеми; 1 копія — 50 документів")
+    parser.add_argument("--repeat", type=int, default=3, help="скільки разів проганяти набір запитів")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backend", choices=INFERENCE_BACKENDS, default="torch")
+    parser.add_argument("--output", default=None,
+                        help="JSON-файл (за замовчуванням data/benchmarks/retrieval_<commit>.json)")
+    args = parser.parse_args()
+
+    queries = query_set()
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {"repeat": args.repeat, "k": args.k, "backend": args.backend, "queries": len(queries)},
+        "results": [],
+    }
+    for copies in args.copies:
+        result = bench_corpus(copies, queries, repeat=args.repeat, k=args.k, backend=args.backend)
+        report["results"].append(result)
+        print(f"{result['documents']} docs / {result['chunks']} chunks")
+        for name, s in result["stages"].items():
+            recall_text = "  n/a" if s["recall"] is None else f"{s['recall']:.3f}"
+            rss_text = "       n/a" if s["rss_mb"] is None else f"{s['rss_mb']:+8.1f}MB"
+            print(f"  {name:>7}  build {s['build_s']:7.2f}s  rss {rss_text}  p50 {s['p50_ms']:8.2f}ms  "
+                  f"p95 {s['p95_ms']:8.2f}ms  p99 {s['p99_ms']:8.2f}ms  qps {s['qps']:8.1f}  recall@{args.k} {recall_text}")
+
+    output = args.output or os.path.join("data", "benchmarks", f"retrieval_{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"→ {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Пропускна здатність і пам'ять при 1/2/4/8 процесах-воркерах у двох режимах:
+- standalone — кожен процес будує власний RAGPipeline (свої моделі, індекси, тензор ембедингів);
+- service — один retrieval_service з моделями й індексами, воркери — RemoteRAGPipeline по unix-сокету.
+
+У кожному воркері --threads потоків без перерви викликають answer() без API key (retrieval-only:
+retrieval, реранк, пакування контексту) протягом --duration секунд. Пам'ять — сума PSS усіх процесів
+(спільні сторінки mmap shard-а діляться між процесами, а не рахуються кожному).
+
+  python -m benchmarks.serving --workers 1 2 4 8 --threads 4 --duration 10
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from chanks import generate_corpus
+from exam_core import TOPIC_QUESTION_BANK
+from retrieval_service import SERVICE_KEY_ENV, RetrievalClient, wait_for_service
+from shard import build_shard
+
+
+def memory_mb(pid="self"):
+    """PSS процесу (Linux), інакше RSS: сторінки, спільні для кількох процесів, діляться між ними."""
+    for path, field in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    return 0.0
+
+
+def _worker(mode, shard_path, address, backend, threads, queries, ready, start, duration, results):
+    import threading
+
+    if mode == "service":
+        from retrieval_service import RemoteRAGPipeline
+        rag = RemoteRAGPipeline(shard_path, address=address, answer_cache=False)
+    else:
+        from rag_pipeline import RAGPipeline
+        rag = RAGPipeline(shard_path=shard_path, backend=backend, answer_cache=False)
+    ready.put(os.getpid())
+    start.wait()
+    deadline = time.perf_counter() + duration
+    latencies = [[] for _ in range(threads)]
+
+    def run(t):
+        i = t
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            rag.answer(queries[i % len(queries)])
+            latencies[t].append(time.perf_counter() - t0)
+            i += threads
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put({"latencies": [x for lat in latencies for x in lat], "memory_mb": memory_mb()})
+
+
+def bench(mode, workers, shard_path, args, queries, tmp):
+    ctx = mp.get_context("spawn")
+    address = os.path.join(tmp, f"service-{mode}-{workers}.sock")
+    service = None
+    if mode == "service":
+        service = subprocess.Popen([
+            sys.executable, "-m", "retrieval_service", "serve", "--address", address, "--shard", shard_path,
+            "--backend", args.backend, "--max-wait-ms", str(args.max_wait_ms)
+        ])
+        wait_for_service(address, process=service)
+    ready, results, start = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [
+        ctx.Process(target=_worker, args=(mode, shard_path, address, args.backend, args.threads, queries,
+                                          ready, start, args.duration, results))
+        for _ in range(workers)
+    ]
+    try:
+        t0 = time.perf_counter()
+        for p in procs:
+            p.start()
+        for _ in procs:
+            ready.get()
+        startup = time.perf_counter() - t0
+        start.set()
+        rows = [results.get() for _ in procs]
+        info = RetrievalClient(address).call("info")[0] if service is not None else None
+        service_mb = memory_mb(service.pid) if service is not None else 0.0
+        for p in procs:
+            p.join()
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+    latencies = np.array([x for row in rows for x in row["latencies"]])
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    batcher = info["batcher"] if info else None
+    return {
+        "mode": mode,
+        "workers": workers,
+        "qps": len(latencies) / args.duration,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "startup_s": startup,
+        "memory_mb": sum(row["memory_mb"] for row in rows) + service_mb,
+        "service_mb": service_mb,
+        "mean_batch": batcher["items"] / batcher["batches"] if batcher and batcher["batches"] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes", nargs="+", default=["standalone", "service"], choices=["standalone", "service"])
+    parser.add_argument("--threads", type=int, default=4, help="одночасних запитів на воркер")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--copies", type=int, default=1, help="розмір синтетичного корпусу (chanks.py)")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--output", default=None, help="JSON з результатами")
+    args = parser.parse_args()
+
+    # ключ сервісу успадковують процес сервісу й воркери (spawn копіює оточення)
+    os.environ.setdefault(SERVICE_KEY_ENV, secrets.token_hex())
+    queries = [q for bank in TOPIC_QUESTION_BANK.values() for q in bank]
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        shard_path = os.path.join(tmp, "corpus.rshard")
+        generate_corpus(docs_dir=docs_dir, chunk_dir=None, copies=args.copies, seed=args.copies)
+        # ембединги в shard: standalone-воркери не кодують корпус кожен сам, а режими порівнюються чесно
+        build_shard(docs_dir, shard_path, embed=True, backend=args.backend)
+        print(f"cpus {os.cpu_count()}, shard {os.path.getsize(shard_path) / 2 ** 20:.1f} MB, "
+              f"{args.threads} threads/worker, {args.duration:.0f}s per run")
+        print(f"{'mode':>10} {'workers':>7} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'memory MB':>10} {'batch':>6}")
+        for workers in args.workers:
+            for mode in args.modes:
+                row = bench(mode, workers, shard_path, args, queries, tmp)
+                report.append(row)
+                batch = f"{row['mean_batch']:.1f}" if row["mean_batch"] is not None else "-"
+                print(f"{mode:>10} {workers:>7} {row['qps']:>8.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                      f"{row['memory_mb']:>10.0f} {batch:>6}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cpus": os.cpu_count(), "threads": args.threads, "runs": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Пошук з фільтром за темою (partitions.py) проти повного сканування на синтетичних корпусах (chanks.py).
+
+Для кожного розміру: p50 BM25Retriever.search і пошуку dense-індексу (ембединг запиту рахується
+заздалегідь — міряється саме сканування) без фільтра, з fan-out по партиціях і з фільтром теми,
+під якою питання лежить у банку екзамену (exam_core.TOPIC_QUESTION_BANK), плюс частка корпусу, яку торкається фільтр.
+
+  python -m benchmarks.topic_filter --copies 1 4 16
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from chanks import generate_corpus
+from exam_core import TOPIC_QUESTION_BANK
+from partitions import merge_hits, range_size
+from rag_pipeline import RAGPipeline
+
+
+def p50_ms(fn, inputs, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for x in inputs:
+            start = time.perf_counter()
+            fn(x)
+            latencies.append(time.perf_counter() - start)
+    return float(np.percentile(latencies, 50) * 1000)
+
+
+def bench_corpus(copies, repeat, fanout_workers, k=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        generate_corpus(docs_dir=docs_dir, chunk_dir=None, copies=copies, seed=copies)
+        rag = RAGPipeline(docs_path=docs_dir, cache_dir=None, answer_cache=False, tracer=None)
+    partitions = rag.partitions
+    items = [(topic, q, rag.dense.encode_query(q)) for topic, bank in TOPIC_QUESTION_BANK.items() for q in bank]
+    bm25, index = rag.bm25, rag.dense.index
+    groups = partitions.groups()
+    pool = ThreadPoolExecutor(max_workers=fanout_workers)
+
+    def fan_out(search):
+        return lambda item: merge_hits(pool.map(lambda r: search(item, r), groups), k)
+
+    def bm25_search(item, ranges=None):
+        return bm25.search(item[1], k=k, ranges=ranges)
+
+    def dense_search(item, ranges=None):
+        ids, scores = index.search(item[2], k, ranges=ranges)
+        return [(None, s, i) for i, s in zip(ids.tolist(), scores.tolist())]
+
+    filtered = [(topic, q, emb, partitions.ranges(topic)) for topic, q, emb in items]
+    scanned = np.mean([range_size(item[3]) for item in filtered]) / len(rag.store)
+    row = {
+        "copies": copies,
+        "chunks": len(rag.store),
+        "partitions": len(groups),
+        "scanned": scanned,
+        "bm25_full_ms": p50_ms(bm25_search, items, repeat),
+        "bm25_fanout_ms": p50_ms(fan_out(bm25_search), items, repeat),
+        "bm25_topic_ms": p50_ms(lambda item: bm25_search(item, item[3]), filtered, repeat),
+        "dense_full_ms": p50_ms(dense_search, items, repeat),
+        "dense_fanout_ms": p50_ms(fan_out(dense_search), items, repeat),
+        "dense_topic_ms": p50_ms(lambda item: dense_search(item, item[3]), filtered, repeat),
+    }
+    pool.shutdown()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fanout-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>7} {'parts':>5} {'scanned':>7} | {'bm25 full':>9} {'fan-out':>8} {'topic':>7} | "
+          f"{'dense full':>10} {'fan-out':>8} {'topic':>7}   (p50, ms)")
+    for copies in args.copies:
+        r = bench_corpus(copies, args.repeat, args.fanout_workers)
+        print(f"{r['chunks']:>7} {r['partitions']:>5} {r['scanned']:>7.1%} | {r['bm25_full_ms']:>9.3f} "
+              f"{r['bm25_fanout_ms']:>8.3f} {r['bm25_topic_ms']:>7.3f} | {r['dense_full_ms']:>10.3f} "
+              f"{r['dense_fanout_ms']:>8.3f} {r['dense_topic_ms']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
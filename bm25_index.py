@@ -0,0 +1,276 @@
+import math
+
+import numpy as np
+
+
+def _slice_sorted(ids, values, ranges):
+    """Частина відсортованих ids (і паралельних values), що потрапляє в ranges [(lo, hi), ...] — бінарним пошуком."""
+    starts = np.searchsorted(ids, ranges[:, 0])
+    ends = np.searchsorted(ids, ranges[:, 1])
+    if len(ranges) == 1:
+        return ids[starts[0]:ends[0]], values[starts[0]:ends[0]]
+    bounds = [(a, b) for a, b in zip(starts.tolist(), ends.tolist()) if b > a]
+    if not bounds:
+        return ids[:0], values[:0]
+    return np.concatenate([ids[a:b] for a, b in bounds]), np.concatenate([values[a:b] for a, b in bounds])
+
+
+class BM25Index:
+    """
+    BM25 Okapi на інвертованому індексі (ті самі формули й ранжування, що й rank_bm25.BM25Okapi).
+
+    postings[t] — (id документів int32, частоти терміна int32), id відсортовані за зростанням.
+    Скоринг торкається лише документів, що містять терміни запиту; top-k — через argpartition.
+    Об'єкт не змінюється після створення: patched() повертає новий знімок, спільні масиви не копіюються.
+    """
+
+    def __init__(self, corpus=(), k1=1.5, b=0.75, epsilon=0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        vocab = {}
+        ids_lists, tf_lists = [], []
+        doc_len = []
+        for doc_id, tokens in enumerate(corpus):
+            doc_len.append(len(tokens))
+            frequencies = {}
+            for word in tokens:
+                frequencies[word] = frequencies.get(word, 0) + 1
+            for word, freq in frequencies.items():
+                term = vocab.get(word)
+                if term is None:
+                    term = vocab[word] = len(ids_lists)
+                    ids_lists.append([])
+                    tf_lists.append([])
+                ids_lists[term].append(doc_id)
+                tf_lists[term].append(freq)
+
+        self.vocab = vocab
+        self.postings = [
+            (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.int32))
+            for ids, tfs in zip(ids_lists, tf_lists)
+        ]
+        self.df = np.array([len(ids) for ids in ids_lists], dtype=np.int64)
+        self.doc_len = np.array(doc_len, dtype=np.int64)
+        self.alive = None  # None — видалених документів немає
+        self.corpus_size = len(doc_len)
+        self._finalize(int(self.doc_len.sum()))
+
+    def to_arrays(self):
+        """
+        Плоске представлення для збереження (shard.py): терміни в порядку term id,
+        postings підряд (ids, tfs) зі зсувами offsets, довжини документів. Лише для індексу без tombstone.
+        """
+        if self.alive is not None:
+            raise ValueError("Cannot export BM25 index with removed documents")
+        terms = [None] * len(self.vocab)
+        for word, term in self.vocab.items():
+            terms[term] = word
+        offsets = np.zeros(len(self.postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ids) for ids, _ in self.postings])
+        empty = np.zeros(0, dtype=np.int32)
+        ids = np.concatenate([p[0] for p in self.postings]) if self.postings else empty
+        tfs = np.concatenate([p[1] for p in self.postings]) if self.postings else empty
+        return terms, offsets, ids, tfs, self.doc_len
+
+    @classmethod
+    def from_arrays(cls, terms, offsets, ids, tfs, doc_len, k1=1.5, b=0.75, epsilon=0.25):
+        """Зворотне до to_arrays(); postings — зрізи переданих масивів (mmap не копіюється)."""
+        index = object.__new__(cls)
+        index.k1, index.b, index.epsilon = k1, b, epsilon
+        index.vocab = {word: term for term, word in enumerate(terms)}
+        index.postings = [(ids[offsets[t]:offsets[t + 1]], tfs[offsets[t]:offsets[t + 1]]) for t in range(len(terms))]
+        index.df = np.diff(offsets).astype(np.int64)
+        index.doc_len = np.asarray(doc_len, dtype=np.int64)
+        index.alive = None
+        index.corpus_size = len(index.doc_len)
+        index._finalize(int(index.doc_len.sum()))
+        return index
+
+    @property
+    def size(self):
+        """Кількість слотів документів, включно з видаленими."""
+        return len(self.doc_len)
+
+    def _finalize(self, total_len):
+        self.total_len = total_len
+        self.avgdl = total_len / self.corpus_size if self.corpus_size else 0.0
+        if self.corpus_size:
+            # той самий вираз, що й у rank_bm25, щоб результати збігались побітово
+            self.norms = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        else:
+            self.norms = np.zeros(0)
+        self.idf = self._calc_idf()
+
+    def _calc_idf(self):
+        # Порядок сумування і math.log як у BM25Okapi._calc_idf — інакше average_idf може
+        # розійтися в останньому біті й поміняти місцями документи з рівними скорами.
+        idf = [0.0] * len(self.df)
+        idf_sum = 0.0
+        present = 0
+        negative = []
+        n = self.corpus_size
+        for term, freq in enumerate(self.df.tolist()):
+            if not freq:
+                continue
+            value = math.log(n - freq + 0.5) - math.log(freq + 0.5)
+            idf[term] = value
+            idf_sum += value
+            present += 1
+            if value < 0:
+                negative.append(term)
+        if present:
+            eps = self.epsilon * (idf_sum / present)
+            for term in negative:
+                idf[term] = eps
+        return idf
+
+    def patched(self, added=(), removed=None):
+        """
+        Новий знімок індексу.
+        added — токени нових документів (отримують id size, size+1, ...);
+        removed — {id: токени} документів, які треба прибрати з видачі.
+        """
+        new = object.__new__(BM25Index)
+        new.k1, new.b, new.epsilon = self.k1, self.b, self.epsilon
+        new.vocab = self.vocab
+        new.postings = list(self.postings)
+        new.df = self.df.copy()
+        doc_len = self.doc_len.tolist()
+        alive = self.alive
+        total_len = self.total_len
+        corpus_size = self.corpus_size
+
+        grow = {}
+        for tokens in added:
+            doc_id = len(doc_len)
+            doc_len.append(len(tokens))
+            total_len += len(tokens)
+            corpus_size += 1
+            frequencies = {}
+            for word in tokens:
+                frequencies[word] = frequencies.get(word, 0) + 1
+            for word, freq in frequencies.items():
+                grow.setdefault(word, ([], []))
+                grow[word][0].append(doc_id)
+                grow[word][1].append(freq)
+
+        if grow:
+            if any(word not in new.vocab for word in grow):
+                new.vocab = dict(new.vocab)
+            df_extra = []
+            for word, (ids, tfs) in grow.items():
+                term = new.vocab.get(word)
+                if term is None:
+                    term = new.vocab[word] = len(new.postings)
+                    new.postings.append((np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)))
+                    df_extra.append(0)
+                old_ids, old_tfs = new.postings[term]
+                new.postings[term] = (
+                    np.concatenate([old_ids, np.array(ids, dtype=np.int32)]),
+                    np.concatenate([old_tfs, np.array(tfs, dtype=np.int32)])
+                )
+            if df_extra:
+                new.df = np.concatenate([new.df, np.array(df_extra, dtype=np.int64)])
+            for word, (ids, _) in grow.items():
+                new.df[new.vocab[word]] += len(ids)
+
+        if alive is not None and len(alive) < len(doc_len):
+            alive = np.concatenate([alive, np.ones(len(doc_len) - len(alive), dtype=bool)])
+
+        # видалення — tombstone: postings лишаються, документ відсіюється маскою alive
+        for doc_id, tokens in (removed or {}).items():
+            if alive is not None and not alive[doc_id]:
+                continue
+            if alive is None or alive is self.alive:
+                alive = np.ones(len(doc_len), dtype=bool) if alive is None else alive.copy()
+            alive[doc_id] = False
+            for word in set(tokens):
+                new.df[new.vocab[word]] -= 1
+            total_len -= doc_len[doc_id]
+            doc_len[doc_id] = 0
+            corpus_size -= 1
+
+        new.doc_len = np.array(doc_len, dtype=np.int64)
+        new.alive = alive
+        new.corpus_size = corpus_size
+        new._finalize(total_len)
+        return new
+
+    def _term_contributions(self, word, ranges=None):
+        term = self.vocab.get(word)
+        if term is None or not self.df[term]:
+            return None
+        ids, tfs = self.postings[term]
+        if ranges is not None:
+            # idf і норми довжин — глобальні, тож скори ті самі, що й без фільтра
+            ids, tfs = _slice_sorted(ids, tfs, ranges)
+            if not len(ids):
+                return None
+        return ids, self.idf[term] * (tfs * (self.k1 + 1) / (tfs + self.norms[ids]))
+
+    def scores(self, query_tokens, memo=None, ranges=None):
+        """
+        (id, score) документів, що містять хоч один термін запиту; id відсортовані.
+        memo — спільний dict для пакету запитів (з тими самими ranges): внесок кожного терміна рахується один раз.
+        ranges — масив (n, 2) діапазонів id [lo, hi): скоряться лише документи з них (partitions.py).
+        """
+        ids_parts, score_parts = [], []
+        for word in query_tokens:
+            if memo is None:
+                part = self._term_contributions(word, ranges)
+            elif word in memo:
+                part = memo[word]
+            else:
+                part = memo[word] = self._term_contributions(word, ranges)
+            if part is None:
+                continue
+            ids_parts.append(part[0])
+            score_parts.append(part[1])
+        if not ids_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        ids = np.concatenate(ids_parts)
+        contributions = np.concatenate(score_parts)
+        # bincount сумує в порядку входження — той самий порядок додавання, що й у rank_bm25
+        doc_ids, inverse = np.unique(ids, return_inverse=True)
+        totals = np.bincount(inverse, weights=contributions, minlength=len(doc_ids))
+        if self.alive is not None:
+            keep = self.alive[doc_ids]
+            doc_ids, totals = doc_ids[keep], totals[keep]
+        return doc_ids.astype(np.int64), totals
+
+    def top_k(self, query_tokens, k=5, memo=None, ranges=None):
+        """
+        k найкращих (ids, scores). Рівні скори впорядковуються за id, як стабільне
+        сортування в rank_bm25; документи без збігів мають скор 0.
+        """
+        if ranges is not None and not len(ranges):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        ids, scores = self.scores(query_tokens, memo, ranges)
+        if len(ids) < k or (len(scores) and scores.min() < 0):
+            # документи без збігів мають скор 0 — добираємо їх з найменшими id
+            fillers = []
+            matched = set(ids.tolist())
+            candidates = range(self.size) if ranges is None else (i for lo, hi in ranges.tolist() for i in range(lo, hi))
+            for doc_id in candidates:
+                if len(fillers) >= k:
+                    break
+                if doc_id not in matched and (self.alive is None or self.alive[doc_id]):
+                    fillers.append(doc_id)
+            ids = np.concatenate([ids, np.array(fillers, dtype=np.int64)])
+            scores = np.concatenate([scores, np.zeros(len(fillers))])
+
+        if len(ids) > k:
+            kth = len(scores) - k
+            threshold = np.partition(scores, kth)[kth]
+            keep = scores >= threshold
+            ids, scores = ids[keep], scores[keep]
+        order = np.lexsort((ids, -scores))[:k]
+        return ids[order], scores[order]
+
+    def top_k_batch(self, queries_tokens, k=5, ranges=None):
+        """top_k для пакету запитів; спільні терміни скоряться один раз на весь пакет."""
+        memo = {}
+        return [self.top_k(tokens, k, memo, ranges) for tokens in queries_tokens]
@@ -1,14 +1,13 @@
 import os
 import re
 import random
+import time
 
 # ----------------------
 # Налаштування
 # ----------------------
 DOCS_DIR = "data/docs"
 CHUNK_DIR = "data/docs_chunks"
-os.makedirs(DOCS_DIR, exist_ok=True)
-os.makedirs(CHUNK_DIR, exist_ok=True)
 
 CHUNK_SIZE = 120  # слів на один чанок
 OVERLAP = 50  # перекриття слів
@@ -62,32 +61,85 @@ sample_text_template = """
 Текст подається українською мовою та містить достатньо інформації для chunking.
 """.strip()
 
-total_chunks = 0
-doc_count = 0
-
-for topic, subtopics in topics.items():
-    for sub in subtopics:
-        # Створюємо довгий текст для кожного документа
-        repeat_paragraphs = random.randint(60, 80)  # ~50 слів на абзац
-        text = "\n\n".join([sample_text_template.format(f"{topic} - {sub}", f"{topic} - {sub}")
-                            for _ in range(repeat_paragraphs)])
-
-        # Створюємо безпечне ім'я файлу
-        fname = sanitize_filename(f"{topic}_{sub}") + ".md"
-        path = os.path.join(DOCS_DIR, fname)
-
-        # Записуємо сирий документ
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(text)
-
-        # Розбиваємо на чанки
-        chunks = chunk_text(text)
-        for i, c in enumerate(chunks):
-            out_path = os.path.join(CHUNK_DIR, f"{fname}_chunk{i}.txt")
-            with open(out_path, "w", encoding="utf-8") as f_out:
-                f_out.write(c)
-        total_chunks += len(chunks)
-        doc_count += 1
-
-print(f"Створено {doc_count} документів у {DOCS_DIR}")
-print(f"Створено {total_chunks} чанків у {CHUNK_DIR}")
+
+def generate_document(topic, sub, rng=random):
+    """Довгий текст для підтеми (~50 слів на абзац)."""
+    repeat_paragraphs = rng.randint(60, 80)
+    return "\n\n".join([sample_text_template.format(f"{topic} - {sub}", f"{topic} - {sub}")
+                        for _ in range(repeat_paragraphs)])
+
+
+def generate_corpus(docs_dir=DOCS_DIR, chunk_dir=CHUNK_DIR, copies=1, seed=None):
+    """
+    Записує документи по всіх темах/підтемах (copies варіантів кожної) і, якщо chunk_dir задано, їхні чанки.
+    Повертає ({ім'я файлу: тема}, кількість чанків); словник — розмітка джерел для бенчмарків.
+    """
+    rng = random.Random(seed)
+    os.makedirs(docs_dir, exist_ok=True)
+    if chunk_dir:
+        os.makedirs(chunk_dir, exist_ok=True)
+
+    labels = {}
+    total_chunks = 0
+    for topic, subtopics in topics.items():
+        for sub in subtopics:
+            for copy in range(copies):
+                # Створюємо довгий текст для кожного документа
+                text = generate_document(topic, sub, rng)
+
+                # Створюємо безпечне ім'я файлу
+                suffix = f"_v{copy}" if copies > 1 else ""
+                fname = sanitize_filename(f"{topic}_{sub}{suffix}") + ".md"
+
+                # Записуємо сирий документ
+                with open(os.path.join(docs_dir, fname), "w", encoding="utf-8") as f:
+                    f.write(text)
+                labels[fname] = topic
+
+                if chunk_dir:
+                    # Розбиваємо на чанки
+                    chunks = chunk_text(text)
+                    for i, c in enumerate(chunks):
+                        out_path = os.path.join(chunk_dir, f"{fname}_chunk{i}.txt")
+                        with open(out_path, "w", encoding="utf-8") as f_out:
+                            f_out.write(c)
+                    total_chunks += len(chunks)
+
+    return labels, total_chunks
+
+
+def main():
+    import argparse
+
+    from shard import SHARD_PATH, build_shard
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=1, help="варіантів кожної підтеми")
+    parser.add_argument("--shard", default=SHARD_PATH, help="куди записати shard (порожній рядок — не писати)")
+    parser.add_argument("--chunk-files", action="store_true",
+                        help=f"також записати окремі .txt-чанки у {CHUNK_DIR} (старий формат)")
+    parser.add_argument("--embeddings", action="store_true", help="зберегти в shard ембединги dense-моделі")
+    parser.add_argument("--backend", default="torch", help="бекенд інференсу для --embeddings")
+    parser.add_argument("--dedup", action="store_true", help="зберігати однакові й майже однакові чанки один раз")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процесів для chunking файлів")
+    args = parser.parse_args()
+
+    docs, total_chunks = generate_corpus(chunk_dir=CHUNK_DIR if args.chunk_files else None, copies=args.copies)
+    print(f"Створено {len(docs)} документів у {DOCS_DIR}")
+    if args.chunk_files:
+        print(f"Створено {total_chunks} чанків у {CHUNK_DIR}")
+    if args.shard:
+        # shard ріжеться параметрами RAGPipeline (300/50 слів), а не CHUNK_SIZE/OVERLAP файлового формату
+        t0 = time.perf_counter()
+        stats, deduper = build_shard(DOCS_DIR, args.shard, workers=args.workers, embed=args.embeddings,
+                                     backend=args.backend, dedup=args.dedup)
+        size_mb = os.path.getsize(args.shard) / 2 ** 20
+        print(f"Shard {args.shard}: {stats.chunks} чанків, {size_mb:.1f} MB, {time.perf_counter() - t0:.1f}s")
+        if deduper is not None:
+            report = deduper.report()
+            print(f"Дедуплікація: збережено {report['unique']} з {report['chunks']} чанків "
+                  f"(точних копій {report['exact']}, майже-копій {report['near']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Компактне сховище чанків: увесь текст — один UTF-8 буфер (uint8) + масив зсувів,
+метадані — структурований масив (документ, порядковий номер чанка, межі в символах документа).
+
+Одне сховище ділять RAGPipeline, BM25Retriever і DenseRetriever; текст декодується лише
+для запитаних індексів. save()/load() — каталог з .npy-файлами, які можна відкрити через mmap.
+"""
+import json
+import os
+
+import numpy as np
+
+META_DTYPE = np.dtype([("doc", np.int32), ("ordinal", np.int32), ("start", np.int64), ("end", np.int64)])
+
+_FILES = ("text.npy", "offsets.npy", "meta.npy", "docs.json")
+
+
+def _grow(array, needed):
+    """Масив з місткістю не менше needed (подвоєнням); заповнена частина копіюється."""
+    if len(array) >= needed:
+        return array
+    grown = np.empty(max(needed, 2 * len(array), 16), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class ChunkStore:
+    """
+    Append-only: нові чанки дописуються в кінець, індекси наявних не змінюються.
+    Запис — під локом викликача (ingest); читання без локів: розмір публікується останнім,
+    а при розширенні буфера старі масиви лишаються валідними для тих, хто їх уже тримає.
+    """
+
+    def __init__(self, data=None, offsets=None, meta=None, docs=()):
+        self._data = data if data is not None else np.zeros(0, dtype=np.uint8)
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._meta = meta if meta is not None else np.zeros(0, dtype=META_DTYPE)
+        # doc id → ім'я файлу; id ніколи не перевикористовуються
+        self.docs = list(docs)
+        self._doc_ids = {fname: i for i, fname in enumerate(self.docs)}
+        self._size = len(self._offsets) - 1 if offsets is not None else 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, i):
+        size = self._size
+        if i < 0:
+            i += size
+        if not 0 <= i < size:
+            raise IndexError(f"chunk index out of range: {i}")
+        offsets = self._offsets
+        return self._data[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    @property
+    def meta(self):
+        """Структурований масив META_DTYPE, рядок i ↔ чанк i."""
+        return self._meta[:self._size]
+
+    @property
+    def nbytes(self):
+        size = self._size
+        return int(self._offsets[size]) + (size + 1) * self._offsets.itemsize + size * META_DTYPE.itemsize
+
+    def doc_id(self, fname):
+        doc = self._doc_ids.get(fname)
+        if doc is None:
+            doc = self._doc_ids[fname] = len(self.docs)
+            self.docs.append(fname)
+        return doc
+
+    def source(self, i):
+        return self.docs[self._meta[i]["doc"]]
+
+    def label(self, i):
+        """Підпис джерела для UI: "file.md — chunk 3"."""
+        row = self._meta[i]
+        return f"{self.docs[row['doc']]} — chunk {row['ordinal']}"
+
+    def append(self, fname, chunks, ordinals=None, spans=None):
+        """Дописує чанки документа fname; ordinals — їхні номери в документі, spans — (start, end) у символах."""
+        chunks = list(chunks)
+        if not chunks:
+            return []
+        doc = self.doc_id(fname)
+        encoded = [c.encode("utf-8") for c in chunks]
+        start, size = self._size, self._size + len(chunks)
+        used = int(self._offsets[start])
+        total = used + sum(len(b) for b in encoded)
+
+        data = _grow(self._data, total)
+        offsets = _grow(self._offsets, size + 1)
+        meta = _grow(self._meta, size)
+        if total > used:
+            data[used:total] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        offsets[start + 1:size + 1] = used + np.cumsum([len(b) for b in encoded])
+        rows = meta[start:size]
+        rows["doc"] = doc
+        rows["ordinal"] = ordinals if ordinals is not None else np.arange(len(chunks))
+        if spans is not None:
+            rows["start"], rows["end"] = np.asarray(spans, dtype=np.int64).reshape(-1, 2).T
+        else:
+            rows["start"] = rows["end"] = -1
+
+        # спершу масиви, потім розмір: читач не побачить індекс без даних
+        self._data, self._offsets, self._meta = data, offsets, meta
+        self._size = size
+        return list(range(start, size))
+
+    def compact(self):
+        """Прибирає запас місткості, що лишився після append (напр. після початкового завантаження)."""
+        size = self._size
+        used = int(self._offsets[size])
+        self._data, self._offsets, self._meta = (
+            self._data[:used].copy(), self._offsets[:size + 1].copy(), self._meta[:size].copy()
+        )
+
+    def save(self, path):
+        """Каталог text.npy / offsets.npy / meta.npy / docs.json; файли підміняються атомарно, docs.json — останнім."""
+        os.makedirs(path, exist_ok=True)
+        size = self._size
+        arrays = {
+            "text.npy": self._data[:int(self._offsets[size])],
+            "offsets.npy": self._offsets[:size + 1],
+            "meta.npy": self._meta[:size],
+        }
+        for name, array in arrays.items():
+            tmp = os.path.join(path, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(path, name))
+        tmp = os.path.join(path, "docs.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.docs, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(path, "docs.json"))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """mmap=True — масиви відкриваються read-only через mmap; append() копіює їх у пам'ять при першому рості."""
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "docs.json"), encoding="utf-8") as f:
+            docs = json.load(f)
+        return cls(
+            data=np.load(os.path.join(path, "text.npy"), mmap_mode=mode),
+            offsets=np.load(os.path.join(path, "offsets.npy"), mmap_mode=mode),
+            meta=np.load(os.path.join(path, "meta.npy"), mmap_mode=mode),
+            docs=docs
+        )
+
+    @staticmethod
+    def exists(path):
+        return all(os.path.exists(os.path.join(path, name)) for name in _FILES)
@@ -1,3 +1,6 @@
+import re
+
+
 def chunk_text(text: str, chunk_size=300, overlap=50):
     words = text.split()
     chunks = []
@@ -7,3 +10,20 @@ def chunk_text(text: str, chunk_size=300, overlap=50):
         chunks.append(" ".join(chunk))
         i += chunk_size - overlap
     return chunks
+
+
+def chunk_spans(text: str, chunk_size=300, overlap=50):
+    """(start, end) у символах text для кожного чанка chunk_text з тими самими параметрами."""
+    words = [m.span() for m in re.finditer(r"\S+", text)]
+    spans = []
+    i = 0
+    while i < len(words):
+        last = min(i + chunk_size, len(words)) - 1
+        spans.append((words[i][0], words[last][1]))
+        i += chunk_size - overlap
+    return spans
+
+
+def normalize_query(text: str) -> str:
+    """Нижній регістр, без пунктуації й зайвих пробілів — для ключів кешів."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
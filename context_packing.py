@@ -0,0 +1,135 @@
+"""
+Збирання контексту для промпту LLM у межах бюджету токенів.
+
+Сусідні чанки одного документа перекриваються на overlap слів, тож кандидати з того самого
+місця зшиваються назад у суцільні фрагменти; речення, що вже траплялися у вищих за релевантністю
+фрагментах, викидаються. Фрагменти додаються за релевантністю, поки не вичерпано бюджет.
+Кожен фрагмент — одне джерело: номер [n] у промпті = позиція в списку sources.
+"""
+import math
+import re
+
+from chunking import normalize_query
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text):
+    """
+    Груба оцінка без токенізатора: ~4 байти UTF-8 на токен — ≈4 символи латиницею
+    і ≈2 кирилицею, що близько до BPE-токенізаторів OpenAI-сумісних моделей.
+    """
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+def split_sentences(text):
+    return [s for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+class Passage:
+    """Фрагмент контексту: зшиті чанки одного документа (ids — у порядку документа)."""
+
+    __slots__ = ("text", "ids", "label", "rank", "tokens")
+
+    def __init__(self, text, ids, label, rank):
+        self.text = text
+        self.ids = ids
+        self.label = label
+        self.rank = rank
+        self.tokens = 0
+
+
+def merge_neighbours(candidates, store, chunking, label=None):
+    """
+    candidates — [(text, score, idx)] за спаданням релевантності. Чанки одного документа, що
+    перекриваються чи стикаються (за ordinal і кроком chunk_size - overlap), зшиваються в один Passage.
+    Повертає фрагменти за найкращою позицією їхніх чанків у candidates.
+    """
+    label = label or store.label
+    step = chunking["chunk_size"] - chunking["overlap"]
+    by_doc = {}
+    for rank, (text, _, idx) in enumerate(candidates):
+        row = store.meta[idx]
+        by_doc.setdefault(int(row["doc"]), []).append((int(row["ordinal"]), rank, idx, text))
+
+    passages = []
+    for doc, items in by_doc.items():
+        items.sort()
+        group = []
+        end = None
+        for ordinal, rank, idx, text in items:
+            start = ordinal * step
+            if group and start > end:
+                passages.append(_stitch(group, step, store.docs[doc], label))
+                group = []
+            chunk_end = start + len(text.split())
+            end = max(end, chunk_end) if group else chunk_end
+            group.append((ordinal, rank, idx, text))
+        passages.append(_stitch(group, step, store.docs[doc], label))
+    passages.sort(key=lambda p: p.rank)
+    return passages
+
+
+def _stitch(group, step, fname, label):
+    if len(group) == 1:
+        ordinal, rank, idx, text = group[0]
+        return Passage(text, [idx], label(idx), rank)
+    words = []
+    covered = group[0][0] * step
+    for ordinal, _, _, text in group:
+        chunk_words = text.split()
+        start = ordinal * step
+        words.extend(chunk_words[max(0, covered - start):])
+        covered = max(covered, start + len(chunk_words))
+    first, last = group[0][0], group[-1][0]
+    return Passage(" ".join(words), [g[2] for g in group], f"{fname} — chunks {first}–{last}",
+                   min(g[1] for g in group))
+
+
+def pack_context(candidates, store, chunking, budget=None, count_tokens=estimate_tokens, label=None):
+    """
+    Фрагменти для промпту: зшиті сусіди, без повторених речень, сумарно не більше budget токенів
+    (None — без обмеження). Фрагмент, від якого нічого не лишилось, не отримує номера.
+    Якщо вже перший фрагмент не влазить у бюджет, він обрізається по словах.
+    """
+    packed = []
+    seen = set()
+    used = 0
+    for passage in merge_neighbours(candidates, store, chunking, label):
+        kept = []
+        full = False
+        for sentence in split_sentences(passage.text):
+            key = normalize_query(sentence)
+            if not key or key in seen:
+                continue
+            tokens = count_tokens(sentence)
+            if budget is not None and used + tokens > budget:
+                if not packed and not kept:
+                    sentence = _truncate(sentence, budget - used, count_tokens)
+                    tokens = count_tokens(sentence)
+                    kept.append(sentence)
+                    used += tokens
+                full = True
+                break
+            seen.add(key)
+            kept.append(sentence)
+            used += tokens
+        if kept:
+            passage.text = " ".join(kept)
+            passage.tokens = count_tokens(passage.text)
+            packed.append(passage)
+        if full:
+            break
+    return packed
+
+
+def _truncate(text, budget, count_tokens):
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:max(lo, 1)])
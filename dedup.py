@@ -0,0 +1,250 @@
+"""
+Дедуплікація чанків під час індексації: точні копії (хеш тексту) і майже-копії (MinHash + LSH).
+
+Кожен різний чанк зберігається в ChunkStore один раз; усі місця, де він трапляється в корпусі,
+лишаються як зворотні посилання (locations) — для цитат у джерелах відповіді. Майже-копія
+не індексується окремо: її представляє перший знайдений чанк з оцінкою Jaccard ≥ threshold.
+
+Оновлення документа йде у два кроки: plan() — без змін стану (поки кодуються нові чанки),
+commit() — після store.append, повертає чанки, на які більше ніщо не посилається (tombstone).
+"""
+import hashlib
+import zlib
+
+import numpy as np
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def exact_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class DedupPlan:
+    """Результат plan(): ids — чанк для кожної позиції документа, fresh* — що дописати в store."""
+
+    def __init__(self, doc, start):
+        self.doc = doc
+        self.start = start
+        self.ids = []
+        self.fresh, self.ordinals, self.spans = [], [], []
+        self.locations = []  # (id, (doc, ordinal, start, end))
+        self.keys, self.signatures = [], []  # для fresh, у тому ж порядку
+        self.exact = 0
+        self.near = 0
+
+
+class ChunkDeduper:
+    """
+    Стан дедуплікації для одного ChunkStore.
+
+    near=False — лише точні копії. num_perm = bands × rows; чим більше bands, тим менші
+    пари Jaccard потрапляють у кандидати (кандидати все одно перевіряються за threshold).
+    Чанки, що вже є в store (напр. відкритого з shard), індексуються ліниво — при першому plan().
+    """
+
+    def __init__(self, store, near=True, threshold=0.8, num_perm=64, bands=16, shingle_size=3, seed=1, refs=None):
+        if num_perm % bands:
+            raise ValueError(f"num_perm={num_perm} must be divisible by bands={bands}")
+        self.store = store
+        self.near = near
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        # id → усі місця (doc, ordinal, start, end); лише для чанків, у яких місце не одне —
+        # для решти єдине місце записане в store.meta
+        self.refs = refs if refs is not None else {}
+        self._exact = {}  # ключ тексту → id
+        self._signatures = {}  # id → MinHash-підпис
+        self._buckets = [{} for _ in range(bands)]
+        self._dead = set()
+        self._indexed = 0
+        self.stats = {"chunks": 0, "unique": 0, "exact": 0, "near": 0}
+
+    def params(self):
+        return {
+            "near": self.near, "threshold": self.threshold, "num_perm": self.num_perm,
+            "bands": self.bands, "shingle_size": self.shingle_size, "seed": self.seed,
+        }
+
+    # -------------------------
+    # MinHash / LSH
+    # -------------------------
+
+    def signature(self, text):
+        words = text.lower().split()
+        n = self.shingle_size
+        shingles = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # (a·x + b) mod p: a, x < 2^32, тож добуток вміщується в uint64 без переповнення
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        rows = self.num_perm // self.bands
+        return [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+    def _register(self, i, key, signature):
+        self._exact.setdefault(key, i)
+        if signature is None:
+            return
+        self._signatures[i] = signature
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(i)
+
+    def _forget(self, i):
+        self._dead.add(i)
+        signature = self._signatures.pop(i, None)
+        if signature is not None:
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+                ids = bucket.get(band_key)
+                if ids is not None and i in ids:
+                    ids.remove(i)
+                    if not ids:
+                        del bucket[band_key]
+        key = exact_key(self.store[i])
+        if self._exact.get(key) == i:
+            del self._exact[key]
+
+    def _catch_up(self):
+        """Індексує чанки store, додані в обхід plan()/commit() (напр. завантажені з shard)."""
+        store = self.store
+        for i in range(self._indexed, len(store)):
+            if i not in self._dead and i not in self._signatures:
+                text = store[i]
+                self._register(i, exact_key(text), self.signature(text) if self.near else None)
+        self._indexed = max(self._indexed, len(store))
+
+    def _nearest(self, signature):
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+        best, best_sim = None, self.threshold
+        for i in sorted(candidates):
+            sim = float(np.mean(self._signatures[i] == signature))
+            if sim >= best_sim and (best is None or sim > best_sim):
+                best, best_sim = i, sim
+        return best
+
+    # -------------------------
+    # Оновлення
+    # -------------------------
+
+    def plan(self, fname, chunks, spans, start):
+        """
+        Розкладає чанки документа fname на вже відомі й нові. start — len(store) на момент
+        майбутнього store.append(fname, plan.fresh, plan.ordinals, plan.spans). Стан не змінюється.
+        """
+        self._catch_up()
+        plan = DedupPlan(self.store.doc_id(fname), start)
+        local_exact = {}
+        local_signatures = []
+        for j, text in enumerate(chunks):
+            span = tuple(int(x) for x in spans[j]) if spans is not None else (-1, -1)
+            key = exact_key(text)
+            signature = None
+            i = self._exact.get(key, local_exact.get(key))
+            if i is not None:
+                plan.exact += 1
+            elif self.near:
+                signature = self.signature(text)
+                i = self._nearest(signature)
+                if i is None and local_signatures:
+                    sims = np.mean(np.stack(local_signatures) == signature, axis=1)
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.threshold:
+                        i = start + best
+                if i is not None:
+                    plan.near += 1
+            if i is None:
+                i = start + len(plan.fresh)
+                local_exact[key] = i
+                if signature is not None:
+                    local_signatures.append(signature)
+                plan.fresh.append(text)
+                plan.ordinals.append(j)
+                plan.spans.append(span)
+                plan.keys.append(key)
+                plan.signatures.append(signature)
+            plan.ids.append(i)
+            plan.locations.append((i, (plan.doc, j) + span))
+        return plan
+
+    def _row(self, i):
+        row = self.store.meta[i]
+        return int(row["doc"]), int(row["ordinal"]), int(row["start"]), int(row["end"])
+
+    def locations(self, i):
+        """Усі місця чанка i в корпусі: [(doc id, ordinal, start, end)], першим — основне."""
+        refs = self.refs.get(i)
+        return list(refs) if refs is not None else [self._row(i)]
+
+    def commit(self, plan, old_ids=()):
+        """
+        Застосовує plan після store.append; old_ids — попередні чанки цього документа.
+        Повертає id чанків, на які більше не посилається жоден документ.
+        """
+        fresh_end = plan.start + len(plan.fresh)
+        for k, (key, signature) in enumerate(zip(plan.keys, plan.signatures)):
+            self._register(plan.start + k, key, signature)
+        self._indexed = max(self._indexed, fresh_end)
+
+        new_locations = {}
+        for i, location in plan.locations:
+            new_locations.setdefault(i, []).append(location)
+        for i in old_ids:
+            new_locations.setdefault(i, [])
+
+        dead = []
+        for i, locations in new_locations.items():
+            current = [] if plan.start <= i < fresh_end else self.locations(i)
+            merged = [loc for loc in current if loc[0] != plan.doc] + locations
+            if not merged:
+                self.refs.pop(i, None)
+                self._forget(i)
+                dead.append(i)
+            elif len(merged) == 1 and merged[0] == self._row(i):
+                self.refs.pop(i, None)
+            else:
+                self.refs[i] = merged
+
+        self.stats["chunks"] += len(plan.ids)
+        self.stats["unique"] += len(plan.fresh)
+        self.stats["exact"] += plan.exact
+        self.stats["near"] += plan.near
+        return sorted(dead)
+
+    def release(self, fname, ids):
+        """Документ прибрано з корпусу: повертає id чанків, що стали нікому не потрібні."""
+        return self.commit(DedupPlan(self.store.doc_id(fname), len(self.store)), ids)
+
+    # -------------------------
+    # Звіт і збереження
+    # -------------------------
+
+    def report(self):
+        """Скільки чанків побачено, скільки збережено і скільки відкинуто як точні / майже-копії."""
+        stats = dict(self.stats)
+        stats["duplicates"] = stats["exact"] + stats["near"]
+        stats["ratio"] = stats["unique"] / stats["chunks"] if stats["chunks"] else 1.0
+        stats["shared_chunks"] = len(self.refs)
+        return stats
+
+    def refs_array(self, dtype):
+        """refs одним структурованим масивом (chunk, doc, ordinal, start, end) — для shard."""
+        rows = [(i,) + loc for i in sorted(self.refs) for loc in self.refs[i]]
+        return np.array(rows, dtype=dtype) if rows else np.zeros(0, dtype=dtype)
+
+    @staticmethod
+    def refs_from_array(array):
+        refs = {}
+        for row in array.tolist():
+            refs.setdefault(row[0], []).append(tuple(row[1:]))
+        return refs
@@ -0,0 +1,209 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+MANIFEST_VERSION = 2
+# скільки рядків за раз копіюється в нову матрицю при перезаписі кешу
+COPY_BLOCK_ROWS = 8192
+# скільки чанків за раз іде в encode_fn: пам'ять під тексти й вектори не залежить від розміру корпусу
+ENCODE_BATCH_SIZE = 256
+
+
+def chunk_key(text: str, model_name: str) -> bytes:
+    """Ключ кешу: хеш тексту чанка разом з назвою моделі (16 байт)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(text.encode("utf-8"))
+    return h.digest()
+
+
+def _safe_dirname(name: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in name)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed кеш ембедингів на диску.
+
+    Структура каталогу (окремий підкаталог на кожну модель):
+      manifest.json          — версія, модель, розмірність, кількість рядків, імена файлів поточної версії
+      keys-<hash>.npy        — масив ключів chunk_key (dtype S16), i-й ключ ↔ i-й рядок матриці
+      embeddings-<hash>.npy  — матриця float32 (N, dim), відкривається через mmap
+
+    <hash> — хеш набору ключів. Нова версія пишеться в нові файли, а комітом є атомарна заміна
+    manifest.json, що їх називає: після збою посередині manifest і далі вказує на цілу попередню версію.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, _safe_dirname(model_name))
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+
+    def keys_for(self, chunks) -> np.ndarray:
+        return np.array([chunk_key(c, self.model_name) for c in chunks], dtype="S16")
+
+    @staticmethod
+    def _keys_hash(keys: np.ndarray) -> str:
+        return hashlib.blake2b(np.ascontiguousarray(keys).tobytes(), digest_size=16).hexdigest()
+
+    def fingerprint(self) -> str:
+        """Хеш поточного набору ключів — щоб похідні індекси (ANN) знали, що корпус не змінився."""
+        manifest = self._read_manifest()
+        return manifest["fingerprint"] if manifest else ""
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("model") != self.model_name:
+            return None
+        for name in ("keys", "matrix"):
+            if not os.path.exists(os.path.join(self.dir, manifest.get(name) or "")):
+                return None
+        return manifest
+
+    def _open_stored(self):
+        """Повертає (keys, matrix, manifest) з диска або (None, None, None), якщо кешу немає/він битий."""
+        manifest = self._read_manifest()
+        if manifest is None:
+            return None, None, None
+        try:
+            keys = np.load(os.path.join(self.dir, manifest["keys"]), mmap_mode="r")
+            matrix = np.load(os.path.join(self.dir, manifest["matrix"]), mmap_mode="r")
+        except (OSError, ValueError):
+            return None, None, None
+        if len(keys) != manifest.get("count") or matrix.shape[0] != len(keys):
+            return None, None, None
+        return keys, matrix, manifest
+
+    def _open_matrix(self, manifest) -> np.ndarray:
+        # mode "c" (copy-on-write): без копіювання в RAM, але масив writable — torch.from_numpy не скаржиться
+        return np.load(os.path.join(self.dir, manifest["matrix"]), mmap_mode="c")
+
+    def load(self, chunks, encode_fn, batch_size=ENCODE_BATCH_SIZE) -> np.ndarray:
+        """
+        Повертає матрицю ембедингів для chunks (рядок i ↔ chunks[i]).
+        encode_fn(list[str]) -> np.ndarray викликається лише для нових/змінених чанків, батчами по batch_size;
+        готові вектори одразу йдуть у тимчасовий файл на диску, а не накопичуються в пам'яті.
+        Якщо набір і порядок чанків не змінились — файл просто відкривається через mmap.
+        """
+        keys = self.keys_for(chunks)
+        stored_keys, stored, manifest = self._open_stored()
+
+        if stored_keys is not None and np.array_equal(stored_keys, keys):
+            return self._open_matrix(manifest)
+
+        row_of = {}
+        if stored_keys is not None:
+            row_of = {bytes(k): i for i, k in enumerate(stored_keys)}
+
+        # кодуємо тільки унікальні ключі, яких немає в кеші
+        missing = {}
+        for i, k in enumerate(keys):
+            k = bytes(k)
+            if k not in row_of and k not in missing:
+                missing[k] = i
+        fresh, fresh_path = None, None
+        try:
+            if missing:
+                fresh_path = os.path.join(self.dir, f"fresh.npy.tmp{os.getpid()}")
+                fresh = self._encode_to_file(fresh_path, chunks, list(missing.values()), encode_fn, batch_size)
+                dim = fresh.shape[1]
+            elif stored is not None:
+                dim = stored.shape[1]
+            else:
+                return np.empty((0, 0), dtype=np.float32)
+
+            # для кожного рядка нової матриці — рядок у fresh або в stored (-1 — не звідти)
+            fresh_row = {k: j for j, k in enumerate(missing)}
+            fresh_rows = np.array([fresh_row.get(bytes(k), -1) for k in keys], dtype=np.int64)
+            stored_rows = np.array([row_of.get(bytes(k), -1) for k in keys], dtype=np.int64)
+            manifest = self._write(keys, dim, [(fresh, fresh_rows), (stored, stored_rows)])
+        finally:
+            # закриваємо старі mmap до прибирання попередніх версій (на Windows інакше видалення падає);
+            # тимчасовий файл прибирається й тоді, коли encode_fn впав посеред кодування
+            del stored, stored_keys, fresh
+            if fresh_path is not None and os.path.exists(fresh_path):
+                os.remove(fresh_path)
+        return self._open_matrix(manifest)
+
+    def _encode_to_file(self, path, chunks, ids, encode_fn, batch_size):
+        """Кодує chunks[ids] батчами у .npy-файл (mmap) і повертає його; тексти читаються по батчу."""
+        os.makedirs(self.dir, exist_ok=True)
+        out = None
+        for start in range(0, len(ids), batch_size):
+            texts = [chunks[i] for i in ids[start:start + batch_size]]
+            vectors = np.asarray(encode_fn(texts), dtype=np.float32)
+            if out is None:
+                out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(ids), vectors.shape[1]))
+            out[start:start + len(vectors)] = vectors
+        out.flush()
+        return out
+
+    def _write(self, keys: np.ndarray, dim: int, sources):
+        """
+        Пише нову версію кешу в порядку keys (щоб наступний старт був zero-copy) і комітить її заміною
+        manifest.json. sources — [(матриця або None, номер рядка в ній для кожного ключа або -1)];
+        рядки копіюються блоками по COPY_BLOCK_ROWS. Повертає новий manifest.
+        """
+        os.makedirs(self.dir, exist_ok=True)
+        suffix = f".tmp{os.getpid()}"
+        fingerprint = self._keys_hash(keys)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "model": self.model_name,
+            "dim": int(dim),
+            "count": int(len(keys)),
+            "fingerprint": fingerprint,
+            "keys": f"keys-{fingerprint}.npy",
+            "matrix": f"embeddings-{fingerprint}.npy"
+        }
+        matrix_path = os.path.join(self.dir, manifest["matrix"])
+        keys_path = os.path.join(self.dir, manifest["keys"])
+
+        out = np.lib.format.open_memmap(matrix_path + suffix, mode="w+", dtype=np.float32, shape=(len(keys), dim))
+        for start in range(0, len(keys), COPY_BLOCK_ROWS):
+            block = out[start:start + COPY_BLOCK_ROWS]
+            for matrix, rows in sources:
+                if matrix is None:
+                    continue
+                rows = rows[start:start + len(block)]
+                take = rows >= 0
+                if take.any():
+                    block[take] = matrix[rows[take]]
+        out.flush()
+        del out
+        with open(keys_path + suffix, "wb") as f:
+            np.save(f, keys)
+        # файли версії — під новими іменами: поки manifest не замінено, читачі бачать попередню версію цілою;
+        # os.replace атомарний у межах однієї ФС — паралельні воркери не побачать напівзаписаний файл
+        os.replace(matrix_path + suffix, matrix_path)
+        os.replace(keys_path + suffix, keys_path)
+
+        previous = self._read_manifest()
+        with open(self.manifest_path + suffix, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + suffix, self.manifest_path)
+        self._remove_stale(manifest, previous)
+        return manifest
+
+    def _remove_stale(self, manifest, previous) -> None:
+        # попередня версія лишається: інший процес міг щойно прочитати старий manifest і ще відкриває її файли
+        keep = {manifest["keys"], manifest["matrix"]}
+        if previous is not None:
+            keep |= {previous["keys"], previous["matrix"]}
+        for path in glob.glob(os.path.join(self.dir, "*.npy")):
+            name = os.path.basename(path)
+            if name.startswith(("keys", "embeddings")) and name not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
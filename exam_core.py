@@ -1,13 +1,18 @@
-import json
 import os
 import random
+import re
+import threading
 from dataclasses import dataclass, asdict
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
 
+from exam_store import EXAMS_DB_DIR, ExamStore
+from llm_client import LLMClient, get_client
+from student_registry import STUDENTS_PATH, StudentRegistry
+
 DATA_DIR = "data"
+# старий журнал подій; переноситься в EXAMS_DB_DIR командою python -m exam_store migrate
 EXAMS_PATH = os.path.join(DATA_DIR, "exams.jsonl")
-STUDENTS_PATH = "students.json"
 
 ALL_TOPICS = [
     "Tokenization",
@@ -77,23 +82,82 @@ RUBRIC = """
 score: X
 feedback: ...
 """.strip()
+GRADER_SYSTEM_PROMPT = "Ти суворий, але чесний екзаменатор з NLP."
+
+
+# OFFLINE евристика: ключові слова теми
+TOPIC_KEYWORDS = {
+    "Tokenization": ["bpe", "wordpiece", "subword", "токен", "vocab"],
+    "Word Embeddings": ["embedding", "word2vec", "glove", "cosine", "context"],
+    "Language Modeling": ["perplexity", "masked", "causal", "lm", "ймовір"],
+    "Attention & Transformers": ["attention", "q", "k", "v", "self-attention", "transformer"],
+    "Sequence Labeling (NER, POS)": ["ner", "pos", "sequence", "crf", "tag"],
+    "Text Classification": ["classification", "labels", "tf-idf", "bag", "fine-tune"],
+    "Evaluation Metrics (BLEU, ROUGE, F1)": ["f1", "precision", "recall", "bleu", "rouge", "accuracy"],
+    "Overfitting & Regularization": ["overfit", "dropout", "l2", "regular", "early stopping"],
+    "Data Leakage & Train/Test Split": ["leakage", "split", "cross-validation", "train", "test"],
+    "Prompting & RAG basics": ["rag", "retrieval", "context", "chunk", "vector"]
+}
+
+
+class KeywordMatcher:
+    """
+    Усі ключові слова, що трапляються в тексті як підрядки, за один прохід regex.
+    Lookahead знаходить збіг на кожній позиції (тож "attention" всередині "self-attention" теж
+    рахується); на позиції береться найдовше слово, а коротші, що є його префіксами, додаються з таблиці.
+    """
+
+    def __init__(self, keywords: List[str]):
+        words = sorted(set(k.lower() for k in keywords), key=len, reverse=True)
+        self.pattern = re.compile("(?=(" + "|".join(map(re.escape, words)) + "))") if words else None
+        self.implied = {w: frozenset(p for p in words if w.startswith(p)) for w in words}
+
+    def matches(self, text: str) -> set:
+        found = set()
+        if self.pattern is not None:
+            for m in self.pattern.finditer(text.lower()):
+                found |= self.implied[m.group(1)]
+        return found
+
+
+_MATCHERS = {topic: KeywordMatcher(words) for topic, words in TOPIC_KEYWORDS.items()}
+_NO_MATCHER = KeywordMatcher([])
 
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
+# students.json у пам'яті з індексом за email/ім'ям; перечитується, лише коли файл змінився
+STUDENTS = StudentRegistry(STUDENTS_PATH)
+
+
 def _load_students() -> List[Dict]:
-    if not os.path.exists(STUDENTS_PATH):
-        return []
-    with open(STUDENTS_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return STUDENTS.all()
+
 
+# події іспитів: SQLite (WAL) з індексами за email/датою/темою, запис батчами у фоні (exam_store.py);
+# створюється при першій події, а не при імпорті модуля заради констант
+_events: Optional[ExamStore] = None
+_events_lock = threading.Lock()
 
-def _append_jsonl(path: str, obj: Dict) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+def get_events() -> ExamStore:
+    """Сховище подій іспитів процесу (EXAMS_DB_DIR)."""
+    global _events
+    if _events is None:
+        with _events_lock:
+            if _events is None:
+                _events = ExamStore(EXAMS_DB_DIR)
+    return _events
+
+
+def set_events(store: ExamStore) -> Optional[ExamStore]:
+    """Підміняє сховище подій (інший каталог, тести); повертає попереднє."""
+    global _events
+    with _events_lock:
+        previous, _events = _events, store
+    return previous
 
 
 @dataclass
@@ -125,15 +189,11 @@ def start_exam(email: str, name: str) -> List[str]:
     Перевіряє, що студент існує у "базі" students.json.
     Пише запис про старт і повертає 2-3 випадкові теми.
     """
-    students = _load_students()
-    exists = any(s["email"].strip().lower() == email.strip().lower() and
-                 s["name"].strip().lower() == name.strip().lower()
-                 for s in students)
-    if not exists:
+    if not STUDENTS.exists(email, name):
         raise ValueError("Student not found in database. Please re-check name/email.")
 
     topics = random.sample(ALL_TOPICS, k=random.choice([2, 3]))
-    _append_jsonl(EXAMS_PATH, {
+    get_events().append({
         "event": "start_exam",
         "email": email,
         "name": name,
@@ -157,7 +217,7 @@ def end_exam(email: str, score: float, history: List[Dict]) -> None:
     """
     Записує результат іспиту. history — повна історія чату.
     """
-    _append_jsonl(EXAMS_PATH, {
+    get_events().append({
         "event": "end_exam",
         "email": email,
         "score": score,
@@ -175,28 +235,17 @@ def call_openai_compatible_chat(
     base_url: str,
     model: str,
     messages: List[Dict],
-    timeout: int = 40
+    timeout: int = 40,
+    client: Optional[LLMClient] = None
 ) -> str:
     """
     Працює з будь-яким OpenAI-compatible Chat Completions endpoint:
     POST {base_url}/chat/completions
+    Через спільний з llm.py клієнт (llm_client.py): пул з'єднань, ліміти, повтори 429/5xx.
+    client — інший клієнт зі своїми лімітами (напр., пакетне оцінювання), None — спільний.
     """
-    import requests
-
-    url = base_url.rstrip("/") + "/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model,
-        "messages": messages,
-        "temperature": 0.2
-    }
-    r = requests.post(url, headers=headers, json=payload, timeout=timeout)
-    r.raise_for_status()
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
+    client = client if client is not None else get_client()
+    return client.chat(api_key, base_url, model, messages, temperature=0.2, timeout=timeout)
 
 
 def grade_answer(
@@ -206,7 +255,8 @@ def grade_answer(
     use_llm: bool,
     api_key: str,
     base_url: str,
-    model: str
+    model: str,
+    client: Optional[LLMClient] = None
 ) -> Tuple[float, str]:
     """
     Повертає (score, feedback).
@@ -217,50 +267,42 @@ def grade_answer(
 
     if use_llm and api_key.strip():
         prompt = [
-            {"role": "system", "content": "Ти суворий, але чесний екзаменатор з NLP."},
+            {"role": "system", "content": GRADER_SYSTEM_PROMPT},
             {"role": "user", "content": f"Тема: {topic}\nПитання: {question}\nВідповідь студента: {answer}\n\n{RUBRIC}"}
         ]
-        raw = call_openai_compatible_chat(api_key, base_url, model, prompt)
-        # простий парсер формату
-        score = 0.0
-        feedback = raw.strip()
-        for line in raw.splitlines():
-            if line.lower().startswith("score:"):
-                try:
-                    score = float(line.split(":", 1)[1].strip())
-                except:
-                    pass
-            if line.lower().startswith("feedback:"):
-                feedback = line.split(":", 1)[1].strip()
-        score = max(0.0, min(10.0, score))
-        return score, feedback if feedback else "Дякую, рухаємось далі."
-    else:
-        # OFFLINE евристика: ключові слова + структура
-        keywords = {
-            "Tokenization": ["bpe", "wordpiece", "subword", "токен", "vocab"],
-            "Word Embeddings": ["embedding", "word2vec", "glove", "cosine", "context"],
-            "Language Modeling": ["perplexity", "masked", "causal", "lm", "ймовір"],
-            "Attention & Transformers": ["attention", "q", "k", "v", "self-attention", "transformer"],
-            "Sequence Labeling (NER, POS)": ["ner", "pos", "sequence", "crf", "tag"],
-            "Text Classification": ["classification", "labels", "tf-idf", "bag", "fine-tune"],
-            "Evaluation Metrics (BLEU, ROUGE, F1)": ["f1", "precision", "recall", "bleu", "rouge", "accuracy"],
-            "Overfitting & Regularization": ["overfit", "dropout", "l2", "regular", "early stopping"],
-            "Data Leakage & Train/Test Split": ["leakage", "split", "cross-validation", "train", "test"],
-            "Prompting & RAG basics": ["rag", "retrieval", "context", "chunk", "vector"]
-        }
-        hits = 0
-        low = answer.lower()
-        for kw in keywords.get(topic, []):
-            if kw in low:
-                hits += 1
-        length_bonus = 1 if len(answer.strip()) > 250 else 0
-        score = min(10.0, 3.0 + hits * 1.3 + length_bonus * 1.2)
-        feedback = "В цілому ок. Додай більше чітких визначень і 1-2 приклади/порівняння."
-        if score >= 8:
-            feedback = "Добре! Відповідь виглядає впевнено. Можна ще додати приклад для закріплення."
-        elif score <= 5:
-            feedback = "Є частково правильні думки, але бракує ключових термінів/структури. Спробуй чіткіше."
-        return float(round(score, 1)), feedback
+        raw = call_openai_compatible_chat(api_key, base_url, model, prompt, client=client)
+        return parse_grade(raw)
+    return grade_offline(topic, answer)
+
+
+def parse_grade(raw: str) -> Tuple[float, str]:
+    """Відповідь LLM у форматі RUBRIC ("score: X" / "feedback: ...") → (score, feedback)."""
+    # простий парсер формату
+    score = 0.0
+    feedback = raw.strip()
+    for line in raw.splitlines():
+        if line.lower().startswith("score:"):
+            try:
+                score = float(line.split(":", 1)[1].strip())
+            except:
+                pass
+        if line.lower().startswith("feedback:"):
+            feedback = line.split(":", 1)[1].strip()
+    score = max(0.0, min(10.0, score))
+    return score, feedback if feedback else "Дякую, рухаємось далі."
+
+
+def grade_offline(topic: str, answer: str) -> Tuple[float, str]:
+    """OFFLINE евристика: ключові слова теми (KeywordMatcher, скомпільований один раз) + структура."""
+    hits = len(_MATCHERS.get(topic, _NO_MATCHER).matches(answer))
+    length_bonus = 1 if len(answer.strip()) > 250 else 0
+    score = min(10.0, 3.0 + hits * 1.3 + length_bonus * 1.2)
+    feedback = "В цілому ок. Додай більше чітких визначень і 1-2 приклади/порівняння."
+    if score >= 8:
+        feedback = "Добре! Відповідь виглядає впевнено. Можна ще додати приклад для закріплення."
+    elif score <= 5:
+        feedback = "Є частково правильні думки, але бракує ключових термінів/структури. Спробуй чіткіше."
+    return float(round(score, 1)), feedback
 
 
 def pick_question(topic: str, asked_questions: List[str]) -> str:
@@ -0,0 +1,508 @@
+"""
+Сховище подій іспиту (start_exam / end_exam) замість одного append-only exams.jsonl.
+
+Події пишуться в SQLite у режимі WAL, по сегменту (файлу) на місяць: data/exams/exams-2026-10.db.
+append() перевіряє обов'язкові поля й лише ставить подію в чергу; фоновий потік пише чергу батчами
+(одна транзакція на батч, кожна подія — у своєму SAVEPOINT, тож зіпсована подія не відкочує решту),
+тож виклик з обробника запиту не чекає на диск. Батч, який не вдалося записати (сегмент заблоковано,
+диск заповнено), не відкидається: він лишається в черзі й повторюється, а помилку отримують flush()
+і наступні append(), доки запис не вдасться. Кілька процесів можуть писати в ті самі
+сегменти одночасно — WAL і busy_timeout серіалізують транзакції.
+
+Історія чату зберігається окремою таблицею, тож запити по подіях її не читають. Індекси —
+за email, датою й темою; запит за період відкриває лише сегменти цього періоду.
+
+  python -m exam_store migrate data/exams.jsonl      # одноразовий перенос старого журналу
+  python -m exam_store stats --since 2026-10-01      # середній бал за темами
+"""
+import argparse
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+EXAMS_DB_DIR = os.path.join("data", "exams")
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT UNIQUE NOT NULL,
+    event TEXT NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT,
+    datetime TEXT NOT NULL,
+    date TEXT NOT NULL,
+    score REAL,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS events_email ON events (email, datetime);
+CREATE INDEX IF NOT EXISTS events_date ON events (date, event);
+CREATE TABLE IF NOT EXISTS event_topics (
+    event_id INTEGER NOT NULL REFERENCES events (id),
+    topic TEXT NOT NULL,
+    date TEXT NOT NULL,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS event_topics_topic ON event_topics (topic, date);
+CREATE INDEX IF NOT EXISTS event_topics_event ON event_topics (event_id);
+CREATE TABLE IF NOT EXISTS histories (
+    event_id INTEGER PRIMARY KEY REFERENCES events (id),
+    history TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS migrations (
+    source TEXT PRIMARY KEY,
+    events INTEGER NOT NULL,
+    datetime TEXT NOT NULL
+);
+"""
+
+_FLUSH = object()
+_STOP = object()
+_REQUIRED = ("event", "email", "datetime")
+
+
+def validate_event(event: Dict) -> None:
+    """ValueError, якщо подія не має event, email чи datetime (ISO) — без них її не покласти в сегмент."""
+    if not isinstance(event, dict):
+        raise ValueError(f"Exam event must be an object, got {type(event).__name__}")
+    for field in _REQUIRED:
+        value = event.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"Exam event is missing required field {field!r}")
+    try:
+        datetime.fromisoformat(event["datetime"])
+    except ValueError:
+        raise ValueError(f"Exam event datetime is not ISO 8601: {event['datetime']!r}") from None
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class ExamStore:
+    """
+    batch_size — скільки подій пишеться однією транзакцією, flush_interval — як довго
+    подія може чекати в черзі (с), retry_interval — пауза перед повтором батчу, що не записався (с).
+    Запити спершу дописують чергу (read-your-writes).
+    """
+
+    def __init__(self, root: str = EXAMS_DB_DIR, batch_size: int = 100, flush_interval: float = 0.2,
+                 retry_interval: float = 1.0):
+        self.root = root
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        # помилка останньої спроби запису, поки її батч не записано; None — усе записано
+        self._error: Optional[Exception] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        # email → теми останнього start_exam: end_exam отримує ті ж теми без запиту до БД
+        self._last_topics: Dict[str, List[str]] = {}
+        self.written = 0
+
+    # -------------------------
+    # Сегменти
+    # -------------------------
+
+    def segment_path(self, date: str) -> str:
+        return os.path.join(self.root, f"exams-{date[:7]}.db")
+
+    def segments(self, since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+        """Файли сегментів від новіших до старіших; since/until — дати YYYY-MM-DD (включно)."""
+        paths = sorted(glob.glob(os.path.join(self.root, "exams-*.db")), reverse=True)
+        month = lambda p: os.path.basename(p)[len("exams-"):-len(".db")]
+        return [p for p in paths
+                if (since is None or month(p) >= since[:7]) and (until is None or month(p) <= until[:7])]
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        conn = self._connections.get(path)
+        if conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            conn = _connect(path)
+            conn.executescript(_SCHEMA)
+            self._connections[path] = conn
+        return conn
+
+    # -------------------------
+    # Запис
+    # -------------------------
+
+    def append(self, event: Dict) -> None:
+        """
+        Подія з полями event, email, datetime (ISO) і довільними іншими; пишеться асинхронно.
+        RuntimeError, якщо попередні події досі не вдалося записати — подія тоді не приймається.
+        """
+        validate_event(event)
+        self._raise_write_error()
+        self._ensure_writer()
+        # event_id — до черги: повтор батчу після часткового запису не дублює вже записані події
+        self._queue.put(dict(event, event_id=event.get("event_id") or uuid.uuid4().hex))
+
+    def _raise_write_error(self) -> None:
+        error = self._error
+        if error is not None:
+            raise RuntimeError(f"Exam events are not written yet: {error}") from error
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="exam-store-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Чекає, поки все, що вже в черзі, буде записано; RuntimeError, якщо запис не вдався."""
+        self._drain(timeout)
+        self._raise_write_error()
+
+    def _drain(self, timeout: Optional[float] = None) -> None:
+        if self._writer is None:
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait(timeout)
+
+    def close(self) -> None:
+        writer = self._writer
+        if writer is None:
+            return
+        self._queue.put(_STOP)
+        writer.join()
+        self._writer = None
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+    def _run(self) -> None:
+        pending: List[Dict] = []  # батч, що не записався: іде першим у наступну спробу
+        while True:
+            batch, waiters, stop = pending, [], False
+            try:
+                item = self._queue.get(timeout=self.retry_interval) if pending else self._queue.get()
+            except queue.Empty:
+                item = None
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, tuple) and item and item[0] is _FLUSH:
+                    waiters.append(item[1])
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+            pending = []
+            if batch:
+                try:
+                    self._write(batch)
+                    self._error = None
+                except Exception as e:  # потік-писач не має падати (напр., сегмент недоступний)
+                    logger.exception("Failed to write %d exam events, will retry", len(batch))
+                    pending, self._error = batch, e
+            for done in waiters:
+                done.set()
+            if stop:
+                if pending:
+                    logger.error("Exam store closed with %d unwritten events", len(pending))
+                return
+
+    def _write(self, batch: List[Dict]) -> None:
+        by_segment: Dict[str, List[Dict]] = {}
+        for event in batch:
+            by_segment.setdefault(self.segment_path(event["datetime"]), []).append(event)
+        for path, events in by_segment.items():
+            self.written += self._write_segment(path, self._open(path), events, True, self._last_topics, self._open)
+
+    def _write_segment(self, path: str, conn: sqlite3.Connection, events: List[Dict], skip_errors: bool,
+                       last_topics: Dict[str, List[str]], open_segment: Callable[[str], sqlite3.Connection]) -> int:
+        """
+        Одна транзакція на сегмент path; skip_errors — подія, що не вставилась, відкочується лише до свого
+        SAVEPOINT. last_topics (email → теми останнього start_exam) і open_segment (з'єднання для читання
+        інших сегментів) належать тому, хто пише: потоку-писачу або міграції.
+        """
+        written = 0
+        # свій сегмент читається тим самим з'єднанням — воно бачить ще не закомічені події батчу
+        reader = lambda segment: conn if segment == path else open_segment(segment)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")  # блокування запису одразу: читання в _insert не ламає апгрейд
+            for event in events:
+                conn.execute("SAVEPOINT event")
+                try:
+                    inserted = self._insert(conn, event, last_topics, reader)
+                except Exception as e:
+                    if not skip_errors:
+                        raise
+                    conn.execute("ROLLBACK TO event")
+                    logger.error("Skipped %s event of %s: %s", event.get("event"), event.get("email"), e)
+                else:
+                    written += inserted
+                conn.execute("RELEASE event")
+        return written
+
+    def _insert(self, conn: sqlite3.Connection, event: Dict, last_topics: Dict[str, List[str]],
+                open_segment: Callable[[str], sqlite3.Connection]) -> bool:
+        """False — подія з таким event_id вже записана (повтор батчу чи міграції)."""
+        email = event["email"].strip().lower()
+        date = event["datetime"][:10]
+        topics = event.get("topics")
+        if event["event"] == "start_exam" and topics:
+            last_topics[email] = list(topics)
+        elif topics is None and event["event"] == "end_exam":
+            topics = last_topics.pop(email, None)
+            if topics is None:
+                topics = self._topics_from_db(email, event["datetime"], open_segment)
+        payload = {k: v for k, v in event.items()
+                   if k not in ("event", "email", "name", "datetime", "score", "history", "event_id")}
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO events (event_id, event, email, name, datetime, date, score, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (event.get("event_id") or uuid.uuid4().hex, event["event"], email, event.get("name"),
+             event["datetime"], date, event.get("score"), json.dumps(payload, ensure_ascii=False))
+        )
+        if not cur.rowcount:
+            return False
+        rowid = cur.lastrowid
+        if topics:
+            score = event.get("score") if event["event"] == "end_exam" else None
+            conn.executemany(
+                "INSERT INTO event_topics (event_id, topic, date, score) VALUES (?, ?, ?, ?)",
+                [(rowid, topic, date, score) for topic in topics]
+            )
+        if event.get("history") is not None:
+            conn.execute("INSERT INTO histories (event_id, history) VALUES (?, ?)",
+                         (rowid, json.dumps(event["history"], ensure_ascii=False)))
+        return True
+
+    def _topics_from_db(self, email: str, before: str,
+                        open_segment: Callable[[str], sqlite3.Connection]) -> Optional[List[str]]:
+        """Теми останнього start_exam студента не пізніше before (datetime події end_exam)."""
+        for path in self.segments(until=before[:10]):
+            row = open_segment(path).execute(
+                "SELECT payload FROM events WHERE email = ? AND event = 'start_exam' AND datetime <= ? "
+                "ORDER BY datetime DESC LIMIT 1",
+                (email, before)
+            ).fetchone()
+            if row is not None:
+                return json.loads(row[0]).get("topics")
+        return None
+
+    # -------------------------
+    # Запити
+    # -------------------------
+
+    def _read(self, since: Optional[str] = None, until: Optional[str] = None) -> Iterable[sqlite3.Connection]:
+        self._drain()  # читання працює й тоді, коли запис зараз не вдається
+        for path in self.segments(since, until):
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    @staticmethod
+    def _period(since: Optional[str], until: Optional[str], column: str = "date"):
+        clauses, params = [], []
+        if since is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append(f"{column} <= ?")
+            params.append(until)
+        return clauses, params
+
+    def events(self, email: Optional[str] = None, event: Optional[str] = None, topic: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Події (без історії чату) від новіших до старіших; since/until — дати YYYY-MM-DD."""
+        clauses, params = self._period(since, until, "e.date")
+        if email is not None:
+            clauses.append("e.email = ?")
+            params.append(email.strip().lower())
+        if event is not None:
+            clauses.append("e.event = ?")
+            params.append(event)
+        if topic is not None:
+            clauses.append("e.id IN (SELECT event_id FROM event_topics WHERE topic = ?)")
+            params.append(topic)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT e.id, e.event_id, e.event, e.email, e.name, e.datetime, e.score, e.payload, "
+               f"(SELECT json_group_array(topic) FROM event_topics t WHERE t.event_id = e.id) "
+               f"FROM events e {where} ORDER BY e.datetime DESC" + (f" LIMIT {int(limit)}" if limit else ""))
+        rows = []
+        for conn in self._read(since, until):
+            for _, event_id, kind, mail, name, dt, score, payload, topics in conn.execute(sql, params):
+                rows.append(dict(json.loads(payload or "{}"), event_id=event_id, event=kind, email=mail,
+                                 name=name, datetime=dt, score=score, topics=json.loads(topics)))
+            if limit and len(rows) >= limit:
+                break
+        rows.sort(key=lambda r: r["datetime"], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def results_for(self, email: str, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Усі завершені іспити студента: бал, теми, час."""
+        return self.events(email=email, event="end_exam", since=since, until=until)
+
+    def history(self, event_id: str) -> Optional[List[Dict]]:
+        """Повна історія чату події end_exam."""
+        for conn in self._read():
+            row = conn.execute(
+                "SELECT h.history FROM histories h JOIN events e ON e.id = h.event_id WHERE e.event_id = ?",
+                (event_id,)
+            ).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+        return None
+
+    def topic_stats(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Dict]:
+        """{тема: {"exams", "avg_score"}} за завершеними іспитами, у яких була тема."""
+        clauses, params = self._period(since, until)
+        clauses.append("score IS NOT NULL")
+        sql = f"SELECT topic, COUNT(*), SUM(score) FROM event_topics WHERE {' AND '.join(clauses)} GROUP BY topic"
+        return self._merge(sql, params, since, until)
+
+    def daily_stats(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Dict]:
+        """{дата: {"exams", "avg_score"}} за подіями end_exam."""
+        clauses, params = self._period(since, until)
+        clauses.append("event = 'end_exam'")
+        sql = f"SELECT date, COUNT(*), SUM(score) FROM events WHERE {' AND '.join(clauses)} GROUP BY date"
+        return self._merge(sql, params, since, until)
+
+    def _merge(self, sql: str, params: List, since: Optional[str], until: Optional[str]) -> Dict[str, Dict]:
+        # сегменти агрегуються окремо (count, sum) і зводяться тут
+        totals: Dict[str, List] = {}
+        for conn in self._read(since, until):
+            for key, count, total in conn.execute(sql, params):
+                acc = totals.setdefault(key, [0, 0.0])
+                acc[0] += count
+                acc[1] += total or 0.0
+        return {key: {"exams": count, "avg_score": total / count if count else None}
+                for key, (count, total) in sorted(totals.items())}
+
+    # -------------------------
+    # Міграція
+    # -------------------------
+
+    @staticmethod
+    def _read_events(path: str, source: str) -> List[Dict]:
+        """
+        Події файлу — JSON Lines або JSON-масив подій — з перевіркою кожної до запису. Подія без
+        event_id отримує стабільний id з шляху файлу й номера рядка (запису), тож повтор не дублює.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if text.lstrip().startswith("["):
+            records = [(f"record {i}", i, r) for i, r in enumerate(json.loads(text), 1)]
+        else:
+            records = [(f"line {i}", i, json.loads(line)) for i, line in enumerate(text.splitlines(), 1)
+                       if line.strip()]
+        events = []
+        for where, number, record in records:
+            try:
+                validate_event(record)
+            except ValueError as e:
+                raise ValueError(f"{path}, {where}: not an exam event ({e})") from None
+            event = dict(record)
+            event.setdefault("event_id", uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{number}").hex)
+            events.append(event)
+        return events
+
+    def migrate_jsonl(self, path: str) -> int:
+        """
+        Переносить події зі старого exams.jsonl синхронно, по транзакції на сегмент. Файл перевіряється
+        повністю до запису; позначка про міграцію пишеться лише після коміту всіх сегментів, тож після
+        збою міграцію можна просто повторити (стабільні event_id не дають дублів). Повторний виклик
+        для вже перенесеного файлу нічого не робить. Повертає кількість перенесених подій.
+        """
+        source = os.path.abspath(path)
+        # журнал міграцій — окремий файл, щоб не потрапляти в список сегментів
+        marker_path = os.path.join(self.root, "migrations.db")
+        os.makedirs(self.root, exist_ok=True)
+        marker = _connect(marker_path)
+        try:
+            marker.executescript(_SCHEMA)
+            if marker.execute("SELECT 1 FROM migrations WHERE source = ?", (source,)).fetchone():
+                return 0
+            events = self._read_events(path, source)
+            self.flush()  # події з черги — раніше за міграцію (end_exam бере теми з останнього start_exam)
+            by_segment: Dict[str, List[Dict]] = {}
+            for event in events:
+                by_segment.setdefault(self.segment_path(event["datetime"]), []).append(event)
+            # окремі з'єднання й карта тем: з'єднання сегментів і _last_topics належать потоку-писачу
+            last_topics: Dict[str, List[str]] = {}
+            readers: Dict[str, sqlite3.Connection] = {}
+
+            def open_reader(segment: str) -> sqlite3.Connection:
+                if segment not in readers:
+                    readers[segment] = sqlite3.connect(f"file:{segment}?mode=ro", uri=True, timeout=30)
+                return readers[segment]
+
+            try:
+                for segment, segment_events in by_segment.items():
+                    conn = _connect(segment)
+                    try:
+                        conn.executescript(_SCHEMA)
+                        self._write_segment(segment, conn, segment_events, False, last_topics, open_reader)
+                    finally:
+                        conn.close()
+            finally:
+                for reader in readers.values():
+                    reader.close()
+            with marker:
+                marker.execute("INSERT INTO migrations (source, events, datetime) VALUES (?, ?, datetime('now'))",
+                               (source, len(events)))
+        finally:
+            marker.close()
+        return len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=EXAMS_DB_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="перенести події з exams.jsonl")
+    migrate.add_argument("path", nargs="?", default=os.path.join("data", "exams.jsonl"))
+    stats = sub.add_parser("stats", help="середній бал за темами і днями")
+    stats.add_argument("--since")
+    stats.add_argument("--until")
+    student = sub.add_parser("student", help="усі результати студента")
+    student.add_argument("email")
+    args = parser.parse_args()
+
+    store = ExamStore(args.root)
+    if args.command == "migrate":
+        try:
+            print(f"migrated {store.migrate_jsonl(args.path)} events from {args.path}")
+        except ValueError as e:
+            parser.exit(1, f"exam_store: {e}\n")
+    elif args.command == "stats":
+        for title, rows in (("topic", store.topic_stats(args.since, args.until)),
+                            ("date", store.daily_stats(args.since, args.until))):
+            for key, row in rows.items():
+                print(f"{title:>5}  {key:<40} exams {row['exams']:5d}  avg {row['avg_score']:.2f}")
+    else:
+        for r in store.results_for(args.email):
+            print(f"{r['datetime']}  score {r['score']}  {', '.join(r['topics'])}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
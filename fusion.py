@@ -0,0 +1,55 @@
+"""
+Злиття результатів кількох ретриверів перед реранком.
+
+Кожен вхідний список — [(text, score, idx), ...], відсортований за релевантністю.
+Кандидати об'єднуються за idx чанка (один чанк — один слот), а вихід обрізається
+до budget, тож кількість пар для cross-encoder не залежить від k окремих ретриверів.
+"""
+
+FUSION_STRATEGIES = ("rrf", "combsum")
+
+
+def _merge(result_lists, contribution):
+    fused = {}
+    texts = {}
+    for list_no, results in enumerate(result_lists):
+        for rank, (text, score, idx) in enumerate(results):
+            texts.setdefault(idx, text)
+            fused[idx] = fused.get(idx, 0.0) + contribution(list_no, rank, score)
+    # sorted стабільний: при рівних скорах лишається порядок першої появи
+    ranked = sorted(fused, key=lambda idx: fused[idx], reverse=True)
+    return [(texts[idx], fused[idx], idx) for idx in ranked]
+
+
+def reciprocal_rank_fusion(result_lists, weights=None, k=60):
+    """RRF: score = Σ w / (k + rank). Не залежить від шкали скорів ретриверів."""
+    weights = weights or [1.0] * len(result_lists)
+    return _merge(result_lists, lambda list_no, rank, _: weights[list_no] / (k + rank + 1))
+
+
+def _minmax(results):
+    scores = [score for _, score, _ in results]
+    if not scores:
+        return []
+    lo, hi = min(scores), max(scores)
+    if hi == lo:
+        return [1.0] * len(scores)
+    return [(score - lo) / (hi - lo) for score in scores]
+
+
+def combsum(result_lists, weights=None):
+    """Зважений CombSUM над min-max нормалізованими скорами кожного списку."""
+    weights = weights or [1.0] * len(result_lists)
+    normalized = [_minmax(results) for results in result_lists]
+    return _merge(result_lists, lambda list_no, rank, _: weights[list_no] * normalized[list_no][rank])
+
+
+def fuse(result_lists, strategy="rrf", budget=10, weights=None, rrf_k=60):
+    """Злиті й дедупльовані кандидати, не більше budget штук."""
+    if strategy == "rrf":
+        fused = reciprocal_rank_fusion(result_lists, weights, k=rrf_k)
+    elif strategy == "combsum":
+        fused = combsum(result_lists, weights)
+    else:
+        raise ValueError(f"Unknown fusion strategy: {strategy!r} (expected one of {FUSION_STRATEGIES})")
+    return fused[:budget]
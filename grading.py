@@ -0,0 +1,231 @@
+"""
+Пакетне оцінювання відповідей (напр. переоцінка всього потоку після зміни RUBRIC).
+
+grade_batch() проганяє елементи (topic, question, answer) через exam_core.grade_answer
+у пулі потоків: кожен виклик LLM — окремий HTTP round-trip, тож потоки просто чекають на мережу.
+Усі потоки ходять через один LLMClient пакета з його лімітом запитів/с (токен-бакет) і повторами
+тимчасових помилок (429, 5xx, таймаути, обриви з'єднання): ліміт рахує кожну спробу, зокрема повтори,
+а власного циклу повторів тут немає.
+З progress_path кожен оцінений елемент одразу дописується у JSONL, і перерваний запуск
+продовжується з місця зупинки. Перший рядок progress-файлу — налаштування оцінювання (режим,
+base_url, модель, хеш промпту й RUBRIC); з іншими налаштуваннями продовжити не можна, щоб не змішати
+оцінки різних моделей чи рубрик. Однакові елементи (той самий key) оцінюються один раз.
+
+  python -m grading answers.jsonl --workers 8 --rps 4 --progress data/grading/progress.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from exam_core import GRADER_SYSTEM_PROMPT, RUBRIC, grade_answer
+from llm_client import LLMClient
+
+
+@dataclass
+class GradeItem:
+    topic: str
+    question: str
+    answer: str
+    key: str = ""
+
+    def __post_init__(self):
+        if not self.key:
+            raw = json.dumps([self.topic, self.question, self.answer], ensure_ascii=False)
+            self.key = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+@dataclass
+class GradeResult:
+    key: str
+    score: Optional[float]
+    feedback: str
+    error: Optional[str] = None
+
+
+class BatchStats:
+    def __init__(self):
+        self.items = 0
+        self.graded = 0
+        self.resumed = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.retries = 0
+        self.seconds = 0.0
+
+    @property
+    def items_per_sec(self):
+        return self.graded / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "graded": self.graded,
+            "resumed": self.resumed,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "retries": self.retries,
+            "seconds": self.seconds,
+            "items_per_sec": self.items_per_sec,
+        }
+
+    def __str__(self):
+        return (f"{self.graded} graded, {self.resumed} resumed, {self.duplicates} duplicates, {self.failed} failed, "
+                f"{self.retries} retries "
+                f"in {self.seconds:.2f}s: {self.items_per_sec:.1f} items/s")
+
+
+def grading_config(use_llm: bool, api_key: str, base_url: str, model: str) -> Dict:
+    """Від чого залежить оцінка: режим, endpoint і модель LLM, хеш промпту з RUBRIC."""
+    if not (use_llm and api_key.strip()):
+        return {"mode": "offline"}
+    prompt = json.dumps([GRADER_SYSTEM_PROMPT, RUBRIC], ensure_ascii=False)
+    return {
+        "mode": "llm",
+        "base_url": base_url.rstrip("/"),
+        "model": model,
+        "prompt": hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16],
+    }
+
+
+def load_progress(path: str, config: Optional[Dict] = None) -> Dict[str, GradeResult]:
+    """
+    Вже оцінені елементи з progress-файлу (помилкові не рахуються — їх буде повторено).
+    config — налаштування поточного запуску: ValueError, якщо файл записано з іншими.
+    """
+    done = {}
+    if path and os.path.exists(path):
+        # errors="replace": обрив запису може припасти на середину літери
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for n, line in enumerate(f):
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # недописаний рядок після аварійної зупинки
+                if n == 0 and config is not None and row.get("config") != config:
+                    raise ValueError(
+                        f"Progress file {path} was written with grading config {row.get('config')}, "
+                        f"not {config}; use another progress file"
+                    )
+                if "config" in row:
+                    continue
+                if row.get("error") is None:
+                    done[row["key"]] = GradeResult(row["key"], row["score"], row["feedback"])
+    return done
+
+
+def grade_batch(
+    items: Iterable[GradeItem],
+    use_llm: bool,
+    api_key: str,
+    base_url: str,
+    model: str,
+    workers: int = 8,
+    rate_limit: Optional[float] = None,
+    max_retries: int = 2,
+    backoff: float = 0.5,
+    progress_path: Optional[str] = None
+) -> Tuple[List[GradeResult], BatchStats]:
+    """
+    Оцінює items паралельно; результати — у тому ж порядку. rate_limit — запитів/с до LLM
+    (None — без обмеження), max_retries — повтори тимчасових помилок з затримкою backoff·2^n;
+    обидва застосовує LLMClient пакета. Елемент, який так і не вдалося оцінити, має score=None і error.
+    """
+    items = list(items)
+    stats = BatchStats()
+    stats.items = len(items)
+    config = grading_config(use_llm, api_key, base_url, model)
+    done = load_progress(progress_path, config) if progress_path else {}
+    client = LLMClient(max_concurrency=max(1, workers), rate_limit=rate_limit, max_retries=max_retries,
+                       backoff=backoff, pool_size=max(1, workers))
+    stats_lock = threading.Lock()
+    progress = None
+    if progress_path:
+        os.makedirs(os.path.dirname(progress_path) or ".", exist_ok=True)
+        progress = open(progress_path, "a", encoding="utf-8")
+        if progress.tell() == 0:
+            progress.write(json.dumps({"config": config}, ensure_ascii=False) + "\n")
+            progress.flush()
+        else:
+            # недописаний рядок після аварійної зупинки закривається, щоб новий не приклеївся до нього
+            with open(progress_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+            if torn:
+                progress.write("\n")
+                progress.flush()
+
+    def grade(item: GradeItem) -> GradeResult:
+        try:
+            score, feedback = grade_answer(item.topic, item.question, item.answer, use_llm, api_key, base_url, model,
+                                           client=client)
+            result = GradeResult(item.key, score, feedback)
+        except Exception as e:  # повтори вже вичерпав client
+            result = GradeResult(item.key, None, "", f"{type(e).__name__}: {e}")
+        with stats_lock:
+            if result.error is None:
+                stats.graded += 1
+            else:
+                stats.failed += 1
+            if progress is not None:
+                progress.write(json.dumps(result.__dict__, ensure_ascii=False) + "\n")
+                progress.flush()
+        return result
+
+    t0 = time.perf_counter()
+    try:
+        stats.resumed = sum(item.key in done for item in items)
+        # однакові елементи — один запит до LLM; результат спільний за key
+        pending = list({item.key: item for item in items if item.key not in done}.values())
+        stats.duplicates = len(items) - stats.resumed - len(pending)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="grader") as pool:
+            for result in pool.map(grade, pending):
+                done[result.key] = result
+    finally:
+        stats.seconds = time.perf_counter() - t0
+        stats.retries = client.stats["retries"]
+        client.close()
+        if progress is not None:
+            progress.close()
+    return [done[item.key] for item in items], stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("items", help="JSONL з полями topic, question, answer (і опційно key)")
+    parser.add_argument("--output", default=None, help="JSONL з результатами (за замовчуванням — stdout)")
+    parser.add_argument("--progress", default=None, help="progress-файл для продовження перерваного запуску")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=None, help="ліміт запитів до LLM за секунду")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--base-url", default=os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1"))
+    parser.add_argument("--model", default=os.environ.get("LLM_MODEL", "llama-3.3-70b-versatile"))
+    args = parser.parse_args()
+
+    with open(args.items, "r", encoding="utf-8") as f:
+        items = [GradeItem(**json.loads(line)) for line in f if line.strip()]
+    api_key = os.environ.get("LLM_API_KEY", "")
+    try:
+        results, stats = grade_batch(
+            items, bool(api_key), api_key, args.base_url, args.model, workers=args.workers, rate_limit=args.rps,
+            max_retries=args.retries, progress_path=args.progress
+        )
+    except ValueError as e:  # progress-файл іншого запуску
+        parser.exit(1, f"grading: {e}\n")
+    lines = "".join(json.dumps(r.__dict__, ensure_ascii=False) + "\n" for r in results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(lines)
+    else:
+        print(lines, end="")
+    print(stats, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
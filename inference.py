@@ -0,0 +1,36 @@
+"""
+Бекенди CPU-інференсу для SentenceTransformer / CrossEncoder.
+
+- "torch"     — fp32, як було;
+- "int8"      — динамічна int8-квантизація nn.Linear (torch, без додаткових залежностей);
+- "onnx"      — експортований ONNX-граф через onnxruntime (pip install "sentence-transformers[onnx]");
+- "onnx-int8" — квантизований ONNX-граф з hub-репозиторію моделі (AVX2).
+
+Звірка з fp32: python -m benchmarks.backend_parity
+"""
+INFERENCE_BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+ONNX_INT8_FILE = "onnx/model_qint8_avx2.onnx"
+
+
+def load_model(model_cls, model_name, backend="torch"):
+    """model_cls — SentenceTransformer або CrossEncoder. Квантизовані й ONNX-бекенди — лише CPU."""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend!r} (expected one of {INFERENCE_BACKENDS})")
+    if backend == "torch":
+        return model_cls(model_name)
+    if backend == "onnx":
+        return model_cls(model_name, device="cpu", backend="onnx")
+    if backend == "onnx-int8":
+        return model_cls(model_name, device="cpu", backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE})
+
+    import torch
+
+    model = model_cls(model_name, device="cpu")
+    # ваги Linear-шарів — int8, активації квантизуються на льоту; решта графа лишається fp32
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def cache_model_name(model_name, backend="torch"):
+    """Ім'я моделі для кешу ембедингів: вектори різних бекендів не змішуються."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
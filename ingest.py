@@ -0,0 +1,194 @@
+"""
+Потокове завантаження корпусу: читання й chunking файлів (за явним workers — у пулі процесів), чанки — генератором.
+
+iter_documents() віддає документи по одному в стабільному порядку; у польоті не більше
+max_pending файлів, тож пам'ять під ще не оброблені документи обмежена незалежно від розміру корпусу.
+Ембединги потім рахуються батчами фіксованого розміру (EmbeddingCache.load / DenseRetriever,
+ENCODE_BATCH_SIZE) — в пам'яті одночасно лише один батч текстів і векторів.
+
+Пул процесів — лише коли workers > 1 задано явно (CLI, chanks.py, build_shard): fork процесу, у якому
+вже працюють потоки (Gradio, фонове прогрівання моделей, torch), може успадкувати захоплені ними локи,
+тож RAGPipeline за замовчуванням читає корпус послідовно.
+
+  python -m ingest data/docs --workers 4        # docs/sec і chunks/sec (+ --encode для ембедингів)
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from chunking import chunk_spans, chunk_text
+
+
+def read_document(file_path):
+    with open(file_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def document_fingerprint(file_path, text=None):
+    """mtime/size для швидкої перевірки + sha256 вмісту для точної."""
+    st = os.stat(file_path)
+    if text is None:
+        text = read_document(file_path)
+    return {
+        "mtime": st.st_mtime_ns,
+        "size": st.st_size,
+        "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest()
+    }
+
+
+def list_documents(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Docs folder not found: {path}")
+    # відсортовано: документи однієї теми (спільний префікс імені) отримують суцільні діапазони id чанків,
+    # і тематичні партиції (partitions.py) лишаються кількома зрізами замість сотень
+    return sorted(fname for fname in os.listdir(path) if fname.endswith(".md"))
+
+
+def read_and_chunk(file_path, chunk_size=300, overlap=50):
+    """(ім'я файлу, fingerprint, чанки, межі чанків) — робота одного воркера."""
+    text = read_document(file_path)
+    return (
+        os.path.basename(file_path),
+        document_fingerprint(file_path, text),
+        chunk_text(text, chunk_size, overlap),
+        chunk_spans(text, chunk_size, overlap)
+    )
+
+
+def _pool_context():
+    # fork: дочірні процеси не переімпортують __main__ (app.py створив би ще один пайплайн);
+    # де fork немає (Windows), читаємо послідовно
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def iter_documents(path, workers=None, max_pending=None, files=None, chunk_size=300, overlap=50):
+    """
+    Генератор (fname, fingerprint, chunks, spans) для .md-файлів path.
+    workers > 1 — у пулі з workers процесів, None або <= 1 — послідовно в поточному процесі.
+    """
+    files = list_documents(path) if files is None else list(files)
+    context = _pool_context()
+    if not workers or workers <= 1 or context is None:
+        for fname in files:
+            yield read_and_chunk(os.path.join(path, fname), chunk_size, overlap)
+        return
+
+    max_pending = max_pending or 4 * workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for fname in files:
+            pending.append(pool.submit(read_and_chunk, os.path.join(path, fname), chunk_size, overlap))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class IngestStats:
+    def __init__(self):
+        self.documents = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def docs_per_sec(self):
+        return self.documents / self.seconds if self.seconds else 0.0
+
+    @property
+    def chunks_per_sec(self):
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "docs_per_sec": self.docs_per_sec,
+            "chunks_per_sec": self.chunks_per_sec,
+        }
+
+    def __str__(self):
+        return (f"{self.documents} docs / {self.chunks} chunks in {self.seconds:.2f}s: "
+                f"{self.docs_per_sec:.1f} docs/s, {self.chunks_per_sec:.1f} chunks/s")
+
+
+def ingest(path, store, workers=None, chunk_size=300, overlap=50, dedup=None):
+    """
+    Дописує всі документи path у ChunkStore, не тримаючи корпус у пам'яті цілком.
+    dedup — ChunkDeduper над тим самим store: повторні чанки не дописуються, ids посилаються на перший.
+    Повертає ({fname: fingerprint + ids}, IngestStats).
+    """
+    stats = IngestStats()
+    documents = {}
+    t0 = time.perf_counter()
+    for fname, fingerprint, chunks, spans in iter_documents(path, workers, chunk_size=chunk_size, overlap=overlap):
+        if dedup is not None:
+            plan = dedup.plan(fname, chunks, spans, start=len(store))
+            store.append(fname, plan.fresh, plan.ordinals, plan.spans)
+            dedup.commit(plan)
+            ids = plan.ids
+        else:
+            ids = store.append(fname, chunks, spans=spans)
+        documents[fname] = dict(fingerprint, ids=ids)
+        stats.documents += 1
+        stats.chunks += len(chunks)
+        stats.bytes += fingerprint["size"]
+    stats.seconds = time.perf_counter() - t0
+    return documents, stats
+
+
+def main():
+    from chunk_store import ChunkStore
+    from dedup import ChunkDeduper
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="data/docs")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--encode", action="store_true", help="також закодувати чанки dense-моделлю")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dedup", action="store_true", help="порівняти з дедуплікацією чанків (dedup.py)")
+    parser.add_argument("--exact-only", action="store_true", help="дедуплікація лише точних копій, без MinHash")
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        store = ChunkStore()
+        _, stats = ingest(args.path, store, workers=workers)
+        print(f"workers={workers}: {stats}")
+    stores = {"all": store}
+
+    if args.dedup:
+        deduped = ChunkStore()
+        deduper = ChunkDeduper(deduped, near=not args.exact_only)
+        _, stats = ingest(args.path, deduped, workers=args.workers[-1], dedup=deduper)
+        report = deduper.report()
+        print(f"dedup: {stats}")
+        print(f"  {report['chunks']} → {report['unique']} chunks ({report['ratio']:.1%}): "
+              f"exact {report['exact']}, near {report['near']}, shared {report['shared_chunks']}")
+        print(f"  store {store.nbytes / 2 ** 20:.2f} MB → {deduped.nbytes / 2 ** 20:.2f} MB")
+        stores["dedup"] = deduped
+
+    if args.encode:
+        from retrievers import DenseRetriever
+
+        encoder = DenseRetriever([], cache_dir=None)
+        seconds = {}
+        for name, chunks in stores.items():
+            t0 = time.perf_counter()
+            matrix = encoder.encode_chunks_batched(chunks, args.batch_size)
+            seconds[name] = time.perf_counter() - t0
+            print(f"encode {name}: {len(chunks)} chunks in {seconds[name]:.2f}s: "
+                  f"{len(chunks) / seconds[name]:.1f} chunks/s, vectors {matrix.nbytes / 2 ** 20:.2f} MB")
+        if "dedup" in seconds:
+            print(f"encode saved by dedup: {seconds['all'] - seconds['dedup']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,63 @@
-import requests
+import json
+
+from llm_client import get_client
+
+
+def _messages(prompt):
+    return [
+        {"role": "system", "content": "Ти корисний асистент з NLP."},
+        {"role": "user", "content": prompt}
+    ]
 
 
 def call_llm(api_key, base_url, model, prompt):
-    url = base_url.rstrip("/") + "/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "Ти корисний асистент з NLP."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.2
-    }
-
-    r = requests.post(url, headers=headers, json=payload, timeout=60)
-    r.raise_for_status()
-    return r.json()["choices"][0]["message"]["content"]
+    # спільний клієнт (llm_client.py): пул з'єднань, ліміти, повтори 429/5xx, склеювання однакових запитів
+    return get_client().chat(api_key, base_url, model, _messages(prompt), timeout=60)
+
+
+def _sse_content(line):
+    """(фрагмент тексту або None, чи кінець потоку) для одного рядка SSE."""
+    if not line or not line.startswith("data:"):
+        return None, False
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None, True
+    choices = json.loads(data).get("choices") or []
+    if not choices:
+        return None, False
+    delta = choices[0].get("delta") or {}
+    return delta.get("content") or None, False
+
+
+def stream_llm(api_key, base_url, model, prompt):
+    """
+    Генератор фрагментів відповіді з OpenAI-compatible SSE (stream: true).
+    timeout стосується з'єднання і пауз між подіями, а не всієї генерації.
+    """
+    for line in get_client().stream_chat(api_key, base_url, model, _messages(prompt), timeout=60):
+        content, done = _sse_content(line)
+        if done:
+            break
+        if content:
+            yield content
+
+
+# -------------------------
+# Async-варіанти (той самий спільний клієнт: ліміти, повтори й single-flight спільні з sync-викликами)
+# -------------------------
+
+async def acall_llm(api_key, base_url, model, prompt):
+    return await get_client().achat(api_key, base_url, model, _messages(prompt), timeout=60)
+
+
+async def astream_llm(api_key, base_url, model, prompt):
+    lines = get_client().astream_chat(api_key, base_url, model, _messages(prompt), timeout=60)
+    try:
+        async for line in lines:
+            content, done = _sse_content(line)
+            if done:
+                break
+            if content:
+                yield content
+    finally:
+        await lines.aclose()
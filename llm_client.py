@@ -0,0 +1,289 @@
+"""
+Спільний клієнт OpenAI-compatible Chat Completions для llm.py і exam_core.
+
+- з'єднання тримаються в пулі requests.Session — окремий пул на кожен base_url
+  (без нового TCP/TLS-handshake на кожне питання);
+- на кожен base_url — обмеження одночасних запитів і (опційно) запитів за секунду;
+- 429/5xx, таймаути й обриви з'єднання повторюються з експоненційною затримкою (Retry-After враховується);
+- single-flight: однакові запити (endpoint, модель, ключ, повідомлення), що вже в польоті,
+  не дублюються — усі чекачі отримують відповідь одного upstream-запиту.
+
+Стрімінг проходить через ті самі пул, ліміти й повтори (повтор — лише до першого байта відповіді),
+але не склеюється: кожен споживач читає свій потік.
+
+achat / astream_chat — async-фронтенд для asyncio-коду: той самий виклик у потоці пулу клієнта,
+тож семафори, повтори й single-flight спільні для sync- і async-запитів.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+_END = object()
+
+
+class RateLimiter:
+    """Токен-бакет: не більше rate запитів за секунду в середньому, сплески до burst."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after(response):
+    """Пауза з заголовка Retry-After (секунди) або None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in RETRY_STATUS
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class LLMClient:
+    """
+    max_concurrency — одночасних запитів на один base_url, rate_limit — запитів/с на base_url (None — без ліміту),
+    max_retries — повторів тимчасових помилок з паузою backoff·2^n, pool_size — з'єднань у пулі сесії,
+    async_workers — потоків для achat/astream_chat (очікування на семафорі чи single-flight теж займає потік).
+    """
+
+    def __init__(self, max_concurrency=8, rate_limit=None, max_retries=3, backoff=0.5, timeout=60, pool_size=20,
+                 async_workers=64):
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.async_workers = async_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._hosts = {}  # base_url -> (Session, Semaphore, RateLimiter | None)
+        self._inflight = {}
+        self.stats = {"requests": 0, "retries": 0, "coalesced": 0}
+
+    def _host(self, base_url):
+        host = self._hosts.get(base_url)
+        if host is None:
+            with self._lock:
+                host = self._hosts.get(base_url)
+                if host is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    limiter = RateLimiter(self.rate_limit) if self.rate_limit else None
+                    host = self._hosts[base_url] = (session, threading.BoundedSemaphore(self.max_concurrency), limiter)
+        return host
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _post(self, base_url, headers, payload, timeout, stream=False):
+        """Відповідь з кодом 2xx; тимчасові помилки повторюються. Викликати під семафором base_url."""
+        session, _, limiter = self._host(base_url)
+        url = base_url.rstrip("/") + "/chat/completions"
+        attempt = 0
+        while True:
+            attempt += 1
+            if limiter is not None:
+                limiter.acquire()
+            self._count("requests")
+            delay = None
+            try:
+                r = session.post(url, headers=headers, json=payload, timeout=timeout or self.timeout, stream=stream)
+                if r.status_code in RETRY_STATUS and attempt <= self.max_retries:
+                    delay = retry_after(r)
+                    r.close()
+                else:
+                    r.raise_for_status()
+                    return r
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt > self.max_retries:
+                    raise
+            self._count("retries")
+            time.sleep(delay if delay is not None else self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    @staticmethod
+    def _payload(api_key, model, messages, temperature, stream=False):
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature
+        }
+        if stream:
+            payload["stream"] = True
+        return headers, payload
+
+    def chat(self, api_key, base_url, model, messages, temperature=0.2, timeout=None):
+        """Текст відповіді. Однаковий запит, що вже виконується, не надсилається вдруге."""
+        headers, payload = self._payload(api_key, model, messages, temperature)
+        key = hashlib.sha256(json.dumps(
+            [base_url.rstrip("/"), api_key, payload], ensure_ascii=False, sort_keys=True
+        ).encode("utf-8")).hexdigest()
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self.stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            _, semaphore, _ = self._host(base_url)
+            with semaphore:
+                r = self._post(base_url, headers, payload, timeout)
+                flight.result = r.json()["choices"][0]["message"]["content"]
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def stream_chat(self, api_key, base_url, model, messages, temperature=0.2, timeout=None):
+        """Генератор рядків SSE-відповіді (stream: true); слот concurrency тримається до кінця потоку."""
+        headers, payload = self._payload(api_key, model, messages, temperature, stream=True)
+        _, semaphore, _ = self._host(base_url)
+        with semaphore:
+            with self._post(base_url, headers, payload, timeout, stream=True) as r:
+                # text/event-stream часто без charset — requests тоді декодував би як latin-1
+                r.encoding = "utf-8"
+                # chunk_size=None: віддаємо байти щойно прийшли, без буферизації по 512
+                yield from r.iter_lines(chunk_size=None, decode_unicode=True)
+
+    # -------------------------
+    # Async-фронтенд
+    # -------------------------
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.async_workers, thread_name_prefix="llm-client")
+        return self._executor
+
+    async def achat(self, api_key, base_url, model, messages, temperature=0.2, timeout=None):
+        """chat() для event loop-а: блокуючий запит іде в потоці клієнта."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool(), lambda: self.chat(api_key, base_url, model, messages, temperature, timeout)
+        )
+
+    async def astream_chat(self, api_key, base_url, model, messages, temperature=0.2, timeout=None):
+        """Async-генератор рядків SSE: stream_chat() читається в потоці, рядки передаються в event loop."""
+        loop = asyncio.get_running_loop()
+        lines = asyncio.Queue()
+        stop = threading.Event()
+
+        def put(item):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(lines.put_nowait, item)
+
+        def pump():
+            stream = self.stream_chat(api_key, base_url, model, messages, temperature, timeout)
+            try:
+                for line in stream:
+                    if stop.is_set():
+                        break
+                    put((line, None))
+                put((_END, None))
+            except Exception as e:
+                put((_END, e))
+            finally:
+                stream.close()  # звільняє з'єднання й слот семафора, навіть якщо споживач пішов раніше
+
+        loop.run_in_executor(self._pool(), pump)
+        try:
+            while True:
+                line, error = await lines.get()
+                if line is _END:
+                    if error is not None:
+                        raise error
+                    return
+                yield line
+        finally:
+            stop.set()
+
+    def close(self):
+        with self._lock:
+            hosts, self._hosts = self._hosts, {}
+            executor, self._executor = self._executor, None
+        for session, _, _ in hosts.values():
+            session.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """Клієнт процесу, спільний для llm.py і exam_core."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = LLMClient()
+    return _default
+
+
+def set_client(client):
+    """Підміняє спільний клієнт (інші ліміти, тестовий сервер); повертає попередній."""
+    global _default
+    with _default_lock:
+        previous, _default = _default, client
+    return previous
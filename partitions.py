@@ -0,0 +1,143 @@
+"""
+Тематичні партиції корпусу для пошуку з фільтром за метаданими (тема, файл-джерело).
+
+Тема документа береться з префікса імені файлу (теми chanks.topics: "Evaluation_Metrics_BLEU.md" →
+"Evaluation Metrics"); файли без відомого префікса потрапляють у партицію OTHER. Документи
+читаються у відсортованому порядку (ingest.list_documents), тож чанки однієї теми займають
+суцільні діапазони id.
+
+Партиція — це список діапазонів id над спільними індексами: BM25 бере з postings лише зріз
+діапазону (бінарним пошуком), dense множить запит лише на рядки діапазону (view, без копії).
+Окремих копій postings і векторів немає, а скори ті самі, що й при повному скануванні (BM25 —
+з глобальними idf і нормами довжин), тому top-k партицій зливаються без перерахунку (merge_hits).
+"""
+import os
+import re
+
+import numpy as np
+
+from chanks import topics as CORPUS_TOPICS
+
+OTHER = "Other"
+_EMPTY = np.zeros((0, 2), dtype=np.int64)
+
+
+def topic_slug(name):
+    """"Attention & Transformers", "Attention___Transformers" → "attention_transformers"."""
+    return re.sub(r"[^0-9a-z]+", "_", name.lower()).strip("_")
+
+
+def _is_prefix(prefix, slug):
+    return slug == prefix or slug.startswith(prefix + "_")
+
+
+def topic_of(fname, topics=CORPUS_TOPICS):
+    """Тема документа за найдовшим префіксом імені файлу або OTHER."""
+    stem = topic_slug(os.path.splitext(os.path.basename(fname))[0])
+    matches = [topic for topic in topics if _is_prefix(topic_slug(topic), stem)]
+    return max(matches, key=lambda topic: len(topic_slug(topic))) if matches else OTHER
+
+
+def to_ranges(ids):
+    """id чанків → відсортовані напіввідкриті діапазони [lo, hi), масив (n, 2)."""
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    if not len(ids):
+        return _EMPTY
+    breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(ids)]])
+    return np.stack([ids[starts], ids[ends - 1] + 1], axis=1)
+
+
+def range_ids(ranges):
+    if not len(ranges):
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([np.arange(lo, hi) for lo, hi in ranges.tolist()])
+
+
+def range_size(ranges):
+    """Скільки чанків покривають діапазони (None — весь корпус)."""
+    return None if ranges is None else int((ranges[:, 1] - ranges[:, 0]).sum())
+
+
+def merge_hits(hit_lists, k):
+    """
+    top-k кількох партицій [(text, score, idx), ...] → спільний top-k: за спаданням скору,
+    рівні — за idx (як у повному індексі). Чанк, що є в кількох партиціях (дедуплікація), — один раз.
+    """
+    best = {}
+    for hits in hit_lists:
+        for hit in hits:
+            best.setdefault(hit[2], hit)
+    return sorted(best.values(), key=lambda hit: (-hit[1], hit[2]))[:k]
+
+
+def _as_tuple(value):
+    if value is None:
+        return None
+    return (value,) if isinstance(value, str) else tuple(value)
+
+
+class TopicPartitions:
+    """
+    Незмінний знімок розбиття: тема → діапазони id, файл → діапазони id. Будується з documents
+    пайплайна ({fname: {..., "ids": [...]}}); після оновлень корпусу пайплайн створює новий.
+    """
+
+    def __init__(self, documents, topics=CORPUS_TOPICS):
+        self.topics = list(topics)
+        self.doc_topic = {fname: topic_of(fname, self.topics) for fname in documents}
+        self.sources = {fname: to_ranges(doc["ids"]) for fname, doc in documents.items()}
+        ids_by_topic = {}
+        for fname, doc in documents.items():
+            ids_by_topic.setdefault(self.doc_topic[fname], []).extend(doc["ids"])
+        self.partitions = {topic: to_ranges(ids) for topic, ids in sorted(ids_by_topic.items())}
+        self._cache = {}
+
+    def sizes(self):
+        """{тема: чанків}; для звітів і балансу партицій."""
+        return {topic: range_size(ranges) for topic, ranges in self.partitions.items()}
+
+    def groups(self):
+        """Діапазони кожної непорожньої партиції — для fan-out пошуку без фільтра."""
+        return [ranges for ranges in self.partitions.values() if len(ranges)]
+
+    def resolve(self, topic):
+        """
+        Тема з фільтра → партиція: точний збіг або тема корпусу, що є префіксом назви
+        (так теми exam_core.ALL_TOPICS, як "Evaluation Metrics (BLEU, ROUGE, F1)", теж знаходяться).
+        """
+        slug = topic_slug(topic)
+        matches = [t for t in self.topics + [OTHER] if _is_prefix(topic_slug(t), slug)]
+        if not matches:
+            raise ValueError(f"Unknown topic {topic!r}, expected one of {self.topics}")
+        return max(matches, key=lambda t: len(topic_slug(t)))
+
+    def ranges(self, topic=None, source=None):
+        """
+        Діапазони id для фільтра; None — без фільтра (увесь корпус). topic і source — рядок або список:
+        всередині списку — будь-яке зі значень, між topic і source — обидві умови.
+        """
+        if topic is None and source is None:
+            return None
+        key = (_as_tuple(topic), _as_tuple(source))
+        ranges = self._cache.get(key)
+        if ranges is not None:
+            return ranges
+
+        ids = None
+        if key[0] is not None:
+            parts = [self.partitions.get(self.resolve(t), _EMPTY) for t in key[0]]
+            ids = range_ids(np.concatenate(parts))
+        if key[1] is not None:
+            names = [os.path.basename(name) for name in key[1]]
+            unknown = [name for name in names if name not in self.sources]
+            if unknown:
+                raise ValueError(f"Unknown source {unknown[0]!r}")
+            source_ids = range_ids(np.concatenate([self.sources[name] for name in names]))
+            ids = source_ids if ids is None else np.intersect1d(ids, source_ids)
+        ranges = to_ranges(ids)
+        if len(self._cache) >= 256:
+            self._cache.clear()
+        self._cache[key] = ranges
+        return ranges
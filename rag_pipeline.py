@@ -1,33 +1,83 @@
+import asyncio
+import contextvars
 import os
-from chunking import chunk_text
-from retrievers import BM25Retriever, DenseRetriever
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from answer_cache import AnswerCache
+from chunk_store import ChunkStore
+from chunking import chunk_spans, chunk_text
+from context_packing import pack_context
+from dedup import ChunkDeduper
+from fusion import fuse
+from ingest import document_fingerprint, ingest, list_documents, read_document
+from inference import cache_model_name
+from retrievers import DENSE_MODEL, EMBEDDINGS_CACHE_DIR, BM25Retriever, DenseRetriever
 from reranker import Reranker
-from llm import call_llm
+from llm import acall_llm, astream_llm, call_llm, stream_llm
+from partitions import TopicPartitions, merge_hits, range_size
+from shard import Shard
+from tracing import Tracer, activate, annotate, span
+
+DOCS_PATH = "data/docs"
 
 
-def load_documents(path="data/docs"):
+def load_documents(path=DOCS_PATH):
     docs = []
     meta = []
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Docs folder not found: {path}")
-
-    for fname in os.listdir(path):
-        if fname.endswith(".md"):
-            with open(os.path.join(path, fname), encoding="utf-8") as f:
-                text = f.read()
-                chunks = chunk_text(text)
-                for i, c in enumerate(chunks):
-                    docs.append(c)
-                    meta.append(f"{fname} — chunk {i}")
+    for fname in list_documents(path):
+        text = read_document(os.path.join(path, fname))
+        chunks = chunk_text(text)
+        for i, c in enumerate(chunks):
+            docs.append(c)
+            meta.append(f"{fname} — chunk {i}")
     return docs, meta
 
 
-class RAGPipeline:
-    def __init__(self):
-        self.chunks, self.meta = load_documents()
-        self.bm25 = BM25Retriever(self.chunks)
-        self.dense = DenseRetriever(self.chunks)
-        self.reranker = Reranker()
+class AnswerPipeline:
+    """
+    Спільна частина пайплайнів: промпт з пакуванням контексту, кеш відповідей, виклик LLM і трасування.
+    Підклас у своєму __init__ викликає цей і задає корпус (store, chunking, dedup) та retrieve/retrieve_batch.
+    """
+
+    def __init__(self, answer_cache=True, context_tokens=1500, tracer=None):
+        # таймінги етапів кожного запиту (tracing.py); Tracer(enabled=False) вимикає трасування
+        self.tracer = tracer if tracer is not None else Tracer()
+        # бюджет контексту промпту в токенах (оцінка context_packing.estimate_tokens); None — без обмеження
+        self.context_tokens = context_tokens
+        # кеш відповідей LLM: True — дефолтний in-memory, AnswerCache — свій (напр. з path), False/None — вимкнено
+        if answer_cache is True:
+            answer_cache = AnswerCache()
+        self.answer_cache = answer_cache if answer_cache is not False else None
+
+    def retrieve(self, question, use_bm25=True, use_dense=True, query_embedding=None, topic=None, source=None):
+        raise NotImplementedError
+
+    def retrieve_batch(self, questions, use_bm25=True, use_dense=True, query_embeddings=None, topic=None, source=None):
+        raise NotImplementedError
+
+    def _query_embedding(self, query, api_key):
+        """Ембединг питання для семантичного кешу; None — без нього."""
+        return None
+
+    def _query_embeddings(self, questions, api_key):
+        """Ембединги питань answer_batch для семантичного кешу; None — без них."""
+        return None
+
+    def locations(self, idx):
+        """Усі місця чанка в корпусі ("file.md — chunk N"); без дедуплікації — одне."""
+        if self.dedup is None:
+            return [self.store.label(idx)]
+        docs = self.store.docs
+        return [f"{docs[doc]} — chunk {ordinal}" for doc, ordinal, _, _ in self.dedup.locations(idx)]
+
+    def source_label(self, idx):
+        """Підпис джерела у відповіді; для чанка, що трапляється в кількох місцях, — "(+N)"."""
+        locations = self.locations(idx)
+        return locations[0] if len(locations) == 1 else f"{locations[0]} (+{len(locations) - 1})"
 
     def answer(
         self,
@@ -36,34 +86,145 @@ class RAGPipeline:
         use_dense: bool = True,
         api_key: str = "",
         base_url: str = "https://api.openai.com/v1",
-        model: str = "gpt-4o-mini"
+        model: str = "gpt-4o-mini",
+        trace=None,
+        topic=None,
+        source=None
     ):
+        """
+        trace — вже відкритий Tracer.start(...) викликача; інакше пайплайн заводить свій.
+        topic / source — фільтр retrieval за темою й файлом-джерелом (див. retrieve).
+        """
         query = (question or "").strip()
         if not query:
             return "❌ Введіть питання.", []
 
-        candidates = []
+        with self._traced("answer", trace, query_chars=len(query)):
+            q_emb = self._query_embedding(query, api_key)
+            reranked = self.retrieve(query, use_bm25, use_dense, query_embedding=q_emb, topic=topic, source=source)
+            return self._generate(query, reranked, api_key, base_url, model, query_embedding=q_emb)
 
-        if use_bm25:
-            candidates += self.bm25.search(query)
+    @contextmanager
+    def _traced(self, name, trace=None, **attrs):
+        """Активує trace викликача або власний (його ж і завершує)."""
+        owned = trace is None
+        if owned:
+            trace = self.tracer.start(name, **attrs)
+        try:
+            with activate(trace):
+                yield trace
+        except BaseException as e:
+            if trace is not None:
+                trace.set(error=type(e).__name__)
+            raise
+        finally:
+            if owned:
+                self.tracer.finish(trace)
+
+    def answer_batch(
+        self,
+        questions,
+        use_bm25: bool = True,
+        use_dense: bool = True,
+        api_key: str = "",
+        base_url: str = "https://api.openai.com/v1",
+        model: str = "gpt-4o-mini",
+        topic=None,
+        source=None
+    ):
+        """answer для списку питань з батчевим retrieval; повертає [(answer, sources), ...] у тому ж порядку."""
+        with self._traced("answer_batch", questions=len(questions)):
+            q_embs = self._query_embeddings(questions, api_key)
+            retrieved = self.retrieve_batch(
+                questions, use_bm25, use_dense, query_embeddings=q_embs, topic=topic, source=source
+            )
+            results = []
+            for i, (question, reranked) in enumerate(zip(questions, retrieved)):
+                query = (question or "").strip()
+                if not query:
+                    results.append(("❌ Введіть питання.", []))
+                    continue
+                q_emb = q_embs[i] if q_embs is not None else None
+                results.append(self._generate(query, reranked, api_key, base_url, model, query_embedding=q_emb))
+            return results
 
-        if use_dense:
-            candidates += self.dense.search(query)
+    def answer_stream(
+        self,
+        question: str,
+        use_bm25: bool = True,
+        use_dense: bool = True,
+        api_key: str = "",
+        base_url: str = "https://api.openai.com/v1",
+        model: str = "gpt-4o-mini",
+        trace=None,
+        topic=None,
+        source=None
+    ):
+        """
+        Як answer, але генератор (partial_answer, sources): джерела віддаються одразу після
+        retrieval, далі відповідь росте в міру надходження токенів (SSE stream).
+        """
+        query = (question or "").strip()
+        if not query:
+            yield "❌ Введіть питання.", []
+            return
 
-        if not candidates:
-            return "Пошук вимкнено або не знайдено релевантного контексту.", []
+        owned = trace is None
+        if owned:
+            trace = self.tracer.start("answer_stream", query_chars=len(query))
+        try:
+            # trace активний лише між yield-ами: код споживача генератора не повинен у нього писати
+            with activate(trace):
+                q_emb = self._query_embedding(query, api_key)
+                reranked = self.retrieve(query, use_bm25, use_dense, query_embedding=q_emb, topic=topic, source=source)
+                ready, sources, prompt = self._prepare(query, reranked, api_key, base_url, model, q_emb)
+            if ready is not None:
+                yield ready
+                return
 
-        # Реранк і топ-5
-        reranked = self.reranker.rerank(query, candidates)[:5]
+            yield "", sources
+            answer = ""
+            with span("llm", trace, model=model, stream=True) as s:
+                started = time.perf_counter()
+                for token in stream_llm(api_key, base_url, model, prompt):
+                    if not answer:
+                        s.set(first_token_ms=(time.perf_counter() - started) * 1000)
+                    answer += token
+                    yield answer, sources
+                s.set(response_chars=len(answer))
+            with activate(trace):
+                result = self._finish(query, reranked, answer, sources, base_url, model, q_emb)
+            yield result
+        finally:
+            if owned:
+                self.tracer.finish(trace)
 
-        # Контекст і джерела
-        context_blocks = []
-        sources = []
-        for c in reranked:
-            chunk_text_str = c[0]
-            idx = c[2]
-            context_blocks.append(chunk_text_str)
-            sources.append(self.meta[idx])
+    def _generate(self, query, reranked, api_key, base_url, model, query_embedding=None):
+        ready, sources, prompt = self._prepare(query, reranked, api_key, base_url, model, query_embedding)
+        if ready is not None:
+            return ready
+        with span("llm", model=model) as s:
+            answer = call_llm(api_key, base_url, model, prompt)
+            s.set(response_chars=len(answer or ""))
+        return self._finish(query, reranked, answer, sources, base_url, model, query_embedding)
+
+    def _prepare(self, query, reranked, api_key, base_url, model, query_embedding=None):
+        """
+        (готова відповідь або None, sources, prompt). Готова відповідь — коли LLM не потрібен:
+        немає контексту, немає ключа (retrieval-only) або спрацював кеш відповідей.
+        """
+        if not reranked:
+            return ("Пошук вимкнено або не знайдено релевантного контексту.", []), [], None
+
+        # Контекст і джерела: сусідні чанки зшиваються, повторені речення прибираються,
+        # фрагменти додаються за релевантністю в межах бюджету; [n] у контексті = sources[n-1]
+        with span("context", candidates=len(reranked), budget=self.context_tokens) as s:
+            passages = pack_context(
+                reranked, self.store, self.chunking, budget=self.context_tokens, label=self.source_label
+            )
+            s.set(passages=len(passages), tokens=sum(p.tokens for p in passages))
+        context_blocks = [p.text for p in passages]
+        sources = [p.label for p in passages]
 
         context = "\n\n".join([f"[{i+1}] {t}" for i, t in enumerate(context_blocks)])
 
@@ -75,7 +236,13 @@ class RAGPipeline:
                 "✅ Але retrieval працює — ось топ релевантні фрагменти:\n\n"
                 f"{preview}",
                 sources
-            )
+            ), sources, None
+
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(query, [c[2] for c in reranked], (base_url, model), query_embedding)
+            if cached is not None:
+                annotate(answer_cache="hit")
+                return cached, sources, None
 
         # --- М’якший промпт (виправляє проблему “нема інформації”, коли вона є) ---
         prompt = f"""
@@ -96,11 +263,508 @@ class RAGPipeline:
 
 ВІДПОВІДЬ:
 """.strip()
+        annotate(prompt_chars=len(prompt), context_chunks=len(reranked), context_passages=len(passages),
+                 context_tokens=sum(p.tokens for p in passages))
+        return None, sources, prompt
 
-        answer = call_llm(api_key, base_url, model, prompt)
-
+    def _finish(self, query, reranked, answer, sources, base_url, model, query_embedding=None):
         # safety: якщо call_llm повернув None/порожнє
         if not answer or not str(answer).strip():
-            answer = "❌ Не вдалося отримати відповідь від LLM (порожня відповідь)."
+            return "❌ Не вдалося отримати відповідь від LLM (порожня відповідь).", sources
 
+        if self.answer_cache is not None:
+            self.answer_cache.put(query, [c[2] for c in reranked], answer, sources, (base_url, model), query_embedding)
         return answer, sources
+
+
+class RAGPipeline(AnswerPipeline):
+    def __init__(self, docs_path=DOCS_PATH, fusion="rrf", retriever_k=5, candidate_budget=10, fusion_weights=None,
+                 answer_cache=True, lazy=False, backend="torch", cache_dir=EMBEDDINGS_CACHE_DIR, tracer=None,
+                 ingest_workers=None, shard_path=None, chunk_size=300, overlap=50, dedup=False,
+                 context_tokens=1500, fanout_workers=None, dense_index="exact", n_lists=None, nprobe=8,
+                 rerank_cascade=False, rerank_cache_size=4096):
+        super().__init__(answer_cache=answer_cache, context_tokens=context_tokens, tracer=tracer)
+        self.docs_path = docs_path
+        self.cache_dir = cache_dir
+        # бекенд інференсу dense-моделі й реранкера: "torch" | "int8" | "onnx" | "onnx-int8" (див. inference.py)
+        self.backend = backend
+        # dense-індекс (ann_index.py): "exact" — повний скан, "ivf" — наближений з n_lists кластерами і nprobe з них
+        self.dense_index = {"index": dense_index, "n_lists": n_lists, "nprobe": nprobe}
+        # реранкер (reranker.py): cascade — відсів і пропуск cross-encoder за скорами fusion,
+        # cache_size — LRU скорів пар (запит, чанк)
+        self.rerank_options = {"cascade": rerank_cascade, "cache_size": rerank_cache_size}
+        # стан компонентів для status(): "loading" | "ready" | "error: ..."; час від створення до готовності
+        self._created_at = time.perf_counter()
+        self._state = {"bm25": "loading", "dense": "loading", "reranker": "loading"}
+        self._ready_after = {}
+        # злиття кандидатів: стратегія з fusion.py, k кожного ретривера і жорсткий ліміт пар для реранкера
+        self.fusion = fusion
+        self.retriever_k = retriever_k
+        self.candidate_budget = candidate_budget
+        self.fusion_weights = fusion_weights or {"bm25": 1.0, "dense": 1.0}
+        # shard_path — готовий shard (shard.py): чанки, статистики BM25 і, можливо, ембединги
+        # відкриваються через mmap замість читання й chunking тисяч файлів
+        self.shard = Shard(shard_path) if shard_path else None
+        bm25_index = None
+        if self.shard is not None:
+            # оновлення документів ріжуться тими ж параметрами, що й корпус у shard
+            self.chunking = dict(self.shard.chunking)
+            self.store = self.shard.store()
+            self.documents = self.shard.documents()
+            self.ingest_stats = None
+            self.dedup = self.shard.dedup(self.store)
+            bm25_index = self.shard.bm25_index()
+        else:
+            self.chunking = {"chunk_size": chunk_size, "overlap": overlap}
+            # одне сховище тексту й метаданих чанків на пайплайн і обидва ретривери;
+            # файли читаються й ріжуться на чанки (ingest.py; ingest_workers > 1 — у пулі процесів), у сховище — потоком
+            self.store = ChunkStore()
+            # dedup=True — однакові й майже однакові чанки зберігаються й індексуються один раз (dedup.py),
+            # а всі їхні місця в документах лишаються для цитат (locations)
+            self.dedup = ChunkDeduper(self.store) if dedup else None
+            # fname -> {"mtime", "size", "sha256", "ids": [індекси чанків у self.store]}
+            self.documents, self.ingest_stats = ingest(
+                docs_path, self.store, workers=ingest_workers, dedup=self.dedup, **self.chunking
+            )
+            self.store.compact()
+
+        # тематичні партиції (partitions.py): фільтр topic/source у retrieve/answer сканує лише їхні діапазони id;
+        # fanout_workers > 1 — пошук без фільтра йде паралельно по партиціях зі злиттям top-k
+        self.partitions = TopicPartitions(self.documents)
+        self._fanout = None
+        if fanout_workers and fanout_workers > 1:
+            self._fanout = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix="rag-fanout")
+
+        # оновлення корпусу серіалізуються; пошук лок не бере — ретривери міняють свій стан атомарно
+        self._ingest_lock = threading.Lock()
+        self.bm25 = BM25Retriever(self.store, index=bm25_index)
+        self._mark("bm25")
+
+        # dense і reranker з'являються, коли повністю готові; до того пошук працює в режимі BM25-only
+        self.dense = None
+        self.reranker = None
+        self._warmup = None
+        if lazy:
+            self._warmup = threading.Thread(target=self._load_models, args=(False,), name="rag-warmup", daemon=True)
+            self._warmup.start()
+        else:
+            self._load_models(True)
+
+    def _mark(self, component, state="ready"):
+        self._state[component] = state
+        if state == "ready":
+            self._ready_after[component] = time.perf_counter() - self._created_at
+
+    def _load_models(self, raise_errors):
+        try:
+            # під ingest-локом: оновлення корпусу чекають, доки dense-індекс не наздожене self.store
+            with self._ingest_lock:
+                vectors = None
+                if self.shard is not None:
+                    vectors = self.shard.embeddings(cache_model_name(DENSE_MODEL, self.backend))
+                dense = DenseRetriever(self.store, cache_dir=self.cache_dir, backend=self.backend, vectors=vectors,
+                                       **self.dense_index)
+                removed = self.bm25.removed_ids()
+                if removed:
+                    dense.update(removed_ids=removed)
+                self.dense = dense
+            self._mark("dense")
+        except Exception as e:
+            self._mark("dense", f"error: {e}")
+            if raise_errors:
+                raise
+        try:
+            self.reranker = Reranker(backend=self.backend, **self.rerank_options)
+            self._mark("reranker")
+        except Exception as e:
+            self._mark("reranker", f"error: {e}")
+            if raise_errors:
+                raise
+
+    def status(self):
+        """{"bm25"/"dense"/"reranker": стан, "ready_after": {компонент: секунд від створення}}."""
+        return dict(self._state, ready_after=dict(self._ready_after))
+
+    def wait_ready(self, timeout=None):
+        """Чекає на фоновий warm-up (lazy=True). True, якщо всі компоненти завантажились."""
+        if self._warmup is not None:
+            self._warmup.join(timeout)
+        return all(state == "ready" for state in self._state.values())
+
+    # -------------------------
+    # Інкрементальні оновлення корпусу
+    # -------------------------
+
+    def add_document(self, file_path):
+        """Додає (або оновлює, якщо вже є) документ. Повертає True, якщо індекс змінився."""
+        return self.update_document(file_path)
+
+    def update_document(self, file_path):
+        """
+        Переіндексовує один .md файл. Незмінені чанки (той самий текст на тій самій позиції)
+        зберігають свої індекси; решта стають tombstone, нові дописуються в кінець.
+        """
+        fname = os.path.basename(file_path)
+        with self._ingest_lock:
+            text = read_document(file_path)
+            fingerprint = document_fingerprint(file_path, text)
+            old = self.documents.get(fname)
+            if old is not None and old["sha256"] == fingerprint["sha256"]:
+                old.update(fingerprint)
+                return False
+
+            new_chunks = chunk_text(text, **self.chunking)
+            new_spans = chunk_spans(text, **self.chunking)
+            old_ids = old["ids"] if old is not None else []
+            plan = None
+            if self.dedup is not None:
+                # повтори вже відомих чанків (з будь-якого документа) отримують їхні id;
+                # які зі старих чанків стали нікому не потрібні, видно лише після commit
+                plan = self.dedup.plan(fname, new_chunks, new_spans, start=len(self.store))
+                ids, fresh, fresh_ordinals, fresh_spans = plan.ids, plan.fresh, plan.ordinals, plan.spans
+            else:
+                ids, fresh, fresh_ordinals, fresh_spans = [], [], [], []
+                for j, c in enumerate(new_chunks):
+                    if j < len(old_ids) and self.store[old_ids[j]] == c:
+                        ids.append(old_ids[j])
+                    else:
+                        ids.append(None)
+                        fresh.append(c)
+                        fresh_ordinals.append(j)
+                        fresh_spans.append(new_spans[j])
+                kept = set(i for i in ids if i is not None)
+                stale = [i for i in old_ids if i not in kept]
+
+            # найдорожче — кодування — робимо до того, як щось змінити в індексах
+            # поки dense ще вантажиться, _load_models сам закодує весь self.store
+            dense = self.dense
+            vectors = dense.encode_chunks(fresh) if fresh and dense is not None else None
+
+            added = self.store.append(fname, fresh, fresh_ordinals, fresh_spans)
+            if plan is not None:
+                stale = self.dedup.commit(plan, old_ids)
+            self.bm25.update(added_ids=added, removed_ids=stale)
+            if dense is not None:
+                dense.update(added_ids=added, vectors=vectors, removed_ids=stale)
+
+            added_iter = iter(added)
+            ids = [i if i is not None else next(added_iter) for i in ids]
+            self.documents[fname] = dict(fingerprint, ids=ids)
+            self.partitions = TopicPartitions(self.documents)
+            if self.answer_cache is not None and stale:
+                self.answer_cache.invalidate_chunks(stale)
+            return True
+
+    def remove_document(self, fname):
+        """Прибирає документ з видачі. Індекси інших чанків не змінюються."""
+        fname = os.path.basename(fname)
+        with self._ingest_lock:
+            doc = self.documents.pop(fname, None)
+            if doc is None:
+                return False
+            # з дедуплікацією чанк лишається у видачі, поки на нього посилається хоч один документ
+            removed = self.dedup.release(fname, doc["ids"]) if self.dedup is not None else doc["ids"]
+            self.bm25.update(removed_ids=removed)
+            if self.dense is not None:
+                self.dense.update(removed_ids=removed)
+            self.partitions = TopicPartitions(self.documents)
+            if self.answer_cache is not None:
+                self.answer_cache.invalidate_chunks(doc["ids"])
+            return True
+
+    def sync(self):
+        """
+        Звіряє індекс з папкою документів: нові файли додаються, змінені (mtime/size,
+        потім sha256) — оновлюються, зниклі — видаляються.
+        """
+        report = {"added": [], "updated": [], "removed": []}
+        on_disk = set()
+        for fname in os.listdir(self.docs_path):
+            if not fname.endswith(".md"):
+                continue
+            on_disk.add(fname)
+            file_path = os.path.join(self.docs_path, fname)
+            doc = self.documents.get(fname)
+            if doc is not None:
+                st = os.stat(file_path)
+                if st.st_mtime_ns == doc["mtime"] and st.st_size == doc["size"]:
+                    continue
+            if self.update_document(file_path):
+                report["updated" if doc is not None else "added"].append(fname)
+
+        for fname in list(self.documents):
+            if fname not in on_disk and self.remove_document(fname):
+                report["removed"].append(fname)
+        return report
+
+    def _fuse(self, hits_by_retriever):
+        names = [name for name, hits in hits_by_retriever]
+        return fuse(
+            [hits for _, hits in hits_by_retriever],
+            strategy=self.fusion,
+            budget=self.candidate_budget,
+            weights=[self.fusion_weights.get(name, 1.0) for name in names]
+        )
+
+    def _filter(self, topic, source):
+        """Діапазони id для фільтра метаданих (None — весь корпус); розмір фільтра потрапляє в trace."""
+        ranges = self.partitions.ranges(topic, source)
+        if ranges is not None:
+            annotate(filter_chunks=range_size(ranges))
+        return ranges
+
+    def _search(self, search, query, ranges, **kwargs):
+        """search ретривера в межах ranges; без фільтра і з fanout_workers — паралельно по партиціях."""
+        k = self.retriever_k
+        if ranges is None and self._fanout is not None:
+            found = self._fanout.map(lambda group: search(query, k=k, ranges=group, **kwargs), self.partitions.groups())
+            return merge_hits(found, k)
+        return search(query, k=k, ranges=ranges, **kwargs)
+
+    def _search_batch(self, search_batch, queries, ranges, **kwargs):
+        k = self.retriever_k
+        if ranges is None and self._fanout is not None:
+            per_group = list(self._fanout.map(
+                lambda group: search_batch(queries, k=k, ranges=group, **kwargs), self.partitions.groups()
+            ))
+            return [merge_hits([found[i] for found in per_group], k) for i in range(len(queries))]
+        return search_batch(queries, k=k, ranges=ranges, **kwargs)
+
+    def retrieve(self, question: str, use_bm25: bool = True, use_dense: bool = True, query_embedding=None,
+                 topic=None, source=None):
+        """
+        Топ-5 чанків після реранку: [(text, score, idx), ...].
+        topic / source — фільтр за темою (chanks.topics або exam_core.ALL_TOPICS) і файлом-джерелом:
+        рядок або список; пошук торкається лише відповідних партицій.
+        """
+        query = (question or "").strip()
+        dense, reranker = self.dense, self.reranker
+        ranges = self._filter(topic, source)
+        hits = []
+
+        if use_bm25:
+            with span("bm25") as s:
+                hits.append(("bm25", self._search(self.bm25.search, query, ranges)))
+                s.set(hits=len(hits[-1][1]))
+
+        if use_dense and dense is not None:
+            if query_embedding is None:
+                with span("dense_encode"):
+                    query_embedding = dense.encode_query(query)
+            with span("dense_search") as s:
+                hits.append(("dense", self._search(dense.search, query, ranges, query_embedding=query_embedding)))
+                s.set(hits=len(hits[-1][1]))
+
+        # один чанк — один кандидат, не більше candidate_budget пар для cross-encoder
+        with span("fusion") as s:
+            candidates = self._fuse(hits)
+            s.set(candidates=len(candidates))
+        if not candidates:
+            return []
+
+        # Реранк і топ-5 (поки реранкер вантажиться — порядок після fusion)
+        if reranker is None:
+            return candidates[:5]
+        with span("rerank", batch=len(candidates)):
+            return reranker.rerank(query, candidates, top_n=5)[:5]
+
+    def retrieve_batch(self, questions, use_bm25: bool = True, use_dense: bool = True, query_embeddings=None,
+                       topic=None, source=None):
+        """
+        retrieve для списку питань: один encode на всі запити, спільний BM25-скоринг
+        і один predict реранкера. Результати — у порядку questions; порожні питання дають [].
+        topic / source — як у retrieve, один фільтр на весь пакет.
+        """
+        queries = [(q or "").strip() for q in questions]
+        active = [i for i, q in enumerate(queries) if q]
+        active_queries = [queries[i] for i in active]
+        active_embeddings = [query_embeddings[i] for i in active] if query_embeddings is not None else None
+        dense, reranker = self.dense, self.reranker
+        ranges = self._filter(topic, source)
+        hits = {i: [] for i in active}
+
+        if use_bm25:
+            with span("bm25", queries=len(active)):
+                for i, found in zip(active, self._search_batch(self.bm25.search_batch, active_queries, ranges)):
+                    hits[i].append(("bm25", found))
+
+        if use_dense and dense is not None:
+            with span("dense_search", queries=len(active)):
+                if active_embeddings is None and active_queries:
+                    # кодуємо тут, щоб fan-out по партиціях не кодував пакет для кожної
+                    active_embeddings = dense.encode_queries(active_queries)
+                found_lists = self._search_batch(
+                    dense.search_batch, active_queries, ranges, query_embeddings=active_embeddings
+                )
+                for i, found in zip(active, found_lists):
+                    hits[i].append(("dense", found))
+
+        with span("fusion") as s:
+            candidates = {i: self._fuse(hits[i]) for i in active}
+            s.set(candidates=sum(len(c) for c in candidates.values()))
+        with_hits = [i for i in active if candidates[i]]
+        if reranker is None:
+            return [candidates[i][:5] if i in candidates else [] for i in range(len(queries))]
+        with span("rerank", batch=sum(len(candidates[i]) for i in with_hits)):
+            reranked = reranker.rerank_batch(
+                [queries[i] for i in with_hits],
+                [candidates[i] for i in with_hits],
+                top_n=5
+            )
+        results = [[] for _ in queries]
+        for i, ranked in zip(with_hits, reranked):
+            results[i] = ranked[:5]
+        return results
+
+    def _query_embedding(self, query, api_key):
+        """
+        Ембединг питання потрібен і dense-пошуку, і семантичному кешу — рахуємо один раз.
+        None, якщо кеш не використовується (немає ключа) або dense-модель ще не готова.
+        """
+        dense = self.dense
+        if self.answer_cache is None or not api_key.strip() or dense is None:
+            return None
+        with span("dense_encode"):
+            return dense.encode_query(query)
+
+    def _query_embeddings(self, questions, api_key):
+        dense = self.dense
+        if self.answer_cache is None or not api_key.strip() or not questions or dense is None:
+            return None
+        with span("dense_encode", queries=len(questions)):
+            return dense.encode_queries([(q or "").strip() for q in questions])
+
+class AsyncRAGPipeline:
+    """
+    Asyncio-обгортка над RAGPipeline: BM25 і dense-пошук ідуть паралельно в пулі потоків
+    (CPU-робота не блокує event loop), LLM викликається через async-фронтенд спільного
+    llm_client (ті самі пул з'єднань, ліміти, повтори й single-flight, що й у sync-шляху).
+    Індекси й моделі — ті самі, що в pipeline.
+    """
+
+    def __init__(self, pipeline=None, max_workers=None):
+        self.pipeline = pipeline if pipeline is not None else RAGPipeline()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag")
+
+    async def aclose(self):
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # run_in_executor не переносить contextvars — копіюємо контекст, щоб span-и потрапили в trace запиту
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, partial(ctx.run, fn, *args, **kwargs))
+
+    async def retrieve(self, question: str, use_bm25: bool = True, use_dense: bool = True, query_embedding=None,
+                       topic=None, source=None):
+        rag = self.pipeline
+        query = (question or "").strip()
+        dense, reranker = rag.dense, rag.reranker
+        ranges = rag._filter(topic, source)
+        searches = []
+
+        if use_bm25:
+            searches.append(("bm25", self._run(self._timed, "bm25", rag._search, rag.bm25.search, query, ranges)))
+
+        if use_dense and dense is not None:
+            searches.append(("dense", self._run(
+                self._timed, "dense_search", rag._search, dense.search, query, ranges, query_embedding=query_embedding
+            )))
+
+        found = await asyncio.gather(*(search for _, search in searches))
+        with span("fusion") as s:
+            candidates = rag._fuse([(name, hits) for (name, _), hits in zip(searches, found)])
+            s.set(candidates=len(candidates))
+        if not candidates:
+            return []
+
+        if reranker is None:
+            return candidates[:5]
+        with span("rerank", batch=len(candidates)):
+            ranked = await self._run(reranker.rerank, query, candidates, top_n=5)
+        return ranked[:5]
+
+    @staticmethod
+    def _timed(stage, fn, *args, **kwargs):
+        with span(stage) as s:
+            found = fn(*args, **kwargs)
+            s.set(hits=len(found))
+        return found
+
+    async def _start(self, question, use_bm25, use_dense, api_key, base_url, model, topic=None, source=None):
+        """(query, reranked, q_emb, ready, sources, prompt) — спільна частина answer/answer_stream."""
+        rag = self.pipeline
+        query = (question or "").strip()
+        if not query:
+            return query, [], None, ("❌ Введіть питання.", []), [], None
+
+        q_emb = await self._run(rag._query_embedding, query, api_key)
+        reranked = await self.retrieve(query, use_bm25, use_dense, query_embedding=q_emb, topic=topic, source=source)
+        ready, sources, prompt = rag._prepare(query, reranked, api_key, base_url, model, q_emb)
+        return query, reranked, q_emb, ready, sources, prompt
+
+    async def answer(
+        self,
+        question: str,
+        use_bm25: bool = True,
+        use_dense: bool = True,
+        api_key: str = "",
+        base_url: str = "https://api.openai.com/v1",
+        model: str = "gpt-4o-mini",
+        trace=None,
+        topic=None,
+        source=None
+    ):
+        with self.pipeline._traced("answer", trace, query_chars=len((question or "").strip())):
+            query, reranked, q_emb, ready, sources, prompt = await self._start(
+                question, use_bm25, use_dense, api_key, base_url, model, topic, source
+            )
+            if ready is not None:
+                return ready
+            with span("llm", model=model) as s:
+                answer = await acall_llm(api_key, base_url, model, prompt)
+                s.set(response_chars=len(answer or ""))
+            return self.pipeline._finish(query, reranked, answer, sources, base_url, model, q_emb)
+
+    async def answer_stream(
+        self,
+        question: str,
+        use_bm25: bool = True,
+        use_dense: bool = True,
+        api_key: str = "",
+        base_url: str = "https://api.openai.com/v1",
+        model: str = "gpt-4o-mini",
+        trace=None,
+        topic=None,
+        source=None
+    ):
+        rag = self.pipeline
+        owned = trace is None
+        if owned:
+            trace = rag.tracer.start("answer_stream", query_chars=len((question or "").strip()))
+        try:
+            # як і в RAGPipeline.answer_stream, trace активний лише між yield-ами
+            with activate(trace):
+                query, reranked, q_emb, ready, sources, prompt = await self._start(
+                    question, use_bm25, use_dense, api_key, base_url, model, topic, source
+                )
+            if ready is not None:
+                yield ready
+                return
+
+            yield "", sources
+            answer = ""
+            with span("llm", trace, model=model, stream=True) as s:
+                started = time.perf_counter()
+                async for token in astream_llm(api_key, base_url, model, prompt):
+                    if not answer:
+                        s.set(first_token_ms=(time.perf_counter() - started) * 1000)
+                    answer += token
+                    yield answer, sources
+                s.set(response_chars=len(answer))
+            with activate(trace):
+                result = rag._finish(query, reranked, answer, sources, base_url, model, q_emb)
+            yield result
+        finally:
+            if owned:
+                rag.tracer.finish(trace)
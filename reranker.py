@@ -1,16 +1,133 @@
-from sentence_transformers import CrossEncoder
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+from chunking import normalize_query
+from inference import load_model
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def _ranked(candidates, scores):
+    ranked = sorted(
+        zip(candidates, scores),
+        key=lambda x: x[1],
+        reverse=True
+    )
+    return [c for c, _ in ranked]
+
+
+def query_key(query: str) -> bytes:
+    """Хеш нормалізованого запиту: регістр, пунктуація і зайві пробіли не впливають."""
+    return hashlib.blake2b(normalize_query(query).encode("utf-8"), digest_size=8).digest()
 
 
 class Reranker:
-    def __init__(self):
-        self.model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-
-    def rerank(self, query, candidates):
-        pairs = [(query, c[0]) for c in candidates]
-        scores = self.model.predict(pairs)
-        ranked = sorted(
-            zip(candidates, scores),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        return [c for c, _ in ranked]
+    """
+    Cross-encoder реранкер з LRU-кешем скорів (query-hash, chunk idx) і опційним каскадом.
+
+    Каскад (cascade=True) дивиться на скори першого етапу (після fusion):
+    - кандидати з нормалізованим скором нижче prune_below відкидаються (але лишається не менше top_n);
+    - якщо лишилось не більше top_n і сусідні скори розділені щонайменше skip_margin,
+      порядок і так очевидний — cross-encoder не викликається.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL, cache_size=4096, cascade=False, prune_below=0.2, skip_margin=0.25,
+                 backend="torch"):
+        # імпорт torch/sentence_transformers займає секунди — платимо за нього лише при створенні моделі
+        from sentence_transformers import CrossEncoder
+
+        self.model = load_model(CrossEncoder, model_name, backend)
+        self.backend = backend
+        self.cache_size = cache_size
+        self.cascade = cascade
+        self.prune_below = prune_below
+        self.skip_margin = skip_margin
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "skipped": 0, "pairs_in": 0, "pairs_scored": 0, "cache_hits": 0}
+
+    def stats(self):
+        """Лічильники й похідні метрики: cache_hit_rate, skip_rate, частка пар, що дійшли до моделі."""
+        with self._lock:
+            s = dict(self._stats)
+        looked_up = s["cache_hits"] + s["pairs_scored"]
+        s["cache_hit_rate"] = s["cache_hits"] / looked_up if looked_up else 0.0
+        s["skip_rate"] = s["skipped"] / s["queries"] if s["queries"] else 0.0
+        s["model_pair_ratio"] = s["pairs_scored"] / s["pairs_in"] if s["pairs_in"] else 0.0
+        return s
+
+    def _cascade(self, candidates, top_n):
+        """(кандидати для cross-encoder, skip) за скорами першого етапу."""
+        if not self.cascade or top_n is None or len(candidates) <= 1:
+            return candidates, len(candidates) <= 1
+        ordered = sorted(candidates, key=lambda c: c[1], reverse=True)
+        lo, hi = ordered[-1][1], ordered[0][1]
+        if hi == lo:
+            return ordered, False
+        norm = [(c[1] - lo) / (hi - lo) for c in ordered]
+        keep = max(top_n, sum(1 for z in norm if z >= self.prune_below))
+        kept, norm = ordered[:keep], norm[:keep]
+        separated = all(a - b >= self.skip_margin for a, b in zip(norm, norm[1:]))
+        return kept, len(kept) <= top_n and separated
+
+    def _score(self, pairs_by_query):
+        """
+        pairs_by_query: [(query, candidates)] → списки скорів. Кешовані пари беруться з LRU,
+        решта — одним predict на весь пакет.
+        """
+        scores, missing = [], []
+        with self._lock:
+            for q_no, (query, candidates) in enumerate(pairs_by_query):
+                qk = query_key(query)
+                row = []
+                for c_no, c in enumerate(candidates):
+                    key = (qk, c[2])
+                    score = self._cache.get(key)
+                    if score is None:
+                        missing.append((q_no, c_no, key, query, c[0]))
+                    else:
+                        self._cache.move_to_end(key)
+                        self._stats["cache_hits"] += 1
+                    row.append(score)
+                scores.append(row)
+
+        if missing:
+            predicted = self.model.predict([(query, text) for _, _, _, query, text in missing])
+            with self._lock:
+                for (q_no, c_no, key, _, _), score in zip(missing, predicted):
+                    score = float(score)
+                    scores[q_no][c_no] = score
+                    if self.cache_size:
+                        self._cache[key] = score
+                        self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                self._stats["pairs_scored"] += len(missing)
+        return scores
+
+    def rerank(self, query, candidates, top_n=None):
+        return self.rerank_batch([query], [candidates], top_n=top_n)[0]
+
+    def rerank_batch(self, queries, candidate_lists, top_n=None):
+        """Пари (запит, кандидат) усіх запитів проходять через один predict; порядок запитів зберігається."""
+        results = [None] * len(candidate_lists)
+        to_score = []
+        with self._lock:
+            self._stats["queries"] += len(candidate_lists)
+            self._stats["pairs_in"] += sum(len(c) for c in candidate_lists)
+        for i, (query, candidates) in enumerate(zip(queries, candidate_lists)):
+            kept, skip = self._cascade(candidates, top_n)
+            if skip:
+                results[i] = kept
+                if len(candidates) > 1:
+                    with self._lock:
+                        self._stats["skipped"] += 1
+            else:
+                to_score.append((i, query, kept))
+
+        scored = self._score([(query, kept) for _, query, kept in to_score])
+        for (i, _, kept), scores in zip(to_score, scored):
+            results[i] = _ranked(kept, scores)
+        return results
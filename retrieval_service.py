@@ -0,0 +1,491 @@
+"""
+Serving-режим для кількох процесів app.py: один процес сервісу тримає моделі (dense і reranker)
+та індекси, воркери ходять до нього по локальному IPC (multiprocessing.connection, TCP на localhost
+або unix-сокет, з authkey).
+
+- Одночасні запити від усіх воркерів збираються в мікробатчі (MicroBatcher): кодування питань
+  і retrieval з реранком — один encode_queries / retrieve_batch на пакет замість виклику на кожне питання.
+- Корпус (текст чанків, метадані, статистики BM25, ембединги) — у shard-файлі (shard.py), який сервіс
+  і воркери відкривають через mmap: сторінки файлу в пам'яті одні на всі процеси.
+- Воркер (RemoteRAGPipeline) — той самий AnswerPipeline для промпту, кешу відповідей і LLM, що й у
+  RAGPipeline, але без власних моделей та індексів; пакування контексту читає чанки з того ж shard.
+
+  RAG_SERVICE_KEY=... python -m retrieval_service serve --address 127.0.0.1:6100
+  RAG_SERVICE_KEY=... RAG_SERVICE=127.0.0.1:6100 python app.py  # воркер
+  python -m retrieval_service launch --workers 4 --port 7860     # сервіс + 4 app.py на портах 7860..7863
+
+Ключ (RAG_SERVICE_KEY) обов'язковий і спільний для сервісу й воркерів; launch генерує випадковий сам.
+
+Корпус у serving-режимі незмінний: оновлення — новий shard (python chanks.py) і перезапуск.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from rag_pipeline import DOCS_PATH, AnswerPipeline, AsyncRAGPipeline, RAGPipeline
+from shard import SHARD_PATH, Shard, build_shard
+from tracing import Tracer, span
+
+SERVICE_ADDRESS = "127.0.0.1:6100"
+SERVICE_KEY_ENV = "RAG_SERVICE_KEY"
+
+
+def service_authkey(authkey=None):
+    """
+    authkey перевіряється до першого recv(): повідомлення — pickle, тож без ключа з'єднання
+    дорівнює виконанню довільного коду. Типового ключа немає: явний або з RAG_SERVICE_KEY.
+    """
+    if authkey is None:
+        authkey = os.environ.get(SERVICE_KEY_ENV, "")
+    if isinstance(authkey, str):
+        authkey = authkey.encode("utf-8")
+    if not authkey:
+        raise RuntimeError(f"Retrieval service key is not set: export {SERVICE_KEY_ENV} or pass authkey")
+    return authkey
+
+
+def parse_address(address):
+    """"host:port" → (host, port) для TCP; інакше — шлях unix-сокета."""
+    if isinstance(address, tuple):
+        return address
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def _no_delay(conn, address):
+    """TCP_NODELAY: без нього Nagle і delayed ACK додають ~40 мс до кожної відповіді."""
+    if isinstance(address, tuple):
+        sock = socket.socket(fileno=os.dup(conn.fileno()))
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        finally:
+            sock.close()
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class MicroBatcher:
+    """
+    Один потік, що виконує fn(key, items) пакетами: перший запит чекає до max_wait секунд на інші
+    з тим самим key (не більше max_batch). Поки пакет рахується, нові запити накопичуються в черзі
+    й ідуть наступним пакетом, тож під навантаженням пакети ростуть самі.
+    """
+
+    def __init__(self, fn, max_batch=32, max_wait=0.002, name="micro-batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "items": 0, "largest": 0}
+        threading.Thread(target=self._loop, name=name, daemon=True).start()
+
+    def submit(self, key, item):
+        """Future з (результат, розмір пакета, в якому його пораховано)."""
+        future = Future()
+        self._queue.put((key, item, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            groups = {}
+            for key, item, future in self._collect():
+                groups.setdefault(key, []).append((item, future))
+            for key, entries in groups.items():
+                with self._lock:
+                    self.stats["batches"] += 1
+                    self.stats["items"] += len(entries)
+                    self.stats["largest"] = max(self.stats["largest"], len(entries))
+                try:
+                    results = self.fn(key, [item for item, _ in entries])
+                except Exception as e:
+                    for _, future in entries:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(entries, results):
+                    future.set_result((result, len(entries)))
+
+
+class RetrievalService:
+    """
+    Обслуговує RAGPipeline по IPC. Операції: "encode" (питання → ембединг або None, поки dense не готовий),
+    "retrieve" (питання, use_bm25, use_dense, ембединг або None, topic, source → топ-5 [(score, idx)];
+    текст чанків воркер читає зі свого mmap того ж shard), "status", "info".
+    Кожне з'єднання може мати багато запитів у польоті: відповіді йдуть з request id.
+    """
+
+    def __init__(self, pipeline, address=SERVICE_ADDRESS, authkey=None, max_batch=32, max_wait=0.002):
+        self.pipeline = pipeline
+        self.address = parse_address(address)
+        self.authkey = service_authkey(authkey)
+        self.batcher = MicroBatcher(self._run_batch, max_batch=max_batch, max_wait=max_wait, name="retrieval-batcher")
+        self.connections = 0
+        self._listener = None
+
+    def _run_batch(self, key, items):
+        rag = self.pipeline
+        dense = rag.dense
+        if key[0] == "encode":
+            if dense is None:
+                return [None] * len(items)
+            return list(dense.encode_queries(items))
+
+        _, use_bm25, use_dense, topic, source = key
+        queries = [query for query, _ in items]
+        embeddings = None
+        if use_dense and dense is not None:
+            # ембединги, які воркер уже мав (семантичний кеш), не перераховуються
+            embeddings = [embedding for _, embedding in items]
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            if missing:
+                for i, vector in zip(missing, dense.encode_queries([queries[i] for i in missing])):
+                    embeddings[i] = vector
+            embeddings = np.stack(embeddings)
+        found = rag.retrieve_batch(queries, use_bm25, use_dense, query_embeddings=embeddings, topic=topic, source=source)
+        return [[(score, idx) for _, score, idx in ranked] for ranked in found]
+
+    def info(self):
+        rag = self.pipeline
+        return {
+            "chunks": len(rag.store),
+            "shard": rag.shard.path if rag.shard is not None else None,
+            "batcher": dict(self.batcher.stats),
+            "connections": self.connections,
+        }
+
+    def serve_forever(self):
+        self._listener = Listener(self.address, authkey=self.authkey)
+        print(f"[retrieval-service] listening on {self.address}, {len(self.pipeline.store)} chunks")
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._listener is None:
+                    return  # close()
+                continue  # клієнт не пройшов authkey або відключився під час handshake
+            _no_delay(conn, self.address)
+            self.connections += 1
+            threading.Thread(target=self._serve_connection, args=(conn,), name="retrieval-conn", daemon=True).start()
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+
+    def _serve_connection(self, conn):
+        send_lock = threading.Lock()
+
+        def reply(request_id, error, value=None, batch=1):
+            with send_lock:
+                try:
+                    conn.send((request_id, error, value, {"batch": batch}))
+                except OSError:
+                    pass  # воркер відключився, поки пакет рахувався
+
+        def done(request_id, future):
+            try:
+                value, batch = future.result()
+            except Exception as e:
+                reply(request_id, f"{type(e).__name__}: {e}")
+            else:
+                reply(request_id, None, value, batch)
+
+        with conn:
+            while True:
+                try:
+                    request_id, op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if op == "encode":
+                    future = self.batcher.submit(("encode",), args[0])
+                elif op == "retrieve":
+                    query, use_bm25, use_dense, embedding, topic, source = args
+                    # в один пакет ідуть запити з однаковими прапорцями й фільтром
+                    key = ("retrieve", bool(use_bm25), bool(use_dense), _hashable(topic), _hashable(source))
+                    future = self.batcher.submit(key, (query, embedding))
+                elif op == "status":
+                    reply(request_id, None, self.pipeline.status())
+                    continue
+                elif op == "info":
+                    reply(request_id, None, self.info())
+                    continue
+                else:
+                    reply(request_id, f"ValueError: Unknown operation {op!r}")
+                    continue
+                future.add_done_callback(lambda f, request_id=request_id: done(request_id, f))
+
+
+class RetrievalClient:
+    """
+    Одне з'єднання процесу воркера з сервісом, спільне для всіх потоків і event loop-а:
+    submit() повертає concurrent Future, відповіді розбирає фоновий потік. Після розриву
+    з'єднання (перезапуск сервісу) наступний submit() підключається заново.
+    """
+
+    def __init__(self, address=SERVICE_ADDRESS, authkey=None, timeout=30):
+        self.address = parse_address(address)
+        self.authkey = service_authkey(authkey)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}
+        self._conn = None
+
+    def _connection(self):
+        # під self._lock
+        if self._conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            _no_delay(conn, self.address)
+            self._conn = conn
+            threading.Thread(target=self._receive, args=(conn,), name="retrieval-client", daemon=True).start()
+        return self._conn
+
+    def submit(self, op, *args):
+        """Future з (результат, {"batch": розмір мікробатчу сервісу})."""
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                self._connection().send((request_id, op, args))
+            except (OSError, EOFError) as e:
+                del self._pending[request_id]
+                self._conn = None
+                raise ConnectionError(f"Retrieval service at {self.address} is unavailable: {e}") from e
+        return future
+
+    def call(self, op, *args):
+        return self.submit(op, *args).result(self.timeout)
+
+    def _receive(self, conn):
+        while True:
+            try:
+                request_id, error, value, meta = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(f"Retrieval service: {error}"))
+            else:
+                future.set_result((value, meta))
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+            # запити цього з'єднання відповіді вже не отримають
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ConnectionError(f"Retrieval service at {self.address} closed the connection"))
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+
+class RemoteRAGPipeline(AnswerPipeline):
+    """
+    Пайплайн воркера: retrieval і кодування питань — у RetrievalService, промпт, кеш відповідей
+    і виклик LLM (AnswerPipeline, спільний з RAGPipeline) — тут. Чанки для контексту й підписів джерел
+    читаються з того ж shard (mmap), що й у сервісу; кількість чанків звіряється при підключенні.
+    """
+
+    def __init__(self, shard_path=SHARD_PATH, address=SERVICE_ADDRESS, authkey=None, answer_cache=True,
+                 context_tokens=1500, tracer=None, timeout=30):
+        super().__init__(answer_cache=answer_cache, context_tokens=context_tokens, tracer=tracer)
+        self.shard = Shard(shard_path)
+        self.chunking = dict(self.shard.chunking)
+        self.store = self.shard.store()
+        self.documents = self.shard.documents()
+        self.dedup = self.shard.dedup(self.store)
+        self.client = RetrievalClient(address, authkey, timeout=timeout)
+        info, _ = self.client.call("info")
+        if info["chunks"] != len(self.store):
+            raise ValueError(
+                f"Retrieval service has {info['chunks']} chunks, shard {shard_path} has {len(self.store)}; "
+                "both must use the same shard"
+            )
+
+    def status(self):
+        state, _ = self.client.call("status")
+        return state
+
+    def wait_ready(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self.status()
+            state.pop("ready_after")
+            if all(value == "ready" for value in state.values()):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.2)
+
+    # корпус воркера — чужий shard: оновлення — новий shard (python chanks.py) і перезапуск сервісу
+    def add_document(self, file_path):
+        raise RuntimeError("retrieval service client is read-only")
+
+    def update_document(self, file_path):
+        raise RuntimeError("retrieval service client is read-only")
+
+    def remove_document(self, fname):
+        raise RuntimeError("retrieval service client is read-only")
+
+    def sync(self):
+        raise RuntimeError("retrieval service client is read-only")
+
+    def _query_embedding(self, query, api_key):
+        if self.answer_cache is None or not api_key.strip():
+            return None
+        with span("dense_encode") as s:
+            embedding, meta = self.client.call("encode", query)
+            s.set(batch=meta["batch"])
+        return embedding
+
+    def submit_retrieve(self, question, use_bm25=True, use_dense=True, query_embedding=None, topic=None, source=None):
+        return self.client.submit(
+            "retrieve", (question or "").strip(), use_bm25, use_dense, query_embedding, topic, source
+        )
+
+    def hits(self, ranked):
+        """[(score, idx)] від сервісу → [(text, score, idx)], як у RAGPipeline.retrieve."""
+        return [(self.store[idx], score, idx) for score, idx in ranked]
+
+    def retrieve(self, question, use_bm25=True, use_dense=True, query_embedding=None, topic=None, source=None):
+        with span("retrieve_remote") as s:
+            ranked, meta = self.submit_retrieve(question, use_bm25, use_dense, query_embedding, topic, source).result(
+                self.client.timeout
+            )
+            s.set(batch=meta["batch"], hits=len(ranked))
+        return self.hits(ranked)
+
+    def retrieve_batch(self, questions, use_bm25=True, use_dense=True, query_embeddings=None, topic=None, source=None):
+        # запити йдуть разом і потрапляють в один мікробатч сервісу
+        futures = [
+            self.submit_retrieve(
+                q, use_bm25, use_dense, query_embeddings[i] if query_embeddings is not None else None, topic, source
+            )
+            for i, q in enumerate(questions)
+        ]
+        with span("retrieve_remote", queries=len(questions)):
+            return [self.hits(future.result(self.client.timeout)[0]) for future in futures]
+
+
+class AsyncRemoteRAGPipeline(AsyncRAGPipeline):
+    """AsyncRAGPipeline над RemoteRAGPipeline: retrieval чекає на відповідь сервісу без потоку з пулу."""
+
+    async def retrieve(self, question, use_bm25=True, use_dense=True, query_embedding=None, topic=None, source=None):
+        rag = self.pipeline
+        with span("retrieve_remote") as s:
+            ranked, meta = await asyncio.wrap_future(
+                rag.submit_retrieve(question, use_bm25, use_dense, query_embedding, topic, source)
+            )
+            s.set(batch=meta["batch"], hits=len(ranked))
+        return rag.hits(ranked)
+
+
+def wait_for_service(address=SERVICE_ADDRESS, authkey=None, timeout=600, process=None):
+    """Чекає, доки сервіс прийматиме з'єднання (моделі вантажаться до listen). process — щоб не чекати мертвий."""
+    authkey = service_authkey(authkey)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            Client(parse_address(address), authkey=authkey).close()
+            return
+        except OSError:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Retrieval service exited with code {process.returncode}")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Retrieval service at {address} did not start in {timeout}s")
+            time.sleep(0.2)
+
+
+def ensure_shard(shard_path, docs_path=DOCS_PATH):
+    """Serving-режим читає корпус лише з shard; якщо його немає — будується з docs_path."""
+    if not os.path.exists(shard_path):
+        print(f"[retrieval-service] building {shard_path} from {docs_path}")
+        build_shard(docs_path, shard_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="процес сервісу: моделі й індекси")
+    launch = sub.add_parser("launch", help="сервіс і кілька процесів app.py, що ходять до нього")
+    for p in (serve, launch):
+        p.add_argument("--address", default=os.environ.get("RAG_SERVICE", SERVICE_ADDRESS),
+                       help="host:port або шлях unix-сокета")
+        p.add_argument("--shard", default=SHARD_PATH)
+        p.add_argument("--docs", default=DOCS_PATH, help="звідки будувати shard, якщо його ще немає")
+        p.add_argument("--backend", default="torch")
+        p.add_argument("--max-batch", type=int, default=32)
+        p.add_argument("--max-wait-ms", type=float, default=2.0)
+    launch.add_argument("--workers", type=int, default=2)
+    launch.add_argument("--port", type=int, default=7860, help="порт першого воркера; далі port+1, ...")
+    args = parser.parse_args()
+
+    if args.command == "serve" and not os.environ.get(SERVICE_KEY_ENV):
+        parser.error(f"{SERVICE_KEY_ENV} is not set; use a random secret shared with the workers")
+    ensure_shard(args.shard, args.docs)
+    if args.command == "serve":
+        rag = RAGPipeline(shard_path=args.shard, backend=args.backend, answer_cache=False, tracer=Tracer(enabled=False))
+        RetrievalService(rag, args.address, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000).serve_forever()
+        return
+
+    base = [sys.executable, "-m", "retrieval_service", "serve", "--address", args.address, "--shard", args.shard,
+            "--backend", args.backend, "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms)]
+    key = os.environ.get(SERVICE_KEY_ENV) or secrets.token_hex()
+    service = subprocess.Popen(base, env=dict(os.environ, **{SERVICE_KEY_ENV: key}))
+    processes = [service]
+    try:
+        wait_for_service(args.address, authkey=key, process=service)
+        for i in range(args.workers):
+            env = dict(os.environ, RAG_SERVICE=args.address, GRADIO_SERVER_PORT=str(args.port + i),
+                       **{SERVICE_KEY_ENV: key})
+            processes.append(subprocess.Popen([sys.executable, "app.py"], env=env))
+        print(f"[launch] {args.workers} workers on ports {args.port}..{args.port + args.workers - 1}; "
+              "put a reverse proxy with sticky sessions in front of them")
+        service.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
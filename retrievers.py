@@ -1,30 +1,144 @@
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer, util
+import os
+
+import numpy as np
+
+from ann_index import ExactIndex, IVFIndex
+from bm25_index import BM25Index
+from embedding_cache import ENCODE_BATCH_SIZE, EmbeddingCache
+from inference import cache_model_name, load_model
+
+DENSE_MODEL = "all-MiniLM-L6-v2"
+EMBEDDINGS_CACHE_DIR = "data/cache/embeddings"
 
 
 class BM25Retriever:
-    def __init__(self, chunks):
+    def __init__(self, chunks, index=None):
+        # chunks — ChunkStore пайплайна (або будь-яка послідовність рядків); текст читається за індексом
         self.chunks = chunks
-        tokenized = [c.lower().split() for c in chunks]
-        self.bm25 = BM25Okapi(tokenized)
+        # індекс — незмінний знімок; update() підміняє його одним присвоєнням.
+        # index — готові статистики над тими ж chunks (напр. з shard.py), тоді корпус не токенізується
+        self.index = index if index is not None else BM25Index([c.lower().split() for c in chunks])
+
+    def update(self, added_ids=(), removed_ids=()):
+        """
+        Патчить статистики BM25: added_ids — нові індекси в кінці self.chunks,
+        removed_ids — чанки, що більше не мають потрапляти у видачу (tombstone).
+        """
+        index = self.index
+        added_ids = list(added_ids)
+        if added_ids and added_ids != list(range(index.size, index.size + len(added_ids))):
+            raise ValueError(f"Chunk ids must be appended in order, got {added_ids[0]}")
+        self.index = index.patched(
+            added=[self.chunks[i].lower().split() for i in added_ids],
+            removed={i: self.chunks[i].lower().split() for i in removed_ids}
+        )
+
+    def removed_ids(self):
+        alive = self.index.alive
+        return [] if alive is None else np.flatnonzero(~alive).tolist()
 
-    def search(self, query, k=5):
-        scores = self.bm25.get_scores(query.lower().split())
-        top = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        return [(self.chunks[i], float(scores[i]), i) for i in top]
+    def search(self, query, k=5, ranges=None):
+        """ranges — діапазони id чанків (фільтр партицій, partitions.py); None — весь корпус."""
+        ids, scores = self.index.top_k(query.lower().split(), k, ranges=ranges)
+        return self._results(ids, scores)
+
+    def search_batch(self, queries, k=5, ranges=None):
+        batch = self.index.top_k_batch([q.lower().split() for q in queries], k, ranges=ranges)
+        return [self._results(ids, scores) for ids, scores in batch]
+
+    def _results(self, ids, scores):
+        return [(self.chunks[i], float(s), i) for i, s in zip(ids.tolist(), scores.tolist())]
 
 
 class DenseRetriever:
-    def __init__(self, chunks):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self, chunks, model_name=DENSE_MODEL, cache_dir=EMBEDDINGS_CACHE_DIR,
+                 index="exact", n_lists=None, nprobe=8, backend="torch", vectors=None):
+        # імпорт torch/sentence_transformers займає секунди — платимо за нього лише при створенні моделі
+        from sentence_transformers import SentenceTransformer
+
+        self.model = load_model(SentenceTransformer, model_name, backend)
+        self.backend = backend
         self.chunks = chunks
-        self.embeddings = self.model.encode(chunks, convert_to_tensor=True)
-
-    def search(self, query, k=5):
-        q_emb = self.model.encode(query, convert_to_tensor=True)
-        scores = util.cos_sim(q_emb, self.embeddings)[0]
-        top = scores.topk(k)
-        return [
-            (self.chunks[i], float(scores[i]), int(i))
-            for i in top.indices
-        ]
+        cache = None
+        if vectors is not None:
+            # готова матриця для тих самих chunks (shard.py) — ні кодування, ні кешу
+            if len(vectors) != len(chunks):
+                raise ValueError(f"Got {len(vectors)} vectors for {len(chunks)} chunks")
+            matrix = vectors
+        elif cache_dir:
+            # кодуємо лише нові/змінені чанки, решта підтягується з диска через mmap
+            cache = EmbeddingCache(cache_dir, cache_model_name(model_name, backend))
+            matrix = cache.load(chunks, self.encode_chunks)
+        else:
+            matrix = self.encode_chunks_batched(chunks)
+        # індекс — незмінний знімок; update() підміняє його одним присвоєнням
+        self.index = self._build_index(matrix, index, cache, n_lists, nprobe)
+
+    @staticmethod
+    def _build_index(matrix, kind, cache, n_lists, nprobe):
+        if kind == "exact" or (kind == "ivf" and not len(matrix)):
+            return ExactIndex(matrix)
+        if kind == "ivf":
+            path = os.path.join(cache.dir, "ivf.npz") if cache else None
+            fingerprint = f"{cache.fingerprint()}:{n_lists}" if cache else ""
+            if path and os.path.exists(path):
+                loaded = IVFIndex.load(path, matrix, nprobe=nprobe, fingerprint=fingerprint)
+                if loaded is not None:
+                    return loaded
+            built = IVFIndex.build(matrix, n_lists=n_lists, nprobe=nprobe)
+            if path:
+                built.save(path, fingerprint=fingerprint)
+            return built
+        raise ValueError(f"Unknown dense index: {kind!r} (expected 'exact' or 'ivf')")
+
+    def exact_index(self):
+        """Еталонний точний пошук над тими самими векторами (для звірки recall ANN)."""
+        index = self.index
+        return ExactIndex(index.vectors, norms=index.norms, alive=index.alive)
+
+    def encode_chunks(self, texts):
+        return self.model.encode(list(texts), convert_to_numpy=True)
+
+    def encode_chunks_batched(self, chunks, batch_size=ENCODE_BATCH_SIZE):
+        """Матриця ембедингів для всіх chunks; тексти декодуються й кодуються по batch_size."""
+        matrix = None
+        for start in range(0, len(chunks), batch_size):
+            vectors = self.encode_chunks([chunks[i] for i in range(start, min(start + batch_size, len(chunks)))])
+            if matrix is None:
+                matrix = np.empty((len(chunks), vectors.shape[1]), dtype=np.float32)
+            matrix[start:start + len(vectors)] = vectors
+        return matrix if matrix is not None else np.empty((0, 0), dtype=np.float32)
+
+    def update(self, added_ids=(), vectors=None, removed_ids=()):
+        """
+        Дописує рядки ембедингів для added_ids (vectors з encode_chunks, в тому ж порядку)
+        і маскує removed_ids. Кодування варто робити до виклику, поза локами.
+        """
+        index = self.index
+        added_ids = list(added_ids)
+        if added_ids and (added_ids[0] != len(index) or len(vectors) != len(added_ids)):
+            raise ValueError("Chunk ids must be appended in order, one vector per chunk")
+        self.index = index.patched(vectors if added_ids else None, removed_ids)
+
+    def encode_query(self, query):
+        return self.model.encode(query, convert_to_numpy=True)
+
+    def encode_queries(self, queries):
+        return self.model.encode(list(queries), convert_to_numpy=True)
+
+    def search(self, query, k=5, nprobe=None, query_embedding=None, ranges=None):
+        """query_embedding — вже порахований encode_query(query), щоб не кодувати запит двічі."""
+        q_emb = self.encode_query(query) if query_embedding is None else query_embedding
+        ids, scores = self.index.search(q_emb, k, nprobe=nprobe, ranges=ranges)
+        return self._results(ids, scores)
+
+    def search_batch(self, queries, k=5, nprobe=None, query_embeddings=None, ranges=None):
+        """Усі запити кодуються одним викликом encode (батчами моделі)."""
+        if not queries:
+            return []
+        q_embs = self.encode_queries(queries) if query_embeddings is None else query_embeddings
+        batch = self.index.search_batch(q_embs, k, nprobe=nprobe, ranges=ranges)
+        return [self._results(ids, scores) for ids, scores in batch]
+
+    def _results(self, ids, scores):
+        return [(self.chunks[i], float(s), i) for i, s in zip(ids.tolist(), scores.tolist())]
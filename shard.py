@@ -0,0 +1,199 @@
+"""
+Упакований shard корпусу: один файл замість тисяч .txt-чанків.
+
+Формат (little-endian):
+  8 байт   magic b"RAGSHARD"
+  4 байти  версія формату (uint32)
+  8 байт   довжина заголовка (uint64)
+  заголовок — JSON: параметри chunking, документи (fingerprint + діапазон чанків),
+             і таблиця секцій {ім'я: {offset, dtype, shape}} — зсуви від початку файлу
+  секції   — сирі масиви, вирівняні на 64 байти: читаються через np.memmap без копіювання
+
+Секції: text / offsets / meta (ChunkStore), опційно bm25_* (статистики BM25Index),
+embeddings (матриця float32, модель — у заголовку) і dedup_refs (місця дедуплікованих чанків).
+
+  python chanks.py --shard data/shards/corpus.rshard     # згенерувати документи й shard
+"""
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from bm25_index import BM25Index
+from chunk_store import META_DTYPE, ChunkStore
+from dedup import ChunkDeduper
+from inference import cache_model_name
+from ingest import ingest
+from retrievers import DENSE_MODEL, BM25Retriever, DenseRetriever
+
+MAGIC = b"RAGSHARD"
+SHARD_VERSION = 1
+SHARD_PATH = "data/shards/corpus.rshard"
+_ALIGN = 64
+_PREFIX = struct.Struct("<8sIQ")
+REFS_DTYPE = np.dtype([("chunk", np.int32), ("doc", np.int32), ("ordinal", np.int32), ("start", np.int64),
+                       ("end", np.int64)])
+
+
+def _aligned(pos):
+    return (pos + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_shard(path, store, documents, chunking, bm25=None, embeddings=None, embedding_model=None, dedup=None):
+    """
+    store — ChunkStore, documents — {fname: fingerprint + ids}, chunking — {"chunk_size", "overlap"}.
+    bm25 — BM25Index над тими ж чанками, embeddings — матриця (len(store), dim),
+    dedup — ChunkDeduper, яким наповнювався store. Запис атомарний.
+    """
+    size = len(store)
+    offsets = np.ascontiguousarray(store._offsets[:size + 1])
+    arrays = {
+        "text": np.ascontiguousarray(store._data[:int(offsets[-1])]),
+        "offsets": offsets,
+        "meta": np.ascontiguousarray(store.meta),
+    }
+    terms = None
+    if bm25 is not None:
+        terms, postings_offsets, ids, tfs, doc_len = bm25.to_arrays()
+        vocab = "\n".join(terms).encode("utf-8")
+        arrays.update({
+            "bm25_vocab": np.frombuffer(vocab, dtype=np.uint8),
+            "bm25_offsets": postings_offsets,
+            "bm25_ids": ids,
+            "bm25_tfs": tfs,
+            "bm25_doc_len": doc_len,
+        })
+    if embeddings is not None:
+        arrays["embeddings"] = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if dedup is not None:
+        arrays["dedup_refs"] = dedup.refs_array(REFS_DTYPE)
+
+    header = {
+        "version": SHARD_VERSION,
+        "created": time.time(),
+        "count": size,
+        "chunking": chunking,
+        "docs": store.docs,
+        "documents": {fname: dict(doc, ids=[int(i) for i in doc["ids"]]) for fname, doc in documents.items()},
+        "bm25": None if bm25 is None else {"k1": bm25.k1, "b": bm25.b, "epsilon": bm25.epsilon, "terms": len(terms)},
+        "embedding_model": embedding_model if embeddings is not None else None,
+        "dedup": None if dedup is None else dict(dedup.params(), stats=dedup.report()),
+        "sections": {},
+    }
+
+    # зсуви секцій залежать від довжини заголовка, а вона — від зсувів: рахуємо, поки не зійдеться
+    reserved = 0
+    while True:
+        pos = _aligned(_PREFIX.size + reserved)
+        for name, array in arrays.items():
+            dtype = array.dtype.descr if array.dtype.names else array.dtype.str
+            header["sections"][name] = {"offset": pos, "dtype": dtype, "shape": list(array.shape)}
+            pos = _aligned(pos + array.nbytes)
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(encoded) <= reserved:
+            break
+        reserved = len(encoded) + 256
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, SHARD_VERSION, reserved))
+        f.write(encoded.ljust(reserved))
+        for name, array in arrays.items():
+            f.seek(header["sections"][name]["offset"])
+            f.write(array.tobytes())
+    os.replace(tmp, path)
+
+
+class Shard:
+    """Відкритий shard: заголовок у пам'яті, секції — np.memmap (читаються лише потрібні сторінки)."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                raise ValueError(f"Not a shard file: {path}")
+            magic, version, header_len = _PREFIX.unpack(prefix)
+            if magic != MAGIC:
+                raise ValueError(f"Not a shard file: {path}")
+            if version > SHARD_VERSION:
+                raise ValueError(f"Shard version {version} is newer than supported {SHARD_VERSION}: {path}")
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+        self.version = version
+
+    def has(self, name):
+        return name in self.header["sections"]
+
+    def section(self, name):
+        info = self.header["sections"][name]
+        descr = info["dtype"]
+        dtype = np.dtype([tuple(field) for field in descr]) if isinstance(descr, list) else np.dtype(descr)
+        shape = tuple(info["shape"])
+        if not int(np.prod(shape)):
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=info["offset"], shape=shape)
+
+    @property
+    def chunking(self):
+        return self.header["chunking"]
+
+    def documents(self):
+        return {fname: dict(doc) for fname, doc in self.header["documents"].items()}
+
+    def store(self):
+        meta = self.section("meta")
+        if meta.dtype != META_DTYPE:
+            meta = meta.astype(META_DTYPE)
+        return ChunkStore(
+            data=self.section("text"), offsets=self.section("offsets"), meta=meta, docs=self.header["docs"]
+        )
+
+    def bm25_index(self):
+        params = self.header.get("bm25")
+        if params is None:
+            return None
+        vocab = self.section("bm25_vocab").tobytes().decode("utf-8")
+        terms = vocab.split("\n") if params["terms"] else []
+        return BM25Index.from_arrays(
+            terms, self.section("bm25_offsets"), self.section("bm25_ids"), self.section("bm25_tfs"),
+            self.section("bm25_doc_len"), k1=params["k1"], b=params["b"], epsilon=params["epsilon"]
+        )
+
+    def dedup(self, store):
+        """ChunkDeduper для store з цього shard (з тими ж параметрами й місцями чанків) або None."""
+        params = self.header.get("dedup")
+        if params is None:
+            return None
+        params = {k: v for k, v in params.items() if k != "stats"}
+        return ChunkDeduper(store, refs=ChunkDeduper.refs_from_array(self.section("dedup_refs")), **params)
+
+    def embeddings(self, model_name):
+        """Матриця ембедингів, якщо shard збережено для тієї ж моделі (і бекенду), інакше None."""
+        if self.header.get("embedding_model") != model_name or not self.has("embeddings"):
+            return None
+        return self.section("embeddings")
+
+
+def build_shard(docs_dir, path=SHARD_PATH, chunk_size=300, overlap=50, workers=None, bm25=True,
+                embed=False, model_name=None, backend="torch", dedup=False):
+    """
+    Документи docs_dir → shard: chunking, статистики BM25 і (embed=True) ембединги dense-моделі.
+    dedup=True — повторні чанки зберігаються один раз (dedup.py). Повертає (IngestStats, ChunkDeduper або None).
+    """
+    store = ChunkStore()
+    deduper = ChunkDeduper(store) if dedup else None
+    documents, stats = ingest(docs_dir, store, workers=workers, chunk_size=chunk_size, overlap=overlap, dedup=deduper)
+    store.compact()
+    index = BM25Retriever(store).index if bm25 else None
+    embeddings, embedding_model = None, None
+    if embed:
+        model_name = model_name or DENSE_MODEL
+        encoder = DenseRetriever([], model_name=model_name, cache_dir=None, backend=backend)
+        embeddings = encoder.encode_chunks_batched(store)
+        embedding_model = cache_model_name(model_name, backend)
+    write_shard(path, store, documents, {"chunk_size": chunk_size, "overlap": overlap},
+                bm25=index, embeddings=embeddings, embedding_model=embedding_model, dedup=deduper)
+    return stats, deduper
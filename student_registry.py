@@ -0,0 +1,167 @@
+"""
+Реєстр студентів для exam_core: students.json читається один раз і тримається в пам'яті
+з хеш-індексами за нормалізованими email та ім'ям.
+
+Файл перечитується лише тоді, коли змінились його mtime/розмір (перевірка не частіше
+за check_interval секунд). Пошук не бере локів: індекс — незмінний знімок, перезавантаження
+підміняє його одним присвоєнням.
+
+  python -m student_registry import roster.csv       # масовий імпорт (CSV з колонками name,email або JSON)
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STUDENTS_PATH = "students.json"
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def normalize_name(name: str) -> str:
+    return name.strip().lower()
+
+
+class _Index:
+    __slots__ = ("records", "by_email", "by_name", "pairs")
+
+    def __init__(self, records: List[Dict]):
+        self.records = records
+        self.by_email: Dict[str, Dict] = {}
+        self.by_name: Dict[str, List[Dict]] = {}
+        self.pairs = set()
+        for s in records:
+            email, name = normalize_email(s["email"]), normalize_name(s["name"])
+            self.by_email.setdefault(email, s)
+            self.by_name.setdefault(name, []).append(s)
+            self.pairs.add((email, name))
+
+
+def _read_records(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_roster(path: str) -> List[Dict]:
+    """Записи {"name", "email"} з .csv (заголовок name,email) або .json."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return [{"name": row["name"], "email": row["email"]} for row in csv.DictReader(f)]
+    return _read_records(path)
+
+
+class StudentRegistry:
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = _Index([])
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked_at = float("-inf")
+        self.reloads = 0
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _current(self) -> _Index:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._index
+        with self._lock:
+            if now - self._checked_at >= self.check_interval:
+                stamp = self._file_stamp()
+                if stamp != self._stamp:
+                    self._index = _Index(_read_records(self.path) if stamp is not None else [])
+                    self._stamp = stamp
+                    self.reloads += 1
+                self._checked_at = time.monotonic()
+            return self._index
+
+    def reload(self) -> None:
+        """Примусово перечитати файл при наступному зверненні."""
+        with self._lock:
+            self._stamp = None
+            self._checked_at = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._current().records)
+
+    def all(self) -> List[Dict]:
+        return list(self._current().records)
+
+    def lookup(self, email: str) -> Optional[Dict]:
+        return self._current().by_email.get(normalize_email(email))
+
+    def find_by_name(self, name: str) -> List[Dict]:
+        return list(self._current().by_name.get(normalize_name(name), ()))
+
+    def exists(self, email: str, name: str) -> bool:
+        """Чи є студент саме з таким email та ім'ям (без урахування регістру й зайвих пробілів)."""
+        return (normalize_email(email), normalize_name(name)) in self._current().pairs
+
+    def bulk_import(self, records: Iterable[Dict], replace: bool = False) -> Dict[str, int]:
+        """
+        Додає записи {"name", "email"} у реєстр і атомарно переписує файл. Запис з уже
+        відомим email оновлює наявний; replace=True — реєстр складається лише з records.
+        Повертає {"added", "updated", "total"}.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if replace:
+                current = []
+            elif stamp != self._stamp:
+                current = _read_records(self.path) if stamp is not None else []
+            else:
+                current = self._index.records
+            merged = {normalize_email(s["email"]): s for s in current}
+            added = updated = 0
+            for s in records:
+                if not s.get("email", "").strip() or not s.get("name", "").strip():
+                    raise ValueError(f"Student record needs name and email: {s!r}")
+                record = {"name": s["name"].strip(), "email": s["email"].strip()}
+                key = normalize_email(record["email"])
+                if key in merged:
+                    updated += merged[key] != record
+                else:
+                    added += 1
+                merged[key] = record
+
+            students = list(merged.values())
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp{os.getpid()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(students, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+            self._index = _Index(students)
+            self._stamp = self._file_stamp()
+            self._checked_at = time.monotonic()
+            return {"added": added, "updated": updated, "total": len(students)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="масовий імпорт списку студентів")
+    imp.add_argument("roster", help=".csv (name,email) або .json")
+    imp.add_argument("--path", default=STUDENTS_PATH)
+    imp.add_argument("--replace", action="store_true", help="замінити реєстр, а не доповнити")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    result = StudentRegistry(args.path).bulk_import(load_roster(args.roster), replace=args.replace)
+    print(f"{args.path}: +{result['added']} new, {result['updated']} updated, "
+          f"{result['total']} total in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from bm25_index import BM25Index
+
+CORPUS = [
+    "attention is all you need transformer attention heads",
+    "bm25 ranks documents by term frequency and inverse document frequency",
+    "dense retrieval encodes queries and documents into vectors",
+    "the reranker scores query document pairs with a cross encoder",
+    "tokenization splits text into subword units with bpe",
+    "data leakage happens when test data leaks into training",
+    "the transformer uses self attention instead of recurrence",
+    "cosine similarity compares embedding vectors",
+]
+EXTRA = [
+    "sparse retrieval with bm25 and dense retrieval with vectors",
+    "attention attention attention",
+]
+QUERIES = [
+    "attention transformer",
+    "bm25 document frequency",
+    "dense vectors retrieval",
+    "the",
+    "unknown words only",
+]
+
+
+def tokenize(text):
+    return text.lower().split()
+
+
+def reference_top_k(bm25, tokens, k):
+    scores = bm25.get_scores(tokens)
+    top = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+    return top, [float(scores[i]) for i in top]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_top_k_matches_rank_bm25(query):
+    corpus = [tokenize(d) for d in CORPUS]
+    ref_ids, ref_scores = reference_top_k(BM25Okapi(corpus), tokenize(query), 5)
+    ids, scores = BM25Index(corpus).top_k(tokenize(query), 5)
+    assert ids.tolist() == ref_ids
+    assert scores.tolist() == pytest.approx(ref_scores)
+
+
+def test_top_k_batch_matches_top_k():
+    index = BM25Index([tokenize(d) for d in CORPUS])
+    queries = [tokenize(q) for q in QUERIES]
+    for (batch_ids, batch_scores), tokens in zip(index.top_k_batch(queries, 3), queries):
+        ids, scores = index.top_k(tokens, 3)
+        assert batch_ids.tolist() == ids.tolist()
+        assert batch_scores.tolist() == pytest.approx(scores.tolist())
+
+
+def test_patched_matches_rebuilt_rank_bm25():
+    corpus = [tokenize(d) for d in CORPUS]
+    added = [tokenize(d) for d in EXTRA]
+    removed = {1: corpus[1], 6: corpus[6]}
+    index = BM25Index(corpus).patched(added=added, removed=removed)
+
+    # id у знімку не зсуваються: видалені документи лише зникають з видачі
+    alive = [i for i in range(len(corpus) + len(added)) if i not in removed]
+    reference = BM25Okapi([(corpus + added)[i] for i in alive])
+    for query in QUERIES:
+        tokens = tokenize(query)
+        expected = dict(zip(alive, reference.get_scores(tokens)))
+        ids, scores = index.scores(tokens)
+        assert not set(ids.tolist()) & set(removed)
+        for doc_id, score in zip(ids.tolist(), scores.tolist()):
+            assert score == pytest.approx(expected[doc_id])
+        top_ids, _ = index.top_k(tokens, 3)
+        ref_top, _ = reference_top_k(reference, tokens, 3)
+        assert top_ids.tolist() == [alive[i] for i in ref_top]
+
+
+def test_patched_leaves_original_unchanged():
+    corpus = [tokenize(d) for d in CORPUS]
+    index = BM25Index(corpus)
+    before = index.top_k(tokenize("attention transformer"), 5)
+    index.patched(added=[tokenize(EXTRA[1])], removed={0: corpus[0]})
+    after = index.top_k(tokenize("attention transformer"), 5)
+    assert np.array_equal(before[0], after[0])
+    assert np.array_equal(before[1], after[1])
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+from exam_store import ExamStore
+
+HISTORY = [{"role": "user", "content": "Що таке BPE?"}]
+EVENTS = [
+    {"event": "start_exam", "email": "Anna@X.com", "name": "Anna", "topics": ["Tokenization", "Word Embeddings"],
+     "datetime": "2026-08-10T10:00:00+00:00"},
+    {"event": "end_exam", "email": "anna@x.com", "score": 8, "history": HISTORY,
+     "datetime": "2026-08-10T10:30:00+00:00"},
+    {"event": "start_exam", "email": "bob@x.com", "name": "Bob", "topics": ["Tokenization"],
+     "datetime": "2026-08-11T09:00:00+00:00"},
+    {"event": "end_exam", "email": "bob@x.com", "score": 4, "history": HISTORY,
+     "datetime": "2026-08-11T09:20:00+00:00"},
+    {"event": "start_exam", "email": "anna@x.com", "name": "Anna", "topics": ["Evaluation Metrics"],
+     "datetime": "2026-10-01T12:00:00+00:00"},
+    {"event": "end_exam", "email": "anna@x.com", "score": 10, "history": HISTORY,
+     "datetime": "2026-10-01T12:40:00+00:00"},
+]
+
+
+def write_jsonl(path, events):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExamStore(str(tmp_path / "exams"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def test_migrate_jsonl(tmp_path, store):
+    path = str(tmp_path / "exams.jsonl")
+    write_jsonl(path, EVENTS)
+
+    assert store.migrate_jsonl(path) == len(EVENTS)
+    assert [os.path.basename(p) for p in store.segments()] == ["exams-2026-10.db", "exams-2026-08.db"]
+
+    results = store.results_for("ANNA@x.com")
+    assert [r["score"] for r in results] == [10, 8]
+    # end_exam бере теми з останнього start_exam студента до нього, а не з пізнішого
+    assert [r["topics"] for r in results] == [["Evaluation Metrics"], ["Tokenization", "Word Embeddings"]]
+    assert store.history(results[0]["event_id"]) == HISTORY
+
+    assert store.topic_stats() == {
+        "Evaluation Metrics": {"exams": 1, "avg_score": 10.0},
+        "Tokenization": {"exams": 2, "avg_score": 6.0},
+        "Word Embeddings": {"exams": 1, "avg_score": 8.0},
+    }
+    assert store.daily_stats(since="2026-08-11") == {
+        "2026-08-11": {"exams": 1, "avg_score": 4.0},
+        "2026-10-01": {"exams": 1, "avg_score": 10.0},
+    }
+
+    # повторна міграція того самого файлу нічого не дублює
+    assert store.migrate_jsonl(path) == 0
+    assert len(store.events()) == len(EVENTS)
+
+
+def test_migrate_rejects_invalid_file_without_writing(tmp_path, store):
+    path = str(tmp_path / "exams.jsonl")
+    write_jsonl(path, EVENTS[:2] + [{"event": "end_exam", "score": 3, "datetime": "2026-08-12T10:00:00"}])
+
+    with pytest.raises(ValueError, match="line 3"):
+        store.migrate_jsonl(path)
+    assert store.events() == []
+
+    # після виправлення файлу міграція проходить
+    write_jsonl(path, EVENTS[:2])
+    assert store.migrate_jsonl(path) == 2
+
+
+def test_migrated_end_exam_uses_topics_from_appended_start(tmp_path, store):
+    store.append({"event": "start_exam", "email": "bob@x.com", "name": "Bob", "topics": ["Word Embeddings"],
+                  "datetime": "2026-07-30T10:00:00+00:00"})
+    path = str(tmp_path / "exams.jsonl")
+    write_jsonl(path, [{"event": "end_exam", "email": "bob@x.com", "score": 6,
+                        "datetime": "2026-08-01T10:00:00+00:00"}])
+
+    assert store.migrate_jsonl(path) == 1
+    assert [r["topics"] for r in store.results_for("bob@x.com")] == [["Word Embeddings"]]
+
+
+def test_append_is_readable_after_flush(store):
+    for event in EVENTS[:2]:
+        store.append(dict(event))
+    store.flush()
+    assert store.written == 2
+    assert [e["event"] for e in store.events(email="anna@x.com")] == ["end_exam", "start_exam"]
+    with pytest.raises(ValueError):
+        store.append({"event": "end_exam", "email": "anna@x.com"})
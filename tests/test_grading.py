@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import grading
+from grading import GradeItem, grade_batch, load_progress
+
+ITEMS = [
+    GradeItem("Tokenization", "Що таке BPE?", "BPE зливає найчастіші пари символів у субслова."),
+    GradeItem("Word Embeddings", "Що таке embedding?", "Вектор, близькість якого відображає схожість слів."),
+    GradeItem("Evaluation Metrics", "Що таке BLEU?", "Метрика перекриття n-грам з еталонним перекладом."),
+    GradeItem("Tokenization", "Що таке WordPiece?", "не знаю"),
+    GradeItem("Data Leakage & Train/Test Split", "Що таке data leakage?", "Коли дані тесту потрапляють у train."),
+]
+
+
+def offline(items, **kwargs):
+    return grade_batch(items, False, "", "http://localhost", "model", workers=2, **kwargs)
+
+
+def test_resume_grades_only_the_rest(tmp_path):
+    progress = str(tmp_path / "progress.jsonl")
+    expected, _ = offline(ITEMS)
+
+    # перерваний запуск: встигли оцінити перші два елементи
+    offline(ITEMS[:2], progress_path=progress)
+    results, stats = offline(ITEMS, progress_path=progress)
+
+    assert results == expected
+    assert (stats.resumed, stats.graded, stats.failed) == (2, 3, 0)
+    assert set(load_progress(progress, {"mode": "offline"})) == {item.key for item in ITEMS}
+
+    results, stats = offline(ITEMS, progress_path=progress)
+    assert results == expected
+    assert (stats.resumed, stats.graded) == (len(ITEMS), 0)
+
+
+def test_failed_and_torn_rows_are_graded_again(tmp_path, monkeypatch):
+    progress = tmp_path / "progress.jsonl"
+    rows = [
+        {"config": {"mode": "offline"}},
+        {"key": ITEMS[0].key, "score": None, "feedback": "", "error": "HTTPError: 503"},
+        {"key": ITEMS[1].key, "score": 7.0, "feedback": "ok", "error": None},
+        {"key": ITEMS[2].key, "score": 6.0, "feedback": "Відповідь неповна", "error": None},
+    ]
+    data = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+    # останній рядок обірвано посеред літери
+    progress.write_bytes(data[:data.rindex("неповна".encode("utf-8")) + 3])
+    graded = []
+    grade_answer = grading.grade_answer
+
+    def counting(topic, question, answer, *args, **kwargs):
+        graded.append(question)
+        return grade_answer(topic, question, answer, *args, **kwargs)
+
+    monkeypatch.setattr(grading, "grade_answer", counting)
+    results, stats = offline(ITEMS[:3], progress_path=str(progress))
+
+    assert sorted(graded) == sorted([ITEMS[0].question, ITEMS[2].question])
+    assert results[1].score == 7.0
+    assert all(r.error is None for r in results)
+    assert stats.resumed == 1
+    # нові рядки не дописуються в хвіст недописаного
+    assert set(load_progress(str(progress), {"mode": "offline"})) == {item.key for item in ITEMS[:3]}
+
+
+def test_duplicates_are_graded_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(grading, "grade_answer", lambda topic, question, *args, **kwargs: calls.append(question)
+                        or (5.0, "ok"))
+    results, stats = offline(ITEMS[:2] + [GradeItem(ITEMS[0].topic, ITEMS[0].question, ITEMS[0].answer)])
+
+    assert sorted(calls) == sorted([ITEMS[0].question, ITEMS[1].question])
+    assert results[2] == results[0]
+    assert stats.duplicates == 1
+
+
+def test_progress_from_other_config_is_rejected(tmp_path):
+    progress = str(tmp_path / "progress.jsonl")
+    offline(ITEMS[:1], progress_path=progress)
+    with pytest.raises(ValueError, match="grading config"):
+        grade_batch(ITEMS, True, "key", "http://localhost:1", "model", progress_path=progress)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from rag_pipeline import RAGPipeline
+
+DOCS = {
+    "attention.md": "Self attention lets every token look at every other token in the sequence. "
+                    "Multi head attention runs several attention heads in parallel.",
+    "bm25.md": "BM25 ranks documents by term frequency saturation and inverse document frequency. "
+               "Document length is normalised against the average length.",
+    "leakage.md": "Data leakage happens when information from the test split reaches training. "
+                  "Split before any preprocessing to avoid leakage.",
+}
+QUERIES = ["attention heads", "inverse document frequency", "test split leakage", "dropout regularization"]
+
+
+def write_docs(path, docs):
+    for fname, text in docs.items():
+        with open(os.path.join(path, fname), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+@pytest.fixture
+def make_pipeline(monkeypatch):
+    # dense і reranker не вантажаться: оновлення перевіряються на BM25-частині пайплайна
+    monkeypatch.setattr(RAGPipeline, "_load_models", lambda self, raise_errors: None)
+
+    def make(docs_path):
+        return RAGPipeline(docs_path=docs_path, answer_cache=False, lazy=True, chunk_size=8, overlap=2)
+    return make
+
+
+def texts(rag, query):
+    return [text for text, _, _ in rag.retrieve(query, use_dense=False)]
+
+
+def matches(rag, query):
+    # документи без збігів (скор 0) добираються за id, а id після оновлень і перебудови різні
+    return [(text, pytest.approx(score)) for text, score, _ in rag.bm25.search(query, 5) if score > 0]
+
+
+def assert_same_as_rebuilt(rag, docs_path, make_pipeline):
+    rebuilt = make_pipeline(docs_path)
+    assert sorted(rag.documents) == sorted(rebuilt.documents)
+    for query in QUERIES:
+        assert matches(rag, query) == matches(rebuilt, query)
+
+
+def test_add_update_remove(tmp_path, make_pipeline):
+    write_docs(tmp_path, DOCS)
+    rag = make_pipeline(str(tmp_path))
+
+    write_docs(tmp_path, {"dropout.md": "Dropout and weight decay are common regularization methods."})
+    assert rag.add_document(str(tmp_path / "dropout.md"))
+    assert any("Dropout" in t for t in texts(rag, "dropout regularization"))
+
+    kept = rag.documents["bm25.md"]["ids"][:2]
+    updated = DOCS["bm25.md"] + " Okapi BM25 uses the parameters k1 and b."
+    write_docs(tmp_path, {"bm25.md": updated})
+    assert rag.update_document(str(tmp_path / "bm25.md"))
+    # незмінені чанки на тих самих позиціях зберігають свої id
+    assert rag.documents["bm25.md"]["ids"][:2] == kept
+    assert not rag.update_document(str(tmp_path / "bm25.md"))
+
+    os.remove(tmp_path / "leakage.md")
+    assert rag.remove_document("leakage.md")
+    assert not rag.remove_document("leakage.md")
+    assert not any("leakage" in t for t in texts(rag, "test split leakage"))
+
+    assert_same_as_rebuilt(rag, str(tmp_path), make_pipeline)
+
+
+def test_sync_reports_changes(tmp_path, make_pipeline):
+    write_docs(tmp_path, DOCS)
+    rag = make_pipeline(str(tmp_path))
+    assert rag.sync() == {"added": [], "updated": [], "removed": []}
+
+    write_docs(tmp_path, {"dropout.md": "Dropout and weight decay are common regularization methods.",
+                          "attention.md": "Attention heads attend to different positions."})
+    os.remove(tmp_path / "bm25.md")
+    assert rag.sync() == {"added": ["dropout.md"], "updated": ["attention.md"], "removed": ["bm25.md"]}
+
+    assert_same_as_rebuilt(rag, str(tmp_path), make_pipeline)
@@ -0,0 +1,275 @@
+"""
+Трасування запитів RAGPipeline: таймінги етапів у кільцевому буфері процесу.
+
+Trace — один запит (answer / answer_stream), Span — етап усередині нього (bm25, dense_encode,
+rerank, llm, ...) з атрибутами (кількість кандидатів, розмір батчу, довжина промпту тощо).
+Активний trace живе в contextvar, тож span() у глибині пайплайна нічого не коштує, коли трасування немає,
+і не потребує протягування trace через усі виклики.
+
+Експорт: Tracer.to_jsonl() — JSON lines, Tracer.prometheus() — text exposition format.
+Опційно (profile_slow_ms) для кожного запиту працює семплювальний профайлер: якщо запит виявився
+повільнішим за поріг, до trace додаються згорнуті стеки (folded, як для flamegraph.pl).
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("rag_trace", default=None)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "start")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        if self.trace._threads is not None:
+            self.trace._threads.add(threading.get_ident())
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.spans.append(dict(
+            name=self.name,
+            start_ms=(self.start - self.trace._t0) * 1000,
+            ms=(end - self.start) * 1000,
+            **self.attrs
+        ))
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    def __init__(self, name, attrs, profile=False):
+        self.trace_id = os.urandom(8).hex()
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self.profile = None
+        # потоки, у яких виконувались span-и цього запиту — їх і семплює профайлер
+        self._threads = {threading.get_ident()} if profile else None
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        d = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "spans": self.spans,
+        }
+        if self.profile is not None:
+            d["profile"] = self.profile
+        return d
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def activate(trace):
+    """Робить trace поточним для span()/annotate() у цьому контексті (None — нічого не робить)."""
+    if trace is None:
+        yield None
+        return
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def span(name, trace=None, **attrs):
+    """Span у переданому або поточному trace; без trace — no-op."""
+    trace = trace if trace is not None else _current.get()
+    return _NO_SPAN if trace is None else Span(trace, name, attrs)
+
+
+def annotate(**attrs):
+    """Атрибути поточного trace (напр. prompt_chars, cache)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+class _StackSampler(threading.Thread):
+    """Раз на interval знімає стеки потоків trace через sys._current_frames()."""
+
+    def __init__(self, trace, interval, max_depth=40):
+        super().__init__(name="rag-profiler", daemon=True)
+        self.trace = trace
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.trace._threads):
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class Tracer:
+    """
+    Кільцевий буфер останніх capacity trace-ів + накопичувальні лічильники для Prometheus.
+    enabled=False — start() повертає None, і весь інструментований код стає no-op.
+    profile_slow_ms — поріг, з якого запит зберігає профіль (None — профайлер вимкнено).
+    """
+
+    def __init__(self, capacity=256, enabled=True, profile_slow_ms=None, profile_interval=0.005, profile_top=50):
+        self.enabled = enabled
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_interval = profile_interval
+        self.profile_top = profile_top
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._samplers = {}
+        # name → [count, sum_seconds]; лічильники монотонні, на відміну від буфера
+        self._requests = {}
+        self._stages = {}
+
+    def start(self, name, **attrs):
+        if not self.enabled:
+            return None
+        profile = self.profile_slow_ms is not None
+        trace = Trace(name, attrs, profile=profile)
+        if profile:
+            sampler = _StackSampler(trace, self.profile_interval)
+            self._samplers[trace.trace_id] = sampler
+            sampler.start()
+        return trace
+
+    def finish(self, trace, **attrs):
+        if trace is None:
+            return
+        trace.duration_ms = (time.perf_counter() - trace._t0) * 1000
+        trace.attrs.update(attrs)
+        sampler = self._samplers.pop(trace.trace_id, None)
+        if sampler is not None:
+            stacks = sampler.stop()
+            if trace.duration_ms >= self.profile_slow_ms:
+                trace.profile = [f"{stack} {count}" for stack, count in stacks.most_common(self.profile_top)]
+        trace._threads = None
+        record = trace.to_dict()
+        with self._lock:
+            self._buffer.append(record)
+            totals = self._requests.setdefault(trace.name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += trace.duration_ms / 1000
+            for s in trace.spans:
+                totals = self._stages.setdefault(s["name"], [0, 0.0])
+                totals[0] += 1
+                totals[1] += s["ms"] / 1000
+
+    @contextmanager
+    def trace(self, name, **attrs):
+        """start + activate + finish; помилка записується в атрибути trace."""
+        trace = self.start(name, **attrs)
+        try:
+            with activate(trace):
+                yield trace
+        except BaseException as e:
+            if trace is not None:
+                trace.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.finish(trace)
+
+    def recent(self, n=None):
+        with self._lock:
+            records = list(self._buffer)
+        return records if n is None else records[-n:]
+
+    def to_jsonl(self, n=None):
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.recent(n))
+
+    def write_jsonl(self, path, n=None):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl(n))
+
+    def prometheus(self):
+        """Text exposition format: summary-метрики запитів і етапів (квантилі — по буферу)."""
+        records = self.recent()
+        with self._lock:
+            requests = {k: list(v) for k, v in self._requests.items()}
+            stages = {k: list(v) for k, v in self._stages.items()}
+
+        by_request, by_stage = {}, {}
+        for r in records:
+            by_request.setdefault(r["name"], []).append(r["duration_ms"] / 1000)
+            for s in r["spans"]:
+                by_stage.setdefault(s["name"], []).append(s["ms"] / 1000)
+
+        lines = []
+        for metric, label, totals, samples, help_text in (
+            ("rag_request_duration_seconds", "name", requests, by_request, "End-to-end request latency"),
+            ("rag_stage_duration_seconds", "stage", stages, by_stage, "Latency of a pipeline stage"),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for key in sorted(totals):
+                values = sorted(samples.get(key, ()))
+                for q in QUANTILES:
+                    if values:
+                        value = values[min(len(values) - 1, int(q * len(values)))]
+                        lines.append(f'{metric}{{{label}="{key}",quantile="{q}"}} {value:.6f}')
+                count, total = totals[key]
+                lines.append(f'{metric}_sum{{{label}="{key}"}} {total:.6f}')
+                lines.append(f'{metric}_count{{{label}="{key}"}} {count}')
+        return "\n".join(lines) + "\n"